@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+'''
+Offline benchmarks
+
+Runs JetsonNanoHaMqtt against the stand-ins in stubs.py and writes the
+results as JSON:
+
+    python3 benchmarks/bench.py --duration 5 --output bench.json
+
+camera          frames per second published by each camera
+inference       MQTT inference requests per second for each network
+sensors         cost of one hardware sensor tick
+memory          memory allocated per camera
+startup         seconds until the sensors and cameras are online
+'''
+import argparse
+import contextlib
+import json
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs
+stubs.install()
+
+import numpy as np
+from io import BytesIO
+from PIL import Image
+from jetson.inference import detectNet, imageNet, poseNet
+from JetsonNanoHaMqtt import JetsonNanoHaMqtt
+
+
+def create_device(client=None, jetson=None):
+    client = client if client is not None else stubs.StubClient()
+    jetson = jetson if jetson is not None else stubs.jtop()
+    device = JetsonNanoHaMqtt("Bench Nano", client, jetson)
+    device.initialize_device(jetson)
+    return device, client, jetson
+
+
+def bench_camera(args) -> dict:
+    '''
+    Camera frames per second
+
+    Runs the camera pipelines with inference for the duration and counts the
+    frames each camera published.
+    '''
+    device, client, jetson = create_device()
+    for i in range(args.cameras):
+        device.initialize_camera("Bench Camera {}".format(i), client, input="stub://{}".format(i),
+                                 inference=True, inference_network="ssd-mobilenet-v2")
+    cameras = device._cameras
+    client.reset()
+    start = time.monotonic()
+    for camera in cameras:
+        camera.start(frequency=1.0 / args.fps if args.fps else 0)
+    time.sleep(args.duration)
+    for camera in cameras:
+        camera.stop()
+    elapsed = time.monotonic() - start
+    device.stop()
+    metrics = device.metrics.snapshot()
+    results = {}
+    for camera in cameras:
+        results[camera._name] = {
+            "fps": client.count(camera.camera.camera_topic) / elapsed,
+            "inference_fps": client.count(camera.camera_inference.camera_topic) / elapsed,
+            "stages": metrics.get(camera._name, {}),
+        }
+    for camera in cameras:
+        camera.close()
+    return results
+
+
+def request_payload(width: int, height: int, raw: bool) -> bytes:
+    pixels = np.random.RandomState(1).randint(0, 256, (height, width, 3), dtype=np.uint8)
+    if raw:
+        return b"RGB8" + struct.pack(">HH", width, height) + pixels.tobytes()
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def bench_inference(args) -> dict:
+    '''
+    MQTT inference requests per second
+
+    Delivers requests to the command topic of each network one at a time
+    and runs them through the inference worker path, with image output and
+    in results mode, and as batch requests of --batch JPEG images.
+    '''
+    device, client, jetson = create_device()
+    networks = [("detectNet", detectNet, "ssd-mobilenet-v2"),
+                ("imageNet", imageNet, "googlenet"),
+                ("poseNet", poseNet, "resnet18-body")]
+    for name, network_class, network in networks:
+        device.initialize_inference(name, client, network_class, network=network)
+        device.initialize_inference(name + " Results", client, network_class, network=network, results=True)
+    results = {}
+    for inference in device._inferences:
+        for encoding in ("jpeg", "raw", "batch"):
+            if encoding == "batch":
+                image = request_payload(args.request_width, args.request_height, False)
+                payload = inference.encode_batch("bench", [image] * args.batch)
+            else:
+                payload = request_payload(args.request_width, args.request_height, encoding == "raw")
+            msg = stubs.MQTTMessage(topic=inference.inference_label.cmd_topic.encode("utf-8"))
+            msg.payload = payload
+            requests = 0
+            start = time.monotonic()
+            while time.monotonic() - start < args.duration:
+                inference.publish_inference(client, None, msg)
+                requests += 1
+            elapsed = time.monotonic() - start
+            results[inference._name + "_" + encoding] = {
+                "requests_per_second": requests / elapsed,
+                "images_per_second": requests / elapsed * (args.batch if encoding == "batch" else 1),
+                "payload_bytes": len(payload),
+            }
+    device.stop()
+    for inference in device._inferences:
+        inference.close()
+    return results
+
+
+def bench_sensors(args) -> dict:
+    '''
+    Hardware sensor tick cost
+
+    Times publishing every hardware sensor for a new jtop sample.
+    '''
+    results = {}
+    for batched in (False, True):
+        device, client, jetson = create_device()
+        device.initialize_hardware_sensors(batched=batched)
+        sensors = device._hw_sensors
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.duration / 2:
+            jetson.tick()
+            sensors.publish_hardware_sensors(jetson)
+            ticks += 1
+        elapsed = time.perf_counter() - start
+        results["batched" if batched else "individual"] = {
+            "sensors": len(sensors.sensors),
+            "tick_us": elapsed / ticks * 1e6,
+            "messages_per_tick": sum(client.messages.values()) / ticks,
+        }
+        sensors.close()
+    return results
+
+
+def bench_memory(args) -> dict:
+    '''
+    Memory per camera
+
+    Measures the Python and numpy memory allocated by creating and running
+    the cameras.  The stub video sources are created first so their frames
+    are not counted.
+    '''
+    sources = [stubs.videoSource("stub://{}".format(i)) for i in range(args.cameras)]
+    tracemalloc.start()
+    device, client, jetson = create_device()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(args.cameras):
+        device.initialize_camera("Memory Camera {}".format(i), client, input="stub://{}".format(i),
+                                 inference=True, inference_network="ssd-mobilenet-v2",
+                                 video_source=sources[i])
+    initialized = tracemalloc.get_traced_memory()[0]
+    for camera in device._cameras:
+        camera.start(frequency=1.0 / args.fps if args.fps else 0)
+    time.sleep(min(args.duration, 2))
+    running, peak = tracemalloc.get_traced_memory()
+    device.stop()
+    for camera in device._cameras:
+        camera.close()
+    tracemalloc.stop()
+    return {
+        "cameras": args.cameras,
+        "initialized_bytes_per_camera": (initialized - baseline) / args.cameras,
+        "running_bytes_per_camera": (running - baseline) / args.cameras,
+        "peak_bytes_per_camera": (peak - baseline) / args.cameras,
+    }
+
+
+def bench_startup(args) -> dict:
+    '''
+    Startup time
+
+    Times from creating the device until the first hardware sensor state
+    and the first frame of every camera are published, loading the camera
+    networks one after another and in the background.
+    '''
+    stubs.CONFIG["load_latency"] = args.load_latency
+    results = {}
+    for background in (False, True):
+        start = time.monotonic()
+        client = stubs.StubClient()
+        jetson = stubs.jtop()
+        device = JetsonNanoHaMqtt("Bench Nano", client, jetson, background_loading=background)
+        device.initialize_device(jetson)
+        device.initialize_hardware_sensors()
+        for i in range(args.cameras):
+            device.initialize_camera("Startup Camera {}".format(i), client, input="stub://{}".format(i),
+                                     inference=True, inference_network="network-{}".format(i))
+        device.start()
+        sensors_online = None
+        cameras_online = None
+        while time.monotonic() - start < args.duration + args.load_latency * args.cameras:
+            topics = list(client.messages)
+            if sensors_online is None and any(t.startswith("homeassistant/sensor/") and t.endswith("/state") for t in topics):
+                sensors_online = time.monotonic() - start
+            if sum(1 for t in topics if t.startswith("homeassistant/camera/jetson_cam_Startup") and t.endswith("/camera")) == args.cameras:
+                cameras_online = time.monotonic() - start
+                break
+            time.sleep(0.005)
+        device.stop()
+        for camera in device._cameras:
+            camera.close()
+        results["background" if background else "sequential"] = {
+            "sensors_online_s": sensors_online,
+            "cameras_online_s": cameras_online,
+        }
+    stubs.CONFIG["load_latency"] = 0.0
+    return results
+
+
+BENCHMARKS = {
+    "camera": bench_camera,
+    "inference": bench_inference,
+    "sensors": bench_sensors,
+    "memory": bench_memory,
+    "startup": bench_startup,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline JetsonNanoHaMqtt benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks to run: " + ", ".join(sorted(BENCHMARKS)) +
+                        " (default: all)")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per benchmark")
+    parser.add_argument("--cameras", type=int, default=2, help="number of cameras")
+    parser.add_argument("--fps", type=float, default=30, help="camera capture rate, 0 for unpaced")
+    parser.add_argument("--width", type=int, default=1280, help="camera frame width")
+    parser.add_argument("--height", type=int, default=720, help="camera frame height")
+    parser.add_argument("--request-width", type=int, default=640, help="inference request width")
+    parser.add_argument("--request-height", type=int, default=480, help="inference request height")
+    parser.add_argument("--batch", type=int, default=8, help="images per batch inference request")
+    parser.add_argument("--detect-latency", type=float, default=0.01, help="detectNet latency in seconds")
+    parser.add_argument("--load-latency", type=float, default=1.0, help="network load latency in seconds")
+    parser.add_argument("--capture-latency", type=float, default=0.0, help="capture latency in seconds")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+
+    stubs.CONFIG.update(width=args.width, height=args.height, detect_latency=args.detect_latency,
+                        capture_latency=args.capture_latency)
+    names = args.benchmarks or sorted(BENCHMARKS)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("benchmarks", "output")},
+        "results": {},
+    }
+    # The package logs with print, keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in names:
+            print("Running " + name + " benchmark")
+            report["results"][name] = BENCHMARKS[name](args)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
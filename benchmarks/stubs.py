@@ -0,0 +1,363 @@
+'''
+Stand-ins for the Jetson, jtop and MQTT backends
+
+These stubs let the package run on a plain Linux box.  They mimic the parts
+of jetson.utils, jetson.inference, jtop and the paho Client that the package
+uses, with configurable latencies so a benchmark can model the device.
+'''
+from paho.mqtt.client import MQTTMessage, MQTTMessageInfo
+import numpy as np
+import threading
+import types
+import time
+import sys
+
+FORMAT_CHANNELS = {"rgb8": 3, "bgr8": 3, "rgba8": 4, "bgra8": 4, "gray8": 1}
+
+# Latencies in seconds, changed by the benchmark before the stubs are used
+CONFIG = {
+    "width": 1280,
+    "height": 720,
+    "capture_latency": 0.0,
+    "load_latency": 0.0,
+    "detect_latency": 0.01,
+    "classify_latency": 0.005,
+    "pose_latency": 0.015,
+    "detections": 1,
+}
+
+
+class CudaImage():
+    '''
+    CUDA image stand-in backed by a numpy array
+    '''
+
+    def __init__(self, width: int, height: int, format: str = "rgb8", array=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.format = format
+        self.channels = FORMAT_CHANNELS.get(format, 4)
+        self.shape = (self.height, self.width, self.channels)
+        self.array = array if array is not None else np.zeros(self.shape, dtype=np.uint8)
+
+
+def cudaAllocMapped(width: int = 0, height: int = 0, format: str = "rgb8", **kwargs):
+    return CudaImage(width, height, format)
+
+
+def cudaToNumpy(img):
+    return img.array
+
+
+def cudaFromNumpy(array):
+    return CudaImage(array.shape[1], array.shape[0], "rgb8" if array.shape[2] == 3 else "rgba8", array)
+
+
+def cudaCrop(src, dst, roi):
+    left, top, right, bottom = roi
+    dst.array[...] = src.array[top:bottom, left:right]
+
+
+def cudaResize(src, dst, **kwargs):
+    ys = (np.arange(dst.height) * src.height // dst.height)
+    xs = (np.arange(dst.width) * src.width // dst.width)
+    dst.array[...] = src.array[ys][:, xs]
+
+
+def cudaOverlay(src, dst, x, y):
+    pass
+
+
+def cudaMemcpy(dst, src=None):
+    if src is None:
+        return CudaImage(dst.width, dst.height, dst.format, dst.array.copy())
+    dst.array[...] = src.array
+
+
+def cudaDeviceSynchronize():
+    pass
+
+
+class videoSource():
+    '''
+    Video source stand-in
+
+    Cycles through a few noise frames so change detection sees motion.
+    '''
+
+    def __init__(self, uri: str = None, argv=None):
+        self.uri = uri
+        rng = np.random.RandomState(0)
+        shape = (CONFIG["height"], CONFIG["width"], 3)
+        self._frames = [CudaImage(shape[1], shape[0], "rgb8", rng.randint(0, 256, shape, dtype=np.uint8))
+                        for _ in range(4)]
+        self._index = 0
+
+    def Capture(self, format: str = "rgb8", timeout: int = 1000):
+        if CONFIG["capture_latency"]:
+            time.sleep(CONFIG["capture_latency"])
+        self._index = (self._index + 1) % len(self._frames)
+        return self._frames[self._index]
+
+    def Open(self):
+        pass
+
+    def Close(self):
+        pass
+
+
+class Detection():
+    '''
+    detectNet detection stand-in
+    '''
+
+    def __init__(self, class_id: int, confidence: float, left: float, top: float, right: float, bottom: float):
+        self.ClassID = class_id
+        self.Confidence = confidence
+        self.Left = left
+        self.Top = top
+        self.Right = right
+        self.Bottom = bottom
+        self.Width = right - left
+        self.Height = bottom - top
+        self.Area = self.Width * self.Height
+        self.Center = ((left + right) / 2, (top + bottom) / 2)
+
+    def __repr__(self):
+        return "<Detection ClassID={} Confidence={:.2f}>".format(self.ClassID, self.Confidence)
+
+
+class detectNet():
+    '''
+    detectNet stand-in
+    '''
+
+    def __init__(self, network: str = None, argv=None, threshold: float = 0.5, **kwargs):
+        time.sleep(CONFIG["load_latency"])
+        self.network = network
+        self.threshold = threshold
+
+    def Detect(self, img, width: int = 0, height: int = 0, overlay: str = "box,labels,conf"):
+        time.sleep(CONFIG["detect_latency"])
+        detections = []
+        for i in range(CONFIG["detections"]):
+            left = img.width * (0.1 + 0.1 * i) % (img.width * 0.5)
+            top = img.height * 0.2
+            detections.append(Detection(1 + i % 3, 0.9, left, top, left + img.width * 0.25, top + img.height * 0.4))
+        return detections
+
+    def GetClassDesc(self, class_id: int) -> str:
+        return ["background", "person", "car", "dog"][class_id % 4]
+
+    def GetClassLabel(self, class_id: int) -> str:
+        return self.GetClassDesc(class_id)
+
+
+class imageNet():
+    '''
+    imageNet stand-in
+    '''
+
+    def __init__(self, network: str = None, argv=None, **kwargs):
+        time.sleep(CONFIG["load_latency"])
+        self.network = network
+
+    def Classify(self, img, width: int = 0, height: int = 0):
+        time.sleep(CONFIG["classify_latency"])
+        return 1, 0.9
+
+    def GetClassDesc(self, class_id: int) -> str:
+        return ["background", "tabby cat", "golden retriever"][class_id % 3]
+
+    def GetClassLabel(self, class_id: int) -> str:
+        return self.GetClassDesc(class_id)
+
+
+class Keypoint():
+    def __init__(self, id: int, x: float, y: float):
+        self.ID = id
+        self.x = x
+        self.y = y
+
+
+class Pose():
+    def __init__(self, id: int):
+        self.ID = id
+        self.Keypoints = [Keypoint(i, 10.0 * i, 20.0 * i) for i in range(5)]
+        self.Links = [(i, i + 1) for i in range(4)]
+
+    def __repr__(self):
+        return "<Pose ID={}>".format(self.ID)
+
+
+class poseNet():
+    '''
+    poseNet stand-in
+    '''
+
+    def __init__(self, network: str = None, argv=None, threshold: float = 0.15, **kwargs):
+        time.sleep(CONFIG["load_latency"])
+        self.network = network
+        self.threshold = threshold
+
+    def Process(self, img, width: int = 0, height: int = 0, overlay: str = "links,keypoints"):
+        time.sleep(CONFIG["pose_latency"])
+        return [Pose(0)]
+
+    def GetKeypointName(self, index: int) -> str:
+        return "keypoint_{}".format(index)
+
+
+class jtop():
+    '''
+    jtop stand-in
+
+    tick() moves the stats like a new jtop sample and calls the attached
+    callbacks.
+    '''
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.board = {
+            "hardware": {"Model": "NVIDIA Jetson Nano (Stub)", "Serial Number": "0000000000000"},
+            "platform": {"Release": "4.9.253-tegra"},
+        }
+        self._callbacks = []
+        self._tick = 0
+        self.stats = {}
+        self._update_stats()
+
+    def _update_stats(self):
+        t = self._tick
+        # jtop reports the RAM in kB and the SWAP in MB, and their stats hold the use only
+        self.ram = {"use": 1600000 + (t % 10) * 40000, "tot": 4059712, "unit": "k"}
+        self.swap = {"use": 100, "tot": 2029, "unit": "M"}
+        self.stats = {
+            "time": time.time(), "uptime": 1000.0 + t,
+            "CPU1": 10 + t % 50, "CPU2": 20 + t % 30, "CPU3": "OFF", "CPU4": 15 + t % 7,
+            "GPU1": 30 + t % 60, "EMC": 12 + t % 3, "RAM": self.ram["use"], "SWAP": self.swap["use"],
+            "fan": 35.0 + t % 5,
+            "Temp AO": 40.5 + (t % 4) / 2, "Temp CPU": 35.0 + (t % 8) / 2, "Temp GPU": 34.0 + (t % 6) / 2,
+            "Temp PLL": 33.5, "Temp thermal": 34.75,
+            "power cur": 2000 + (t * 37) % 800, "power avg": 2500,
+        }
+
+    def tick(self):
+        self._tick += 1
+        self._update_stats()
+        for callback in list(self._callbacks):
+            callback(self)
+
+    def attach(self, callback):
+        self._callbacks.append(callback)
+
+    def detach(self, callback):
+        self._callbacks.remove(callback)
+
+    def ok(self) -> bool:
+        time.sleep(self.interval)
+        self.tick()
+        return True
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class StubClient():
+    '''
+    paho Client stand-in
+
+    Counts the messages and bytes published on each topic and delivers
+    messages to the topic callbacks on the calling thread.
+    '''
+
+    def __init__(self, client_id: str = "bench"):
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._mid = 0
+        self.messages = {}
+        self.bytes = {}
+        self.connected = True
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, **kwargs):
+        if payload is None:
+            size = 0
+        elif isinstance(payload, (bytes, bytearray)):
+            size = len(payload)
+        else:
+            size = len(str(payload).encode("utf-8"))
+        with self._lock:
+            self._mid += 1
+            self.messages[topic] = self.messages.get(topic, 0) + 1
+            self.bytes[topic] = self.bytes.get(topic, 0) + size
+            info = MQTTMessageInfo(self._mid)
+        info.rc = 0
+        info._set_as_published()
+        return info
+
+    def count(self, topic: str) -> int:
+        with self._lock:
+            return self.messages.get(topic, 0)
+
+    def reset(self):
+        with self._lock:
+            self.messages = {}
+            self.bytes = {}
+
+    def subscribe(self, topic, qos: int = 0, **kwargs):
+        return 0, 0
+
+    def unsubscribe(self, topic, **kwargs):
+        return 0, 0
+
+    def message_callback_add(self, topic: str, callback):
+        self._callbacks[topic] = callback
+
+    def message_callback_remove(self, topic: str):
+        self._callbacks.pop(topic, None)
+
+    def deliver(self, topic: str, payload: bytes):
+        msg = MQTTMessage(topic=topic.encode("utf-8"))
+        msg.payload = payload
+        callback = self._callbacks.get(topic)
+        if callback is not None:
+            callback(self, None, msg)
+
+
+def install():
+    '''
+    Install the stubs
+
+    This function registers the jetson.utils, jetson.inference and jtop
+    stand-ins in sys.modules.  Call it before importing the package.
+    '''
+    this = sys.modules[__name__]
+    jetson = types.ModuleType("jetson")
+    utils = types.ModuleType("jetson.utils")
+    inference = types.ModuleType("jetson.inference")
+    for name in ("cudaAllocMapped", "cudaToNumpy", "cudaFromNumpy", "cudaCrop", "cudaResize",
+                 "cudaOverlay", "cudaMemcpy", "cudaDeviceSynchronize", "videoSource"):
+        setattr(utils, name, getattr(this, name))
+    for name in ("detectNet", "imageNet", "poseNet"):
+        setattr(inference, name, getattr(this, name))
+    jetson.utils = utils
+    jetson.inference = inference
+    jetson.__path__ = []
+    jtop_module = types.ModuleType("jtop")
+    jtop_module.jtop = jtop
+    sys.modules["jetson"] = jetson
+    sys.modules["jetson.utils"] = utils
+    sys.modules["jetson.inference"] = inference
+    sys.modules["jtop"] = jtop_module
@@ -0,0 +1,184 @@
+from typing import List
+import threading
+import time
+
+class AdaptiveRateController():
+    '''
+    Adaptive Rate Controller
+
+    This class scales the camera frame rates and the inference admission
+    with the board temperatures and GPU load read from jtop.  The rate scale
+    is cut when a temperature or the GPU load reaches its high mark, raised
+    again step by step once every reading is back under its low mark, and
+    held in between.  At most one change is made every hold seconds.
+    '''
+    _lock = None                        # The controller lock
+    _temp_keys: List[str] = None        # The jtop temperature stat keys
+    _gpu_key: str = "GPU1"              # The jtop GPU load stat key
+    _temp_high: float = 80.0            # The temperature that cuts the rate
+    _temp_low: float = 70.0             # The temperature under which the rate recovers
+    _gpu_high: float = 95.0             # The GPU load that cuts the rate
+    _gpu_low: float = 75.0              # The GPU load under which the rate recovers
+    _decrease: float = 0.5              # The factor applied to the scale when hot
+    _increase: float = 0.1              # The step added to the scale when cool
+    _min_scale: float = 0.1             # The lowest scale
+    _hold: float = 10                   # The seconds between changes
+    _last_change: float = None          # The time of the last change
+    _credits: dict = None               # The admission credit of each source
+    _jetson = None                      # The jtop object
+    _attached = False                   # The jtop update callback status
+    _running = False                    # The polling loop status
+    _thread: threading.Thread = None    # The polling loop thread
+    scale: float = 1.0                  # The rate scale, 1 is the full rate
+    throttled = 0                       # The number of inference requests refused
+    changes = 0                         # The number of scale changes
+
+    def __init__(self, temp_high: float = 80.0, temp_low: float = 70.0,
+                 gpu_high: float = 95.0, gpu_low: float = 75.0,
+                 temp_keys: List[str] = None, gpu_key: str = "GPU1",
+                 decrease: float = 0.5, increase: float = 0.1,
+                 min_scale: float = 0.1, hold: float = 10):
+        '''
+        Initialize the controller
+
+        Temperatures are in degrees C and the GPU load in percent.  The
+        temperature keys default to the jtop "Temp GPU" and "Temp CPU"
+        stats.
+        '''
+        if temp_low > temp_high or gpu_low > gpu_high:
+            raise ValueError("Low marks must not be above the high marks")
+        self._lock = threading.Lock()
+        self._temp_keys = list(temp_keys) if temp_keys is not None else ["Temp GPU", "Temp CPU"]
+        self._gpu_key = gpu_key
+        self._temp_high = temp_high
+        self._temp_low = temp_low
+        self._gpu_high = gpu_high
+        self._gpu_low = gpu_low
+        self._decrease = decrease
+        self._increase = increase
+        self._min_scale = min_scale
+        self._hold = hold
+        self._last_change = None
+        self._credits = {}
+        self.scale = 1.0
+        self.throttled = 0
+        self.changes = 0
+
+    @staticmethod
+    def _reading(stats: dict, key: str) -> float:
+        try:
+            return float(stats.get(key))
+        except (TypeError, ValueError):
+            return None
+
+    def update(self, stats: dict, now: float = None) -> float:
+        '''
+        Update the rate scale
+
+        This method reads the temperatures and GPU load from the jtop stats
+        and returns the new rate scale.
+        '''
+        now = time.monotonic() if now is None else now
+        temps = [t for t in (self._reading(stats, key) for key in self._temp_keys) if t is not None]
+        gpu = self._reading(stats, self._gpu_key)
+        hot = any(t >= self._temp_high for t in temps) or (gpu is not None and gpu >= self._gpu_high)
+        cool = all(t <= self._temp_low for t in temps) and (gpu is None or gpu <= self._gpu_low)
+        with self._lock:
+            if self._last_change is not None and now - self._last_change < self._hold:
+                return self.scale
+            scale = self.scale
+            if hot:
+                scale = max(self._min_scale, scale * self._decrease)
+            elif cool:
+                scale = min(1.0, scale + self._increase)
+            if scale != self.scale:
+                print("Rate scale {:.2f} -> {:.2f} (temps {}, GPU {})".format(self.scale, scale, temps, gpu))
+                self.scale = scale
+                self._last_change = now
+                self.changes += 1
+            return self.scale
+
+    def period(self, period: float) -> float:
+        '''
+        Scale a capture period
+
+        This method returns the period stretched by the rate scale.
+        '''
+        return period / self.scale
+
+    def admit(self, source) -> bool:
+        '''
+        Admit an inference request
+
+        This method admits the share of each source's requests given by the
+        rate scale, spread evenly, and counts the refused requests.
+        '''
+        with self._lock:
+            if self.scale >= 1.0:
+                self._credits.pop(source, None)
+                return True
+            credit = self._credits.get(source, 1.0) + self.scale
+            if credit >= 1.0:
+                self._credits[source] = credit - 1.0
+                return True
+            self._credits[source] = credit
+            self.throttled += 1
+            return False
+
+    def metrics(self) -> dict:
+        '''
+        The controller metrics
+
+        This method returns the rate scale and the changes and refused
+        requests.
+        '''
+        with self._lock:
+            return {"scale": self.scale, "changes": self.changes, "throttled": self.throttled}
+
+    def on_jtop_update(self, jetson):
+        '''
+        Update the rate scale
+
+        This method is called by jtop for every new sample.
+        '''
+        self.update(jetson.stats)
+
+    def update_loop(self, jetson, interval: float):
+        '''
+        Update the rate scale in a loop
+
+        This method polls the jtop stats every interval seconds, for jtop
+        versions without update callbacks.
+        '''
+        while self._running:
+            self.update(jetson.stats)
+            time.sleep(interval)
+
+    def start(self, jetson, interval: float = 1):
+        '''
+        Start the controller
+
+        This method attaches the controller to the jtop update callback.
+        '''
+        self._jetson = jetson
+        if hasattr(jetson, "attach"):
+            jetson.attach(self.on_jtop_update)
+            self._attached = True
+        else:
+            self._running = True
+            self._thread = threading.Thread(target=self.update_loop, args=(jetson, interval), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the controller
+
+        This method detaches the controller from the jtop update callback.
+        '''
+        if self._attached:
+            self._jetson.detach(self.on_jtop_update)
+            self._attached = False
+        if self._thread is not None:
+            self._running = False
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,120 @@
+from collections import deque
+from typing import Callable
+import threading
+
+class BoundedQueue():
+    '''
+    Bounded Queue
+
+    This class is a thread safe queue with a fixed size.  When the queue is
+    full the oldest item is dropped so the latest item always wins, or with
+    the drop newest policy the new item is refused.  An on_drop callable is
+    given every dropped or refused item, e.g. to return its buffers.
+    '''
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+
+    _maxsize = 1                        # The maximum number of queued items
+    _policy = DROP_OLDEST               # The overflow policy
+    _items = None                       # The queued items
+    _cond = None                        # The condition guarding the items
+    _closed = False                     # The queue closed status
+    _on_drop: Callable = None           # The callable given each dropped item
+    dropped = 0                         # The number of dropped items
+
+    def __init__(self, maxsize: int = 1, policy: str = DROP_OLDEST, on_drop: Callable = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if policy not in (self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError("Unknown overflow policy: " + str(policy))
+        self._maxsize = maxsize
+        self._policy = policy
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._on_drop = on_drop
+        self.dropped = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @property
+    def on_drop(self) -> Callable:
+        return self._on_drop
+
+    def put(self, item) -> bool:
+        '''
+        Put an item on the queue
+
+        This method never blocks.  If the queue is full the oldest item is
+        dropped to make room, or with the drop newest policy the item is
+        refused.  Returns False if the item was refused or the queue is
+        closed.
+        '''
+        dropped = []
+        with self._cond:
+            refused = self._closed
+            if refused:
+                dropped.append(item)
+            elif len(self._items) >= self._maxsize:
+                self.dropped += 1
+                if self._policy == self.DROP_NEWEST:
+                    refused = True
+                    dropped.append(item)
+                else:
+                    dropped.append(self._items.popleft())
+            if not refused:
+                self._items.append(item)
+                self._cond.notify()
+        if self._on_drop is not None:
+            for dropped_item in dropped:
+                self._on_drop(dropped_item)
+        return not refused
+
+    def get(self, timeout: float = None):
+        '''
+        Get an item from the queue
+
+        This method blocks until an item is available, the timeout expires
+        or the queue is closed.  Returns None if no item is available.
+        '''
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def clear(self):
+        '''
+        Clear the queue
+
+        This method drops every queued item and hands it to on_drop.
+        Cleared items are not counted as dropped.
+        '''
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+        if self._on_drop is not None:
+            for item in items:
+                self._on_drop(item)
+
+    def close(self):
+        '''
+        Close the queue
+
+        This method wakes every waiting reader.  Items already queued can
+        still be read but new items are refused.
+        '''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,248 @@
+from paho.mqtt.client import Client
+from .mqtt.MQTTText import MQTTText
+from .NanoMqttUtil import entity_unique_id
+from .ModelRegistry import ModelRegistry
+from .InferenceScheduler import InferenceScheduler
+from .NanoMqttMetrics import NanoMqttMetrics
+from .CudaBufferPool import CudaBufferPool
+from concurrent.futures import CancelledError, Future
+import re
+import time
+
+class CameraConsumer():
+    '''
+    Camera Consumer
+
+    This class runs a detectNet, imageNet or poseNet network on the frames
+    captured by a camera, at its own rate, and publishes the result to its
+    own label entity.  The consumer retains the pooled CUDA frame instead of
+    copying it and submits the network to the inference scheduler without
+    waiting, so a slow network never stalls the camera.  At most one frame
+    waits for the network and a newer frame replaces it.  The network runs
+    without an overlay, so the frame is not encoded or modified.
+    '''
+    NETWORKS = ("detectNet", "imageNet", "poseNet")
+    name = None                         # The name of the consumer
+    _network_class = None               # The network class or its name
+    _network = None                     # The network name
+    _threshold: float = None            # The network threshold
+    _interval: float = 1                # The seconds between runs
+    _priority: int = 0                  # The inference scheduler priority
+    _deadline: float = None             # The seconds a frame may wait for the GPU
+    _source = None                      # The inference scheduler source name
+    _inference = None                   # The network
+    _models: ModelRegistry = None       # The model registry
+    _scheduler: InferenceScheduler = None  # The inference scheduler
+    _buffers: CudaBufferPool = None     # The CUDA buffer pool
+    _pending: Future = None             # The frame waiting for or running the network
+    _metrics: NanoMqttMetrics = None    # The latency metrics
+    _camera_name = None                 # The name of the camera
+    _load: Future = None                # The background network load
+    _next_run: float = None             # The time of the next run
+    label: MQTTText = None              # The consumer label MQTT Entity
+    result = None                       # The last network result
+    runs = 0                            # The number of runs
+    dropped = 0                         # The number of frames dropped by a newer frame or the scheduler
+    skipped = 0                         # The number of frames skipped while the network runs
+
+    def __init__(self, name: str, network_class, network: str = None, threshold: float = None,
+                 interval: float = 1, priority: int = 0, deadline: float = None):
+        '''
+        Initialize the consumer
+
+        network_class is detectNet, imageNet or poseNet, or its name.  The
+        consumer runs on a frame at most every interval seconds, at priority
+        on the inference scheduler, and drops a frame still waiting for the
+        GPU after deadline seconds.
+        '''
+        class_name = network_class if isinstance(network_class, str) else network_class.__name__
+        if class_name not in self.NETWORKS:
+            raise ValueError("Unsupported consumer network: " + str(class_name))
+        self.name = name
+        self._network_class = network_class
+        self._network = network
+        self._threshold = threshold
+        self._interval = interval
+        self._priority = priority
+        self._deadline = deadline
+        self._next_run = None
+        self._pending = None
+        self.runs = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    @property
+    def class_name(self) -> str:
+        return self._network_class if isinstance(self._network_class, str) else self._network_class.__name__
+
+    @property
+    def ready(self) -> bool:
+        '''
+        The consumer has its network
+        '''
+        return self._inference is not None
+
+    def initialize(self, camera_name: str, client: Client, dev: dict, models: ModelRegistry,
+                   scheduler: InferenceScheduler, metrics: NanoMqttMetrics = None,
+                   background_load: bool = False, buffers: CudaBufferPool = None):
+        '''
+        Initialize the consumer
+
+        This method creates the label entity under the camera and acquires
+        the network from the model registry, in the background with
+        background_load.  The frames are retained in the buffers pool, the
+        shared pool by default.
+        '''
+        self._camera_name = camera_name
+        self._models = models
+        self._scheduler = scheduler
+        self._metrics = metrics
+        self._buffers = buffers if buffers is not None else CudaBufferPool.shared()
+        self._source = camera_name + " " + self.name
+        entity_name = re.sub('[^A-Za-z0-9]', '_', camera_name + " " + self.name)
+        self.label = MQTTText(self._source, "jetson_cam_consumer_" + entity_name, client,
+                              unique_id=entity_unique_id(dev, self._source), device_dict=dev)
+        network_class = self._network_class
+        if isinstance(network_class, str):
+            import jetson.inference
+            network_class = getattr(jetson.inference, network_class)
+        if background_load:
+            self.label.send_offline()
+            self._load = models.load(network_class, self._network, self._threshold)
+            self._load.add_done_callback(self.on_network_loaded)
+        else:
+            self._inference = models.acquire(network_class, self._network, self._threshold)
+
+    def on_network_loaded(self, load: Future):
+        '''
+        Finish the background network load
+
+        This method is called on the load pool once the network is loaded.
+        '''
+        try:
+            model = load.result()
+        except Exception as e:
+            print(self._source + " network failed to load: " + str(e))
+            return
+        if self.label is None:
+            self._models.release(model)
+            return
+        self._inference = model
+        self._load = None
+        self.label.send_online()
+
+    def due(self, now: float) -> bool:
+        '''
+        Check if the consumer is due
+
+        This method returns True if the consumer has its network and its
+        interval passed since the last run.
+        '''
+        if self._inference is None:
+            return False
+        if self._next_run is not None and now < self._next_run:
+            return False
+        self._next_run = now + self._interval
+        return True
+
+    def run(self, img):
+        '''
+        Run the network
+
+        This method runs the network on the image without an overlay.
+        Executed on the inference scheduler.
+        '''
+        from jetson.utils import cudaDeviceSynchronize
+        class_name = self.class_name
+        if class_name == "detectNet":
+            result = self._inference.Detect(img, overlay="none")
+        elif class_name == "imageNet":
+            result = self._inference.Classify(img)
+        else:
+            result = self._inference.Process(img, overlay="none")
+        cudaDeviceSynchronize()
+        return result
+
+    def consume(self, img) -> Future:
+        '''
+        Consume a frame
+
+        This method retains the pooled image and submits the network to the
+        inference scheduler without waiting for it.  The camera must not
+        draw on a retained image.  A frame still waiting for the network is
+        replaced, and the frame is skipped while the network runs.  Returns
+        the future of the submitted run, or None if the frame was skipped.
+        '''
+        pending = self._pending
+        if pending is not None and not pending.cancel() and not pending.done():
+            self.skipped += 1
+            return None
+        start = time.perf_counter()
+        self._buffers.retain(img)
+        deadline = time.monotonic() + self._deadline if self._deadline is not None else None
+        future = self._scheduler.submit(self._source, self.run, img, priority=self._priority,
+                                        deadline=deadline, model=self._inference)
+        self._pending = future
+        future.add_done_callback(lambda future: self.on_result(future, img, start))
+        return future
+
+    def on_result(self, future: Future, img, start: float):
+        '''
+        Finish a run
+
+        This method releases the frame and publishes the result.  It
+        is called on the inference scheduler once the run is done, dropped
+        or replaced.
+        '''
+        self._buffers.release(img)
+        try:
+            result = future.result()
+        except CancelledError:
+            self.dropped += 1
+            return
+        except Exception as e:
+            print(self._source + " failed: " + str(e))
+            return
+        if self.label is None:
+            return
+        self.result = result
+        self.runs += 1
+        self.publish(result)
+        if self._metrics is not None:
+            self._metrics.observe(self._camera_name, self.name, time.perf_counter() - start)
+
+    def publish(self, result):
+        '''
+        Publish a result
+
+        This method publishes the class of the first detection, the image
+        class, or the number of poses to the label entity.
+        '''
+        class_name = self.class_name
+        if class_name == "detectNet":
+            if len(result) > 0:
+                self.label.publish_state(self._inference.GetClassDesc(result[0].ClassID))
+            else:
+                self.label.publish_state("None")
+        elif class_name == "imageNet":
+            class_id, confidence = result
+            self.label.publish_state(self._inference.GetClassDesc(class_id))
+        else:
+            self.label.publish_state(len(result))
+
+    def close(self):
+        '''
+        Close the consumer
+
+        This method drops the frame waiting for the network, closes the
+        label entity and releases the network.
+        '''
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        if self.label is not None:
+            self.label.close()
+            self.label = None
+        if self._inference is not None:
+            self._models.release(self._inference)
+            self._inference = None
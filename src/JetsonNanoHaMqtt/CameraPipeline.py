@@ -0,0 +1,368 @@
+from typing import Callable, List, Tuple
+from .BoundedQueue import BoundedQueue
+from .NanoMqttMetrics import NanoMqttMetrics
+from .AdaptiveRateController import AdaptiveRateController
+import asyncio
+import threading
+import time
+
+class CameraFrame():
+    '''
+    Camera Frame
+
+    This class carries a captured frame and the results of each stage
+    through the camera pipeline.
+    '''
+    img = None                          # The captured image
+    timestamp = None                    # The capture timestamp
+    detections = None                   # The inference detections
+    motion = None                       # The motion status
+    events = None                       # The detection track events
+    label = None                        # The inference label
+    roi = None                          # The detection region of interest
+    snapshot = None                     # The cropped detection image
+    image = None                        # The encoded frame
+    preview_image = None                # The encoded preview frame
+    snapshot_image = None               # The encoded detection image
+
+    def __init__(self, img, timestamp=None):
+        self.img = img
+        self.timestamp = timestamp
+        self.detections = []
+
+
+class CameraPipeline():
+    '''
+    Camera Pipeline
+
+    This class runs the capture stage and each processing stage on its own
+    thread.  The stages are joined by bounded queues where the latest frame
+    wins, so a slow stage drops frames instead of stalling the capture.
+    '''
+    _name = None                        # The name of the pipeline
+    _capture = None                     # The capture callable
+    _stages = None                      # The (name, callable) stages
+    _frequency = 1                      # The capture period in seconds
+    _queues: List[BoundedQueue] = None  # The queues in front of each stage
+    _threads: List[threading.Thread] = None  # The stage threads
+    _stop_event = None                  # The stop event
+    _metrics: NanoMqttMetrics = None    # The stage latency metrics
+    _rate_controller: AdaptiveRateController = None  # The adaptive rate controller
+    _release: Callable = None           # The callable given each frame leaving the pipeline
+    captured = 0                        # The number of captured frames
+
+    def __init__(self, name: str, capture: Callable, stages: List[Tuple[str, Callable]],
+                 frequency: float = 1, queue_size: int = 1, metrics: NanoMqttMetrics = None,
+                 rate_controller: AdaptiveRateController = None, release: Callable = None):
+        '''
+        Initialize the pipeline
+
+        The capture callable returns a frame or None.  Each stage callable
+        takes a frame and returns the frame for the next stage, or None to
+        drop it.  With metrics, the time spent in the capture and in each
+        stage is recorded under the pipeline name.  With a rate controller,
+        the capture period is stretched by its rate scale.  The release
+        callable is given every frame once it leaves the pipeline: after the
+        last stage, or when a queue or a stage drops it.
+        '''
+        self._name = name
+        self._capture = capture
+        self._stages = list(stages)
+        self._frequency = frequency
+        self._release = release
+        self._queues = [BoundedQueue(queue_size, on_drop=release) for _ in self._stages]
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._metrics = metrics
+        self._rate_controller = rate_controller
+        self.captured = 0
+
+    @property
+    def running(self) -> bool:
+        return len(self._threads) > 0 and not self._stop_event.is_set()
+
+    @property
+    def dropped(self) -> dict:
+        '''
+        The number of frames dropped in front of each stage
+        '''
+        return {stage[0]: queue.dropped for stage, queue in zip(self._stages, self._queues)}
+
+    @property
+    def queue_depth(self) -> dict:
+        '''
+        The number of frames waiting in front of each stage
+        '''
+        return {stage[0]: len(queue) for stage, queue in zip(self._stages, self._queues)}
+
+    def period(self) -> float:
+        '''
+        The capture period
+
+        This method returns the target time between captures in seconds,
+        stretched by the rate controller when the board is hot or busy.
+        '''
+        if self._rate_controller is not None:
+            return self._rate_controller.period(self._frequency)
+        return self._frequency
+
+    def capture_loop(self):
+        '''
+        Capture frames in a loop
+
+        This method captures frames at the target period.  The time spent
+        capturing counts against the period, and a late capture starts the
+        next period immediately instead of trying to catch up.
+        '''
+        next_capture = time.monotonic()
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                frame = self._capture()
+            except Exception as e:
+                print(self._name + " capture failed: " + str(e))
+                frame = None
+            if frame is not None:
+                if self._metrics is not None:
+                    self._metrics.observe(self._name, "capture", time.perf_counter() - start)
+                self.captured += 1
+                if self._queues:
+                    self._queues[0].put(frame)
+                elif self._release is not None:
+                    self._release(frame)
+            next_capture += self.period()
+            delay = next_capture - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_capture = time.monotonic()
+
+    def stage_loop(self, index: int):
+        '''
+        Run a stage in a loop
+
+        This method takes frames from the stage queue, runs the stage and
+        hands the result to the next stage.
+        '''
+        name, stage = self._stages[index]
+        queue = self._queues[index]
+        next_queue = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        while not self._stop_event.is_set():
+            frame = queue.get(timeout=0.5)
+            if frame is None:
+                continue
+            start = time.perf_counter()
+            try:
+                result = stage(frame)
+            except Exception as e:
+                print(self._name + " " + name + " failed: " + str(e))
+                result = None
+            if self._metrics is not None:
+                self._metrics.observe(self._name, name, time.perf_counter() - start)
+            if result is not None and next_queue is not None:
+                next_queue.put(result)
+            elif self._release is not None:
+                self._release(frame if result is None else result)
+
+    def start(self):
+        '''
+        Start the pipeline
+
+        This method starts the capture thread and a thread for each stage.
+        '''
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._queues = [BoundedQueue(queue.maxsize, queue.policy, queue.on_drop) for queue in self._queues]
+        self._threads = [threading.Thread(target=self.capture_loop, name=self._name + " capture", daemon=True)]
+        for index, stage in enumerate(self._stages):
+            self._threads.append(threading.Thread(target=self.stage_loop, args=(index,),
+                                                  name=self._name + " " + stage[0], daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None):
+        '''
+        Stop the pipeline
+
+        This method signals every stage to stop and waits for the threads.
+        The frames left in the queues are handed to the release callable.
+        '''
+        self._stop_event.set()
+        for queue in self._queues:
+            queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        for queue in self._queues:
+            queue.clear()
+
+
+class AsyncCameraPipeline(CameraPipeline):
+    '''
+    Async Camera Pipeline
+
+    This class runs the capture and each stage as a task on an asyncio event
+    loop instead of a thread.  Blocking calls run on the executor, the
+    inline stages run on the loop, and the stages are joined by bounded
+    queues where the latest frame wins.  Stopping cancels the tasks, so the
+    pipeline never waits out a capture period or an idle queue.
+    '''
+    _loop = None                        # The event loop
+    _executor = None                    # The executor of the blocking calls
+    _inline: set = None                 # The names of the stages run on the loop
+    _queue_size = 1                     # The size of the queues
+    _async_queues: list = None          # The asyncio queues in front of each stage
+    _dropped: list = None               # The frames dropped in front of each stage
+    _tasks: list = None                 # The capture and stage tasks
+
+    def __init__(self, name: str, capture: Callable, stages: List[Tuple[str, Callable]],
+                 frequency: float = 1, queue_size: int = 1, metrics: NanoMqttMetrics = None,
+                 rate_controller: AdaptiveRateController = None, loop=None, executor=None,
+                 inline: List[str] = (), release: Callable = None):
+        '''
+        Initialize the pipeline
+
+        The capture and the stages not named in inline run on the executor,
+        the default executor of the loop when it is None.  Inline stages
+        must not block.
+        '''
+        super().__init__(name, capture, stages, frequency=frequency, queue_size=queue_size,
+                         metrics=metrics, rate_controller=rate_controller, release=release)
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._executor = executor
+        self._inline = set(inline)
+        self._queue_size = queue_size
+        self._async_queues = []
+        self._dropped = [0 for _ in self._stages]
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def dropped(self) -> dict:
+        return {stage[0]: dropped for stage, dropped in zip(self._stages, self._dropped)}
+
+    @property
+    def queue_depth(self) -> dict:
+        return {stage[0]: queue.qsize() for stage, queue in zip(self._stages, self._async_queues)}
+
+    def _put(self, index: int, frame):
+        queue = self._async_queues[index]
+        if queue.full():
+            dropped = queue.get_nowait()
+            self._dropped[index] += 1
+            if self._release is not None:
+                self._release(dropped)
+        queue.put_nowait(frame)
+
+    async def capture_task(self):
+        '''
+        Capture frames
+
+        This coroutine captures frames on the executor at the target
+        period, like the capture loop, until cancelled.
+        '''
+        next_capture = time.monotonic()
+        while True:
+            start = time.perf_counter()
+            try:
+                frame = await self._loop.run_in_executor(self._executor, self._capture)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(self._name + " capture failed: " + str(e))
+                frame = None
+            if frame is not None:
+                if self._metrics is not None:
+                    self._metrics.observe(self._name, "capture", time.perf_counter() - start)
+                self.captured += 1
+                if self._async_queues:
+                    self._put(0, frame)
+                elif self._release is not None:
+                    self._release(frame)
+            next_capture += self.period()
+            delay = next_capture - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_capture = time.monotonic()
+
+    async def stage_task(self, index: int):
+        '''
+        Run a stage
+
+        This coroutine takes frames from the stage queue, runs the stage on
+        the executor or the loop and hands the result to the next stage,
+        until cancelled.
+        '''
+        name, stage = self._stages[index]
+        queue = self._async_queues[index]
+        inline = name in self._inline
+        while True:
+            frame = await queue.get()
+            start = time.perf_counter()
+            try:
+                if inline:
+                    result = stage(frame)
+                else:
+                    result = await self._loop.run_in_executor(self._executor, stage, frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(self._name + " " + name + " failed: " + str(e))
+                result = None
+            if self._metrics is not None:
+                self._metrics.observe(self._name, name, time.perf_counter() - start)
+            if result is not None and index + 1 < len(self._async_queues):
+                self._put(index + 1, result)
+            elif self._release is not None:
+                self._release(frame if result is None else result)
+
+    def start(self):
+        '''
+        Start the pipeline
+
+        This method creates the capture task and a task for each stage.
+        Must be called on the loop thread.
+        '''
+        if self.running:
+            return
+        self._async_queues = [asyncio.Queue(maxsize=self._queue_size) for _ in self._stages]
+        self._tasks = [self._loop.create_task(self.capture_task())]
+        for index in range(len(self._stages)):
+            self._tasks.append(self._loop.create_task(self.stage_task(index)))
+
+    def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        # The frames left in the queues leave the pipeline
+        for queue in self._async_queues:
+            while not queue.empty():
+                frame = queue.get_nowait()
+                if self._release is not None:
+                    self._release(frame)
+
+    def stop(self, timeout: float = None):
+        '''
+        Stop the pipeline
+
+        This method cancels the tasks from any thread without waiting for
+        them and releases the frames left in the queues.  Await
+        wait_stopped to wait for the tasks.
+        '''
+        self._loop.call_soon_threadsafe(self._cancel)
+
+    async def wait_stopped(self, timeout: float = None):
+        '''
+        Wait for the pipeline to stop
+
+        This coroutine waits up to timeout seconds for the cancelled tasks.
+        A blocking call still running on the executor is left to finish on
+        its own.
+        '''
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        self._tasks = [task for task in self._tasks if not task.done()]
@@ -0,0 +1,444 @@
+from paho.mqtt.client import Client, MQTTMessage, MQTTMessageInfo
+from .AdaptiveRateController import AdaptiveRateController
+import multiprocessing
+import queue
+import threading
+import time
+
+class ProcessClient():
+    '''
+    Process Client
+
+    This class stands in for the MQTT client inside a camera worker
+    process.  Messages are sent to the parent process, which publishes them.
+    Payloads larger than the inline size are written to a free shared memory
+    slot instead of being pickled.  Subscriptions are made by the parent,
+    which forwards the received messages back to the worker.
+    '''
+
+    def __init__(self, messages, commands, slots, free_slots, slot_size: int, inline_size: int = 65536):
+        self._messages = messages
+        self._commands = commands
+        self._slots = slots
+        self._free_slots = free_slots
+        self._slot_size = slot_size
+        self._inline_size = inline_size
+        self._callbacks = {}
+        self.dropped = 0
+
+    def _send(self, message: tuple) -> bool:
+        try:
+            self._messages.put(message, block=False)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, **kwargs):
+        info = MQTTMessageInfo(0)
+        info._set_as_published()
+        if isinstance(payload, (bytes, bytearray)) and self._inline_size < len(payload) <= self._slot_size:
+            try:
+                slot = self._free_slots.get(block=False)
+            except queue.Empty:
+                self.dropped += 1
+                return info
+            start = slot * self._slot_size
+            memoryview(self._slots).cast("B")[start:start + len(payload)] = payload
+            if not self._send(("publish", topic, None, slot, len(payload), qos, retain)):
+                self._free_slots.put(slot)
+            return info
+        self._send(("publish", topic, payload, None, 0, qos, retain))
+        return info
+
+    def subscribe(self, topic, qos: int = 0, **kwargs):
+        self._send(("subscribe", topic, qos))
+        return 0, 0
+
+    def unsubscribe(self, topic, **kwargs):
+        self._send(("unsubscribe", topic))
+        return 0, 0
+
+    def message_callback_add(self, topic: str, callback):
+        self._callbacks[topic] = callback
+
+    def message_callback_remove(self, topic: str):
+        self._callbacks.pop(topic, None)
+
+    def command_loop(self, stop_event):
+        '''
+        Dispatch the forwarded messages
+
+        This method calls the callback of each message the parent forwarded
+        until the worker is stopped.
+        '''
+        while not stop_event.is_set():
+            try:
+                topic, payload = self._commands.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            callback = self._callbacks.get(topic)
+            if callback is None:
+                continue
+            msg = MQTTMessage(topic=topic.encode("utf-8"))
+            msg.payload = payload
+            try:
+                callback(self, None, msg)
+            except Exception as e:
+                print("Command on " + topic + " failed: " + str(e))
+
+
+class ProcessRateScale():
+    '''
+    Process Rate Scale
+
+    This class stands in for the adaptive rate controller inside a camera
+    worker process.  The parent copies the controller's rate scale into
+    shared memory.
+    '''
+
+    def __init__(self, scale):
+        self._scale = scale
+
+    def period(self, period: float) -> float:
+        return period / self._scale.value
+
+
+class WorkerChannel():
+    '''
+    Worker Channel
+
+    This class holds the queues and shared memory slots of one worker
+    process.  Every worker gets a new channel, so a terminated worker can
+    not leave a corrupted queue or a lost slot behind.
+    '''
+
+    def __init__(self, context, slot_count: int, slot_size: int):
+        self.slots = context.RawArray("B", slot_count * slot_size)
+        self.free_slots = context.Queue()
+        for slot in range(slot_count):
+            self.free_slots.put(slot)
+        self.messages = context.Queue(maxsize=64)
+        self.commands = context.Queue(maxsize=64)
+        self.scale = context.RawValue("d", 1.0)
+
+    def close(self):
+        '''
+        Close the channel
+
+        This method closes the queues without waiting for data that was not
+        flushed.
+        '''
+        for channel_queue in (self.messages, self.commands, self.free_slots):
+            channel_queue.cancel_join_thread()
+            channel_queue.close()
+
+
+def camera_worker(name: str, dev: dict, camera_kwargs: dict, frequency: float, queue_size: int,
+                  messages, commands, slots, free_slots, slot_size: int, stop_event, heartbeat: float,
+                  scale=None):
+    '''
+    Run a camera worker
+
+    This function runs a camera pipeline in a worker process and sends the
+    camera metrics to the parent every heartbeat seconds until stopped.
+    With a shared rate scale, the capture is slowed like the parent's rate
+    controller.
+    '''
+    from .NanoMqttCamera import NanoMqttCamera
+    client = ProcessClient(messages, commands, slots, free_slots, slot_size)
+    threading.Thread(target=client.command_loop, args=(stop_event,), daemon=True).start()
+    if scale is not None:
+        camera_kwargs = dict(camera_kwargs, rate_controller=ProcessRateScale(scale))
+    camera = NanoMqttCamera(name, client, dev, **camera_kwargs)
+    camera.initialize()
+    camera.start(frequency=frequency, queue_size=queue_size)
+    try:
+        while not stop_event.wait(heartbeat):
+            metrics = camera.metrics()
+            metrics["ipc_dropped"] = client.dropped
+            client._send(("heartbeat", metrics))
+    finally:
+        camera.stop()
+
+
+class CameraProcess():
+    '''
+    Camera Process
+
+    This class runs a camera in its own worker process so cameras do not
+    share the GIL.  Encoded frames come back over shared memory slots and
+    are published by the parent on the shared MQTT client.  A supervisor
+    restarts a worker that exits or stops sending heartbeats, waiting longer
+    after each restart, on a new channel.  The rate scale of a rate
+    controller is copied to the worker every second.  Cameras running a
+    network stay in-process, where the networks are shared and serialized
+    by the model registry and the inference scheduler.
+    '''
+    _name = None                        # The name of the camera
+    _client = None                      # The MQTT client
+    _dev = None                         # The device dictionary
+    _camera_kwargs: dict = None         # The NanoMqttCamera keyword arguments
+    _context = None                     # The multiprocessing context
+    _slot_count = 4                     # The number of shared memory slots
+    _slot_size = 4 * 1024 * 1024        # The size of a shared memory slot
+    _watchdog: float = 30               # The seconds without heartbeat before a restart
+    _heartbeat: float = 5               # The seconds between worker heartbeats
+    _frequency: float = 1               # The capture period in seconds
+    _queue_size = 1                     # The pipeline queue size
+    _process = None                     # The worker process
+    _channel: WorkerChannel = None      # The queues and slots of the worker
+    _rate_controller: AdaptiveRateController = None  # The adaptive rate controller
+    _stop_event = None                  # The worker stop event
+    _running = False                    # The camera status
+    _threads: list = None               # The reader and supervisor threads
+    _subscriptions: set = None          # The topics subscribed for the worker
+    _last_heartbeat: float = None       # The time of the last worker message
+    _started: float = None              # The time the worker was started
+    _worker_metrics: dict = None        # The last metrics sent by the worker
+    restarts = 0                        # The number of worker restarts
+    published = 0                       # The number of messages published for the worker
+
+    def __init__(self, name: str, client: Client, dev: dict, camera_kwargs: dict = None,
+                 slots: int = 4, slot_size: int = 4 * 1024 * 1024, watchdog: float = 30,
+                 heartbeat: float = 5, start_method: str = "spawn",
+                 rate_controller: AdaptiveRateController = None):
+        '''
+        Initialize the camera process
+
+        camera_kwargs are passed to NanoMqttCamera in the worker and must be
+        picklable.  Each of the slots holds one encoded payload of up to
+        slot_size bytes.  Workers are started with the spawn method by
+        default so they never inherit the parent's CUDA context.  A rate
+        controller slows the worker's capture.
+
+        A worker has its own model registry, inference scheduler and CUDA
+        context, so the camera's networks would neither be shared nor
+        serialized with the rest of the device.  Camera inference and camera
+        consumers are refused with a ValueError; run them on an in-process
+        camera.
+        '''
+        camera_kwargs = dict(camera_kwargs) if camera_kwargs else {}
+        if camera_kwargs.get("inference"):
+            raise ValueError("Camera inference is not supported in a camera process")
+        if camera_kwargs.get("consumers"):
+            raise ValueError("Camera consumers are not supported in a camera process")
+        self._name = name
+        self._client = client
+        self._dev = dev
+        self._camera_kwargs = camera_kwargs
+        self._context = multiprocessing.get_context(start_method)
+        self._slot_count = slots
+        self._slot_size = slot_size
+        self._watchdog = watchdog
+        self._heartbeat = heartbeat
+        self._rate_controller = rate_controller
+        self._channel = None
+        self._threads = []
+        self._subscriptions = set()
+        self._worker_metrics = {}
+        self.restarts = 0
+        self.published = 0
+
+    def initialize(self):
+        '''
+        Initialize the camera process
+
+        The shared memory slots and the queues are allocated for each
+        worker.  The camera entities are created by the worker.
+        '''
+        return True
+
+    def spawn(self):
+        '''
+        Start a worker
+
+        This method starts a new worker process on a new channel.  Messages
+        left on the channel of a previous worker are ignored.
+        '''
+        channel = WorkerChannel(self._context, self._slot_count, self._slot_size)
+        self.update_scale(channel)
+        self._stop_event = self._context.Event()
+        self._process = self._context.Process(
+            target=camera_worker, name=self._name + " worker", daemon=True,
+            args=(self._name, self._dev, self._camera_kwargs, self._frequency, self._queue_size,
+                  channel.messages, channel.commands, channel.slots, channel.free_slots, self._slot_size,
+                  self._stop_event, self._heartbeat,
+                  channel.scale if self._rate_controller is not None else None))
+        self._channel = channel
+        self._last_heartbeat = self._started = time.monotonic()
+        self._process.start()
+
+    def forward(self, client, userdata, msg):
+        '''
+        Forward a message to the worker
+
+        This method is the MQTT callback of the worker subscriptions.
+        '''
+        try:
+            self._channel.commands.put((msg.topic, msg.payload), block=False)
+        except (queue.Full, ValueError):
+            print(self._name + " worker command queue full, message dropped")
+
+    def update_scale(self, channel: WorkerChannel = None):
+        '''
+        Copy the rate scale
+
+        This method copies the rate scale of the rate controller to the
+        worker channel.
+        '''
+        channel = channel if channel is not None else self._channel
+        if self._rate_controller is not None and channel is not None:
+            channel.scale.value = self._rate_controller.scale
+
+    def handle(self, message: tuple, channel: WorkerChannel = None):
+        '''
+        Handle a worker message
+
+        This method publishes a message from the worker, or makes a
+        subscription for it.
+        '''
+        channel = channel if channel is not None else self._channel
+        kind = message[0]
+        if kind == "publish":
+            topic, payload, slot, length, qos, retain = message[1:]
+            if slot is not None:
+                start = slot * self._slot_size
+                payload = bytes(memoryview(channel.slots).cast("B")[start:start + length])
+                channel.free_slots.put(slot)
+            self._client.publish(topic, payload, qos, retain)
+            self.published += 1
+        elif kind == "heartbeat":
+            self._worker_metrics = message[1]
+        elif kind == "subscribe":
+            if message[1] not in self._subscriptions:
+                self._subscriptions.add(message[1])
+                self._client.subscribe(message[1], message[2])
+                self._client.message_callback_add(message[1], self.forward)
+        elif kind == "unsubscribe":
+            topic = message[1]
+            prefix = topic[:-1] if topic.endswith("#") else None
+            for subscription in list(self._subscriptions):
+                if subscription == topic or (prefix is not None and subscription.startswith(prefix)):
+                    self._subscriptions.discard(subscription)
+                    self._client.message_callback_remove(subscription)
+                    self._client.unsubscribe(subscription)
+
+    def reader_loop(self):
+        '''
+        Read the worker messages
+
+        This method handles the worker messages until the camera is stopped.
+        A message read from the channel of a replaced worker is ignored and
+        the channel is closed.
+        '''
+        while self._running:
+            channel = self._channel
+            try:
+                message = channel.messages.get(timeout=0.5)
+            except queue.Empty:
+                message = None
+            if channel is not self._channel:
+                channel.close()
+                continue
+            if message is None:
+                continue
+            self._last_heartbeat = time.monotonic()
+            try:
+                self.handle(message, channel)
+            except Exception as e:
+                print(self._name + " worker message failed: " + str(e))
+
+    def supervise_loop(self):
+        '''
+        Supervise the worker
+
+        This method restarts the worker when it exits or stops sending
+        messages for the watchdog interval, backing off up to a minute
+        between restarts.
+        '''
+        backoff = 1
+        while self._running:
+            time.sleep(1)
+            if not self._running:
+                return
+            self.update_scale()
+            alive = self._process.is_alive()
+            if alive and time.monotonic() - self._last_heartbeat < self._watchdog:
+                if time.monotonic() - self._started >= 60:
+                    backoff = 1
+                continue
+            if alive:
+                print(self._name + " worker stopped responding, restarting")
+                self._process.terminate()
+            else:
+                print(self._name + " worker exited with code " + str(self._process.exitcode) + ", restarting")
+            self._process.join(5)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+            if self._running:
+                self.restarts += 1
+                self.spawn()
+
+    def metrics(self) -> dict:
+        '''
+        The camera metrics
+
+        This method returns the last metrics sent by the worker with the
+        restarts and the messages published for it.
+        '''
+        metrics = dict(self._worker_metrics)
+        metrics["restarts"] = self.restarts
+        metrics["published"] = self.published
+        return metrics
+
+    def start(self, frequency: float = 1, queue_size: int = 1):
+        '''
+        Start the camera
+
+        This method starts the worker, the message reader and the
+        supervisor.
+        '''
+        if self._running:
+            return
+        self._frequency = frequency
+        self._queue_size = queue_size
+        self._running = True
+        self.spawn()
+        self._threads = [threading.Thread(target=self.reader_loop, name=self._name + " reader", daemon=True),
+                         threading.Thread(target=self.supervise_loop, name=self._name + " supervisor", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10):
+        '''
+        Stop the camera
+
+        This method stops the supervisor and the worker, terminating the
+        worker if it does not exit within the timeout.
+        '''
+        if not self._running:
+            return
+        self._running = False
+        self._stop_event.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._channel.close()
+        self._channel = None
+
+    def close(self):
+        '''
+        Close the camera
+
+        This method stops the worker and removes its subscriptions.
+        '''
+        self.stop()
+        for topic in list(self._subscriptions):
+            self._client.message_callback_remove(topic)
+            self._client.unsubscribe(topic)
+        self._subscriptions = set()
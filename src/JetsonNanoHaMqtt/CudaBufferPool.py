@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from typing import Callable
+import threading
+
+FORMAT_BYTES = {
+    "rgb8": 3,
+    "bgr8": 3,
+    "rgba8": 4,
+    "bgra8": 4,
+    "gray8": 1,
+    "rgb32f": 12,
+    "rgba32f": 16,
+}
+
+
+class CudaBufferPool():
+    '''
+    CUDA Buffer Pool
+
+    This class reuses mapped CUDA images keyed by (width, height, format)
+    across frames instead of allocating a new image for every frame.  It
+    counts the allocations and the bytes copied into its buffers so the
+    saving can be measured.  The free images are capped per key and in
+    total bytes, so sizes that change every frame (e.g. detection crops)
+    do not pin memory; the least recently released sizes are dropped
+    first.  An image handed to more than one reader is retained by each
+    extra reader and only returns to the pool after the last release.
+    '''
+    _shared = None                      # The shared pool
+    _shared_lock = threading.Lock()     # The shared pool lock
+    _allocator: Callable = None         # The CUDA image allocator
+    _lock = None                        # The pool lock
+    _free: OrderedDict = None           # The free images by key, least recently released first
+    _refs: dict = None                  # The extra references of retained images by id
+    _max_free = 4                       # The free images kept per key
+    _max_bytes = 64 * 1024 * 1024       # The free image bytes kept in total
+    free_bytes = 0                      # The number of bytes in free images
+    evictions = 0                       # The number of free images dropped
+    allocations = 0                     # The number of allocated images
+    allocated_bytes = 0                 # The number of allocated bytes
+    reuses = 0                          # The number of reused images
+    bytes_copied = 0                    # The number of bytes copied into images
+
+    def __init__(self, allocator: Callable = None, max_free: int = 4, max_bytes: int = 64 * 1024 * 1024):
+        '''
+        Initialize the pool
+
+        The allocator is called as allocator(width=, height=, format=) and
+        defaults to jetson.utils.cudaAllocMapped.  Up to max_free images are
+        kept per key and up to max_bytes in total.
+        '''
+        if allocator is None:
+            from jetson.utils import cudaAllocMapped
+            allocator = cudaAllocMapped
+        self._allocator = allocator
+        self._lock = threading.Lock()
+        self._free = OrderedDict()
+        self._refs = {}
+        self._max_free = max_free
+        self._max_bytes = max_bytes
+        self.free_bytes = 0
+        self.evictions = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.reuses = 0
+        self.bytes_copied = 0
+
+    @classmethod
+    def shared(cls) -> 'CudaBufferPool':
+        '''
+        The shared pool
+
+        This method returns the pool shared by every entity, creating it on
+        first use.
+        '''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def size(key: tuple) -> int:
+        return key[0] * key[1] * FORMAT_BYTES.get(key[2], 4)
+
+    def acquire(self, width: int, height: int, format: str):
+        '''
+        Acquire an image
+
+        This method returns a free image of the size and format, allocating
+        one if none is free.  The contents of a reused image are undefined.
+        '''
+        key = (int(width), int(height), str(format))
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reuses += 1
+                self.free_bytes -= self.size(key)
+                img = free.pop()
+                if not free:
+                    del self._free[key]
+                return img
+            self.allocations += 1
+            self.allocated_bytes += self.size(key)
+        return self._allocator(width=key[0], height=key[1], format=key[2])
+
+    def retain(self, img):
+        '''
+        Retain an image
+
+        This method adds a reference to an acquired image, so it stays out
+        of the pool until it was released once more for every retain.
+        '''
+        with self._lock:
+            self._refs[id(img)] = self._refs.get(id(img), 0) + 1
+
+    def retained(self, img) -> bool:
+        '''
+        The image has other readers
+
+        This method returns True while more than one reader holds the
+        image.
+        '''
+        with self._lock:
+            return id(img) in self._refs
+
+    def release(self, img):
+        '''
+        Release an image
+
+        This method drops a reference to the image and returns it to the
+        pool once it has none left.  Images beyond max_free per key are
+        dropped, then the images of the least recently released keys are
+        dropped until the free images fit max_bytes.
+        '''
+        if img is None:
+            return
+        key = (int(img.width), int(img.height), str(img.format))
+        size = self.size(key)
+        with self._lock:
+            refs = self._refs.get(id(img))
+            if refs is not None:
+                if refs > 1:
+                    self._refs[id(img)] = refs - 1
+                else:
+                    del self._refs[id(img)]
+                return
+            free = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(free) >= self._max_free or size > self._max_bytes:
+                self.evictions += 1
+                if not free:
+                    del self._free[key]
+                return
+            free.append(img)
+            self.free_bytes += size
+            while self.free_bytes > self._max_bytes:
+                oldest, images = next(iter(self._free.items()))
+                images.pop(0)
+                if not images:
+                    del self._free[oldest]
+                self.free_bytes -= self.size(oldest)
+                self.evictions += 1
+
+    def record_copy(self, size: int):
+        '''
+        Record a copy
+
+        This method adds the bytes copied into a pooled image to the count.
+        '''
+        with self._lock:
+            self.bytes_copied += size
+
+    def metrics(self) -> dict:
+        '''
+        The pool metrics
+
+        This method returns the allocation, reuse and copy counts.
+        '''
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "allocated_bytes": self.allocated_bytes,
+                "reuses": self.reuses,
+                "bytes_copied": self.bytes_copied,
+                "free": sum(len(free) for free in self._free.values()),
+                "free_bytes": self.free_bytes,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        '''
+        Clear the pool
+
+        This method drops every free image.  Retained images are not
+        affected.
+        '''
+        with self._lock:
+            self._free = OrderedDict()
+            self.free_bytes = 0
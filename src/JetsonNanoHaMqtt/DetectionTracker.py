@@ -0,0 +1,181 @@
+from typing import Callable, List
+import time
+
+def box_iou(a: tuple, b: tuple) -> float:
+    '''
+    Intersection over union of two boxes
+
+    This function returns the IoU of two (left, top, right, bottom) boxes.
+    '''
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def detection_box(detection) -> tuple:
+    return (detection.Left, detection.Top, detection.Right, detection.Bottom)
+
+
+class DetectionFilter():
+    '''
+    Detection Filter
+
+    This class keeps the detections of the allowed classes whose confidence
+    reaches the floor of their class.
+    '''
+    _classes: set = None                # The allowed class names, None allows every class
+    _min_confidence: dict = None        # The confidence floor of each class name
+    _default_confidence: float = 0.0    # The confidence floor of other classes
+
+    def __init__(self, classes: List[str] = None, min_confidence: dict = None, default_confidence: float = 0.0):
+        self._classes = set(classes) if classes is not None else None
+        self._min_confidence = dict(min_confidence) if min_confidence else {}
+        self._default_confidence = default_confidence
+
+    def accept(self, class_desc: str, confidence: float) -> bool:
+        '''
+        Check a detection
+
+        This method returns True if the class is allowed and the confidence
+        reaches its floor.
+        '''
+        if self._classes is not None and class_desc not in self._classes:
+            return False
+        return confidence >= self._min_confidence.get(class_desc, self._default_confidence)
+
+    def filter(self, detections: list, class_desc: Callable) -> list:
+        '''
+        Filter detections
+
+        This method returns the accepted detections.  class_desc maps a
+        class id to its name, e.g. detectNet.GetClassDesc.
+        '''
+        return [d for d in detections if self.accept(class_desc(d.ClassID), d.Confidence)]
+
+
+class Track():
+    '''
+    Track
+
+    This class follows one object across frames.
+    '''
+    id = 0                              # The track id
+    class_id = None                     # The class id
+    label = None                        # The class name
+    box: tuple = None                   # The last (left, top, right, bottom) box
+    confidence: float = 0.0             # The last confidence
+    first_seen: float = None            # The time the object appeared
+    last_seen: float = None             # The time the object was last detected
+
+    def __init__(self, id: int, class_id, label: str, box: tuple, confidence: float, now: float):
+        self.id = id
+        self.class_id = class_id
+        self.label = label
+        self.box = box
+        self.confidence = confidence
+        self.first_seen = now
+        self.last_seen = now
+
+
+class TrackEvent():
+    '''
+    Track Event
+
+    This class reports a track that appeared, changed class or left.
+    '''
+    NEW = "new"
+    CHANGED = "changed"
+    LEFT = "left"
+    kind = None                         # The event kind
+    track: Track = None                 # The track
+
+    def __init__(self, kind: str, track: Track):
+        self.kind = kind
+        self.track = track
+
+    def __repr__(self):
+        return "<TrackEvent {} {} #{}>".format(self.kind, self.track.label, self.track.id)
+
+
+class DetectionTracker():
+    '''
+    Detection Tracker
+
+    This class matches the detections of each frame to the tracked objects
+    by IoU, greedily from the best overlap.  It reports an event when an
+    object appears, when a tracked object changes class, and when a tracked
+    object was not detected for leave_after seconds.
+    '''
+    _iou_threshold: float = 0.3         # The overlap that matches a detection to a track
+    _leave_after: float = 5             # The seconds an object is missing before it left
+    _next_id = 1                        # The next track id
+    tracks: List[Track] = None          # The tracked objects
+    events = 0                          # The number of reported events
+
+    def __init__(self, iou_threshold: float = 0.3, leave_after: float = 5):
+        self._iou_threshold = iou_threshold
+        self._leave_after = leave_after
+        self._next_id = 1
+        self.tracks = []
+        self.events = 0
+
+    def update(self, detections: list, class_desc: Callable, now: float = None) -> List[TrackEvent]:
+        '''
+        Update the tracks
+
+        This method matches the detections of a frame to the tracks and
+        returns the events.  class_desc maps a class id to its name.
+        '''
+        now = time.monotonic() if now is None else now
+        boxes = [detection_box(d) for d in detections]
+        pairs = sorted(((box_iou(track.box, box), t, d)
+                        for t, track in enumerate(self.tracks)
+                        for d, box in enumerate(boxes)), key=lambda pair: pair[0], reverse=True)
+        matched_tracks = set()
+        matched_detections = set()
+        events = []
+        for iou, t, d in pairs:
+            if iou < self._iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.tracks[t]
+            detection = detections[d]
+            track.box = boxes[d]
+            track.confidence = detection.Confidence
+            track.last_seen = now
+            if detection.ClassID != track.class_id:
+                track.class_id = detection.ClassID
+                track.label = class_desc(detection.ClassID)
+                events.append(TrackEvent(TrackEvent.CHANGED, track))
+        for d, detection in enumerate(detections):
+            if d in matched_detections:
+                continue
+            track = Track(self._next_id, detection.ClassID, class_desc(detection.ClassID),
+                          boxes[d], detection.Confidence, now)
+            self._next_id += 1
+            self.tracks.append(track)
+            events.append(TrackEvent(TrackEvent.NEW, track))
+        remaining = []
+        for track in self.tracks:
+            if now - track.last_seen >= self._leave_after:
+                events.append(TrackEvent(TrackEvent.LEFT, track))
+            else:
+                remaining.append(track)
+        self.tracks = remaining
+        self.events += len(events)
+        return events
+
+    def reset(self):
+        '''
+        Reset the tracker
+
+        This method forgets every track.
+        '''
+        self.tracks = []
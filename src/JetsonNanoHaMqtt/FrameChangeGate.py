@@ -0,0 +1,81 @@
+import numpy as np
+import time
+
+def gray_signature(frame: np.ndarray, size: int = 32) -> np.ndarray:
+    '''
+    Grayscale signature of a frame
+
+    This function downsamples a frame by striding to roughly size x size
+    pixels and averages the color channels into a float32 grayscale image.
+    '''
+    height, width = frame.shape[:2]
+    small = frame[::max(1, height // size), ::max(1, width // size)]
+    if small.ndim == 3:
+        return small[..., :3].mean(axis=2, dtype=np.float32)
+    return small.astype(np.float32)
+
+
+class FrameChangeGate():
+    '''
+    Frame Change Gate
+
+    This class compares a grayscale signature of each frame with the last
+    frame that passed the gate.  Frames that changed less than the threshold
+    are held back, except once every keepalive interval.
+    '''
+    _threshold = 2.0                    # The mean gray level difference to pass
+    _keepalive = 60                     # The seconds between keep-alive frames
+    _size = 32                          # The signature size in pixels
+    _signature = None                   # The signature of the last passed frame
+    _last_passed = None                 # The time of the last passed frame
+    passed = 0                          # The number of passed frames
+    skipped = 0                         # The number of skipped frames
+
+    def __init__(self, threshold: float = 2.0, keepalive: float = 60, size: int = 32):
+        self._threshold = threshold
+        self._keepalive = keepalive
+        self._size = size
+        self._signature = None
+        self._last_passed = None
+        self.passed = 0
+        self.skipped = 0
+
+    def difference(self, signature: np.ndarray) -> float:
+        '''
+        Difference from the last passed frame
+
+        This method returns the mean absolute gray level difference between
+        the signature and the last passed signature.
+        '''
+        if self._signature is None or self._signature.shape != signature.shape:
+            return float('inf')
+        return float(np.abs(signature - self._signature).mean())
+
+    def changed(self, frame: np.ndarray, now: float = None) -> bool:
+        '''
+        Check if a frame changed
+
+        This method returns True if the frame should be published, either
+        because it changed or because the keep-alive interval expired.
+        '''
+        if now is None:
+            now = time.monotonic()
+        signature = gray_signature(frame, self._size)
+        keepalive = (self._keepalive is not None and self._last_passed is not None
+                     and now - self._last_passed >= self._keepalive)
+        if keepalive or self.difference(signature) >= self._threshold:
+            self._signature = signature
+            self._last_passed = now
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        '''
+        Reset the gate
+
+        This method forgets the last passed frame so the next frame passes.
+        '''
+        self._signature = None
+        self._last_passed = None
@@ -0,0 +1,180 @@
+from typing import Callable, List
+from HaMqtt.MQTTUtil import HaDeviceClass
+import math
+import re
+
+def format_percent(value):
+    '''
+    Format a utilization percentage, publishing a core that is switched off
+    (OFF) as -1
+    '''
+    if value == "OFF":
+        return -1
+    return f'{value:3}'
+
+
+def memory_percent(attribute: str) -> Callable:
+    '''
+    Read the used share of a jtop memory as a percentage
+
+    The returned reader takes jtop and divides the use by the total of its
+    ram or swap dictionary.  The RAM and SWAP stats hold the use only, in
+    kB and MB.
+    '''
+    def read(jetson):
+        memory = getattr(jetson, attribute, None)
+        if not memory or not memory.get('tot'):
+            return None
+        return memory['use'] / memory['tot'] * 100
+    return read
+
+
+def format_float(value):
+    '''
+    Format a float with two decimals
+    '''
+    return f'{value:2.2f}'
+
+
+def format_raw(value):
+    '''
+    Publish the value as is
+    '''
+    return value
+
+
+def _capitalize(text: str) -> str:
+    return text[:1].upper() + text[1:]
+
+
+class HardwareSensor():
+    '''
+    Hardware Sensor
+
+    This class describes how jtop stat keys matching a pattern are published
+    as Home Assistant sensors.  The name and node id templates are formatted
+    with the pattern groups, {0} being the whole key.
+    '''
+    pattern = None                      # The jtop stat key pattern
+    name = None                         # The entity name template
+    node_id = None                      # The entity node id template
+    unit = None                         # The unit of measurement
+    device_class = None                 # The Home Assistant device class
+    thermometer = False                 # Create a thermometer entity
+    formatter: Callable = None          # The state formatter
+    reader: Callable = None             # Reads the value from jtop in place of the stat
+    interval: float = None              # The sample interval in seconds
+
+    def __init__(self, pattern: str, name: str, node_id: str, unit: str, device_class=None,
+                 formatter: Callable = format_raw, interval: float = None, thermometer: bool = False,
+                 reader: Callable = None):
+        self.pattern = re.compile(pattern)
+        self.name = name
+        self.node_id = node_id
+        self.unit = unit
+        self.device_class = device_class
+        self.formatter = formatter
+        self.interval = interval
+        self.thermometer = thermometer
+        self.reader = reader
+
+    def read(self, jetson, stats: dict, key: str):
+        '''
+        Read a value
+
+        This method returns the value of the jtop stat key, or the value
+        read from jtop by the reader.  Returns None if there is no value.
+        '''
+        if self.reader is not None:
+            return self.reader(jetson)
+        return stats.get(key)
+
+    def match(self, key: str):
+        '''
+        Match a jtop stat key
+
+        This method returns the (name, node id) of the sensor for the key, or
+        None if the key does not match.
+        '''
+        match = self.pattern.match(key)
+        if match is None:
+            return None
+        groups = [match.group(0)] + [_capitalize(group) for group in match.groups()]
+        lower = [match.group(0).lower()] + [re.sub('[^a-z0-9]', '_', group.lower()) for group in match.groups()]
+        return self.name.format(*groups), self.node_id.format(*lower)
+
+
+class ScheduledSensor():
+    '''
+    Scheduled Sensor
+
+    This class is a discovered hardware sensor with its own sample interval.
+    The next sample time advances on a fixed grid so the schedule does not
+    drift.
+    '''
+    key = None                          # The jtop stat key
+    name = None                         # The entity name
+    node_id = None                      # The entity node id
+    spec: HardwareSensor = None         # The table row
+    interval: float = 5                 # The sample interval in seconds
+    next_due: float = None              # The next sample time
+    entity = None                       # The Home Assistant MQTT entity
+
+    def __init__(self, key: str, name: str, node_id: str, spec: HardwareSensor, interval: float):
+        self.key = key
+        self.name = name
+        self.node_id = node_id
+        self.spec = spec
+        self.interval = interval
+        self.next_due = None
+        self.entity = None
+
+    def due(self, now: float) -> bool:
+        '''
+        Check if the sensor is due
+
+        This method returns True if the sensor should be sampled now and
+        advances the next sample time by whole intervals.
+        '''
+        if self.next_due is None:
+            self.next_due = now
+        if now < self.next_due:
+            return False
+        self.next_due += self.interval * (math.floor((now - self.next_due) / self.interval) + 1)
+        return True
+
+
+HARDWARE_SENSORS: List[HardwareSensor] = [
+    HardwareSensor(r'^CPU(\d+)$', "Jetson CPU{1}", "jetson_cpu{1}_pct", "%", HaDeviceClass.POWER_FACTOR, format_percent),
+    HardwareSensor(r'^GPU(\d+)$', "Jetson GPU{1}", "jetson_gpu{1}_pct", "%", HaDeviceClass.POWER_FACTOR, format_percent),
+    HardwareSensor(r'^EMC$', "Jetson EMC", "jetson_emc_pct", "%", HaDeviceClass.POWER_FACTOR, format_percent),
+    HardwareSensor(r'^RAM$', "Jetson RAM", "jetson_ram_pct", "%", HaDeviceClass.NONE, format_float, interval=30, reader=memory_percent('ram')),
+    HardwareSensor(r'^SWAP$', "Jetson SWAP", "jetson_swap_pct", "%", HaDeviceClass.NONE, format_float, interval=30, reader=memory_percent('swap')),
+    HardwareSensor(r'^fan$', "Jetson Fan", "jetson_fan_pct", "%", HaDeviceClass.POWER_FACTOR, format_float, interval=30),
+    HardwareSensor(r'^Temp (.+)$', "Jetson Temp {1}", "jetson_t_{1}", "°C", formatter=format_float, interval=30, thermometer=True),
+    HardwareSensor(r'^power cur$', "Jetson Power Current", "jetson_pwr_cur", "mW", HaDeviceClass.POWER, interval=1),
+    HardwareSensor(r'^power avg$', "Jetson Power Average", "jetson_pwr_avg", "mW", HaDeviceClass.POWER),
+]
+
+
+def discover_sensors(stats: dict, table: List[HardwareSensor] = HARDWARE_SENSORS,
+                     frequency: float = 5, intervals: dict = None) -> List[ScheduledSensor]:
+    '''
+    Discover the hardware sensors
+
+    This function matches every jtop stat key against the table and returns
+    a scheduled sensor for each key that matches a row.  intervals maps jtop
+    stat keys to sample intervals overriding the table, and rows without an
+    interval are sampled every frequency seconds.
+    '''
+    intervals = intervals or {}
+    sensors = []
+    for key in stats:
+        for spec in table:
+            match = spec.match(key)
+            if match is None:
+                continue
+            interval = intervals.get(key, spec.interval if spec.interval is not None else frequency)
+            sensors.append(ScheduledSensor(key, match[0], match[1], spec, interval))
+            break
+    return sensors
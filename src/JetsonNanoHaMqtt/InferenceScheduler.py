@@ -0,0 +1,266 @@
+from concurrent.futures import Future
+from collections import deque
+from typing import Callable
+import threading
+import time
+
+class InferenceTask():
+    '''
+    Inference Task
+
+    This class is a unit of GPU work queued on the inference scheduler.
+    '''
+    source = None                       # The source that submitted the task
+    fn: Callable = None                 # The GPU work
+    args = None                         # The positional arguments
+    kwargs = None                       # The keyword arguments
+    deadline: float = None              # The time after which the task is dropped
+    submitted: float = None             # The submit time
+    future: Future = None               # The task result
+    model = None                        # The key of the network the task runs
+
+    def __init__(self, source, fn: Callable, args, kwargs, deadline: float = None, model=None):
+        self.source = source
+        self.model = model
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.submitted = time.monotonic()
+        self.future = Future()
+
+
+class InferenceSource():
+    '''
+    Inference Source
+
+    This class holds the pending tasks and counters of one source.
+    '''
+    name = None                         # The source name
+    priority = 0                        # The source priority, higher runs first
+    pending: deque = None               # The pending tasks
+    last_served: float = 0              # The time the source last ran a task
+    executed = 0                        # The number of executed tasks
+    expired = 0                         # The number of tasks dropped past their deadline
+    dropped = 0                         # The number of tasks dropped by newer tasks
+
+    def __init__(self, name, priority: int = 0, max_pending: int = 2):
+        self.name = name
+        self.priority = priority
+        self.pending = deque(maxlen=max_pending)
+        self.last_served = 0
+        self.executed = 0
+        self.expired = 0
+        self.dropped = 0
+
+
+class InferenceScheduler():
+    '''
+    Inference Scheduler
+
+    This class owns every GPU call.  Cameras and inferences submit work
+    tagged with their source name.  The pending source with the highest
+    priority runs first and sources with the same priority take turns, so a
+    busy source cannot starve the others.  Work that is still queued past
+    its deadline is dropped, and max_concurrent caps the number of networks
+    running at once.  Work tagged with a network runs one at a time per
+    network, so a network shared through the model registry is never called
+    from two workers at once.
+    '''
+    _shared = None                      # The shared scheduler
+    _shared_lock = threading.Lock()     # The shared scheduler lock
+    _cond = None                        # The condition guarding the sources
+    _sources: dict = None               # The sources by name
+    _threads: list = None               # The worker threads
+    _running = False                    # The scheduler status
+    _max_concurrent = 1                 # The number of worker threads
+    _max_pending = 2                    # The pending tasks per source
+    _busy: set = None                   # The keys of the networks running
+    max_running = 0                     # The most networks seen running at once
+
+    def __init__(self, max_concurrent: int = 1, max_pending: int = 2):
+        '''
+        Initialize the scheduler
+
+        Each source keeps at most max_pending tasks.  A new task from a
+        source with a full queue drops its oldest pending task.
+        '''
+        self._cond = threading.Condition()
+        self._sources = {}
+        self._threads = []
+        self._running = False
+        self._max_concurrent = max_concurrent
+        self._max_pending = max_pending
+        self._busy = set()
+        self.max_running = 0
+
+    @classmethod
+    def shared(cls) -> 'InferenceScheduler':
+        '''
+        The shared scheduler
+
+        This method returns the scheduler shared by every entity, creating
+        it on first use.
+        '''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def source(self, name, priority: int = None) -> InferenceSource:
+        '''
+        Get a source
+
+        This method returns the source, registering it on first use.  The
+        priority of the source is updated when one is given.
+        '''
+        with self._cond:
+            source = self._sources.get(name)
+            if source is None:
+                source = self._sources[name] = InferenceSource(name, priority or 0, self._max_pending)
+            elif priority is not None:
+                source.priority = priority
+            return source
+
+    @property
+    def depth(self) -> int:
+        '''
+        The number of pending tasks
+        '''
+        with self._cond:
+            return sum(len(source.pending) for source in self._sources.values())
+
+    @property
+    def running(self) -> int:
+        '''
+        The number of networks running
+        '''
+        with self._cond:
+            return len(self._busy)
+
+    def metrics(self) -> dict:
+        '''
+        The scheduler metrics
+
+        This method returns the pending, executed, expired and dropped task
+        counts of each source.
+        '''
+        with self._cond:
+            return {name: {"priority": source.priority, "pending": len(source.pending),
+                           "executed": source.executed, "expired": source.expired,
+                           "dropped": source.dropped}
+                    for name, source in self._sources.items()}
+
+    def submit(self, source, fn: Callable, *args, priority: int = None, deadline: float = None,
+               model=None, **kwargs) -> Future:
+        '''
+        Submit GPU work
+
+        This method queues fn(*args, **kwargs) for the source and returns a
+        future with the result.  deadline is a time.monotonic() value after
+        which the work is dropped if it has not started.  A dropped task's
+        future is cancelled.  model is the network the work calls; work on
+        the same network never runs concurrently.
+        '''
+        task = InferenceTask(source, fn, args, kwargs, deadline, None if model is None else id(model))
+        queue = self.source(source, priority)
+        with self._cond:
+            if len(queue.pending) == queue.pending.maxlen:
+                queue.pending[0].future.cancel()
+                queue.dropped += 1
+            queue.pending.append(task)
+            self._cond.notify()
+        self.start()
+        return task.future
+
+    def run(self, source, fn: Callable, *args, priority: int = None, timeout: float = None, model=None, **kwargs):
+        '''
+        Run GPU work
+
+        This method submits the work and waits for the result.  timeout sets
+        the deadline relative to now.  Raises CancelledError if the work was
+        dropped.
+        '''
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return self.submit(source, fn, *args, priority=priority, deadline=deadline, model=model, **kwargs).result()
+
+    def _next_task(self) -> InferenceTask:
+        # Pick the pending source with the highest priority, then the one
+        # served longest ago, dropping tasks past their deadline and skipping
+        # sources waiting for a network that is running
+        now = time.monotonic()
+        best = None
+        for source in self._sources.values():
+            while source.pending and source.pending[0].deadline is not None and source.pending[0].deadline < now:
+                source.pending.popleft().future.cancel()
+                source.expired += 1
+            if not source.pending or source.pending[0].model in self._busy:
+                continue
+            if best is None or (source.priority, -source.last_served) > (best.priority, -best.last_served):
+                best = source
+        if best is None:
+            return None
+        best.last_served = now
+        task = best.pending.popleft()
+        if task.model is not None:
+            self._busy.add(task.model)
+            self.max_running = max(self.max_running, len(self._busy))
+        return task
+
+    def worker_loop(self):
+        '''
+        Run the scheduler worker
+
+        This method runs the pending tasks until the scheduler is stopped.
+        '''
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None and self._running:
+                    self._cond.wait(0.5)
+                    task = self._next_task()
+                if task is None:
+                    return
+            executed = task.future.set_running_or_notify_cancel()
+            if executed:
+                try:
+                    task.future.set_result(task.fn(*task.args, **task.kwargs))
+                except BaseException as e:
+                    task.future.set_exception(e)
+            with self._cond:
+                if executed:
+                    self._sources[task.source].executed += 1
+                if task.model is not None:
+                    self._busy.discard(task.model)
+                    self._cond.notify_all()
+
+    def start(self):
+        '''
+        Start the scheduler
+
+        This method starts the worker threads if they are not running.
+        '''
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [threading.Thread(target=self.worker_loop, name="inference scheduler", daemon=True)
+                             for _ in range(self._max_concurrent)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        '''
+        Stop the scheduler
+
+        This method cancels the pending tasks and waits for the workers.
+        '''
+        with self._cond:
+            self._running = False
+            for source in self._sources.values():
+                while source.pending:
+                    source.pending.popleft().future.cancel()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
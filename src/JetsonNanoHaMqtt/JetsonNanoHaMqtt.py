@@ -1,9 +1,17 @@
-from typing import List
 from jtop import jtop
 from paho.mqtt.client import Client
 from .NanoMqttHardwareSensors import NanoMqttHardwareSensors
-from .NanoMqttCamera import NanoMqttCamera
-from .NanoMqttInference import NanoMqttInference
+from .CameraProcess import CameraProcess
+from .mqtt.MQTTDiscoveryCache import MQTTDiscoveryCache
+from .mqtt.MQTTPublishQueue import MQTTPublishQueue
+from .mqtt.MQTTAsyncio import MQTTAsyncio
+from .ModelRegistry import ModelRegistry
+from .InferenceScheduler import InferenceScheduler
+from .NanoMqttMetrics import NanoMqttMetrics
+from .NanoMqttDiagnostics import NanoMqttDiagnostics
+from .AdaptiveRateController import AdaptiveRateController
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
 class JetsonNanoHaMqtt:
     '''
@@ -20,21 +28,128 @@ class JetsonNanoHaMqtt:
     _hw_sensors_enabled = False
     _hw_sensors: NanoMqttHardwareSensors = None
     _camera_enabled = False
-    _cameras: List[NanoMqttCamera] = []
+    _cameras: list = []
     _inferences = []
     _inference_enabled = False
+    _models: ModelRegistry = None
+    _scheduler: InferenceScheduler = None
+    _metrics: NanoMqttMetrics = None
+    _diagnostics: NanoMqttDiagnostics = None
+    _metrics_server = None
+    _rate_controller: AdaptiveRateController = None
+    _publish_queue: MQTTPublishQueue = None
+    _camera_processes = False
+    _background_loading = False
+    _mqtt: Client = None                # The MQTT client under the wrappers
+    _mqtt_asyncio: MQTTAsyncio = None   # The event loop MQTT socket driver
+    _executor: ThreadPoolExecutor = None  # The executor of the blocking calls
+    _tasks: list = None                 # The event loop tasks
+    _pipelines: list = None             # The event loop camera pipelines
 
-    def __init__(self, name: str, client: Client, jtop: jtop):
+    def __init__(self, name: str, client: Client, jtop: jtop, discovery_cache: str = None,
+                 model_budget: float = None, model_sizes: dict = None, max_concurrent_models: int = 1,
+                 rate_controller: AdaptiveRateController = None, publish_queue: bool = False,
+                 publish_queue_bytes: int = 4 * 1024 * 1024, publish_policies: dict = None,
+                 camera_processes: bool = False, background_loading: bool = False, model_loaders: int = 2):
+        '''
+        Initialize the device
+
+        With a discovery cache file, Home Assistant discovery configs that
+        did not change since the last run are not sent again.  Cameras and
+        inferences share networks through a model registry capped at
+        model_budget MB, with model_sizes estimating each network in MB.
+        Every network call runs on one inference scheduler that runs at most
+        max_concurrent_models networks at once, and each network runs one
+        call at a time.  The cameras, inferences and
+        scheduler record their metrics in one metrics collector.  A rate
+        controller fed by jtop slows the cameras and refuses a share of the
+        inference requests when the board is hot or the GPU is saturated.
+
+        With the publish queue, messages are published from a queue capped
+        at publish_queue_bytes where the latest message on a topic replaces
+        the one still waiting.  The queue starts sending on start() or
+        start_async().  publish_policies maps entity types (e.g. "camera")
+        to the (qos, retain) of their messages.
+
+        With camera_processes, each camera runs in its own supervised worker
+        process and its messages are published from this process.  Cameras
+        in worker processes capture and encode only; their networks could
+        not share the model registry or the inference scheduler.
+
+        The camera and inference modules, and the jetson-inference, Pillow
+        and pytz modules they need, are only imported when a camera or an
+        inference is initialized.  With background_loading, the networks
+        load in the background, model_loaders at a time, and each camera
+        and inference comes up once its network is loaded.
+        '''
         self._client = client
+        self._mqtt = client
+        self._tasks = []
+        self._pipelines = []
+        if publish_queue:
+            self._publish_queue = MQTTPublishQueue(client, max_bytes=publish_queue_bytes, policies=publish_policies)
+            self._client = self._publish_queue
+        if discovery_cache is not None:
+            self._client = MQTTDiscoveryCache(self._client, discovery_cache)
         self._jetson = jtop
         self._name = name
+        self._cameras = []
+        self._inferences = []
+        self._camera_processes = camera_processes
+        self._background_loading = background_loading
+        self._models = ModelRegistry(budget=model_budget, sizes=model_sizes, max_loads=model_loaders)
+        self._scheduler = InferenceScheduler(max_concurrent=max_concurrent_models)
+        self._metrics = NanoMqttMetrics()
+        self._metrics.register("scheduler", self.scheduler_metrics)
+        self._metrics.register("models", self._models.metrics)
+        self._rate_controller = rate_controller
+        if rate_controller is not None:
+            self._metrics.register("rate", rate_controller.metrics)
+        if self._publish_queue is not None:
+            self._metrics.register("mqtt", self._publish_queue.metrics)
+
+    @property
+    def models(self) -> ModelRegistry:
+        '''
+        The model registry shared by the cameras and inferences
+        '''
+        return self._models
+
+    @property
+    def scheduler(self) -> InferenceScheduler:
+        '''
+        The inference scheduler running every network call
+        '''
+        return self._scheduler
+
+    @property
+    def metrics(self) -> NanoMqttMetrics:
+        '''
+        The metrics of the cameras, inferences and scheduler
+        '''
+        return self._metrics
+
+    def scheduler_metrics(self) -> dict:
+        '''
+        The scheduler metrics
+
+        This method returns the scheduler depth, the networks running and
+        the pending, expired and dropped work of each source.
+        '''
+        metrics = {"pending": self._scheduler.depth, "running": self._scheduler.running,
+                   "max_running": self._scheduler.max_running}
+        for source, values in self._scheduler.metrics().items():
+            for name in ("pending", "expired", "dropped"):
+                metrics[str(source) + "_" + name] = values[name]
+        return metrics
 
     def initialize_device(self, jetson: jtop):
         '''
         Initialize the device
         
         This method initializes the device and sets up the Home Assistant
-        MQTT device.
+        MQTT device.  The board model and serial number identify the device
+        and are used to derive stable entity unique ids.
         '''
 
         self._dev = {
@@ -45,41 +160,79 @@ class JetsonNanoHaMqtt:
             "sw_version": self._jetson.board['platform']['Release'],
         }
     
-    def initialize_hardware_sensors(self):
+    def initialize_hardware_sensors(self, **kwargs):
         '''
         Initialize the hardware sensors
 
         This method initializes the hardware sensors and sets up the Home Assistant
-        MQTT sensors.
+        MQTT sensors.  Keyword arguments are passed to NanoMqttHardwareSensors.
         '''
-        self._hw_sensors = NanoMqttHardwareSensors(self._name, self._client, self._dev, self._jetson)
+        self._hw_sensors = NanoMqttHardwareSensors(self._name, self._client, self._dev, self._jetson, **kwargs)
         self._hw_sensors.initialize()
         self._hw_sensors_enabled = True
     
-    def initialize_camera(self, name: str, client: Client, input: str = None, output: str = None, inference: bool = False, inference_network: str = None, inference_threshold: float = 0.5):
+    def initialize_camera(self, name: str, client: Client, input: str = None, output: str = None, inference: bool = False, inference_network: str = None, inference_threshold: float = 0.5, **kwargs):
         '''
         Initialize the camera
 
         This method initializes the camera and sets up the Home Assistant
-        MQTT camera.
+        MQTT camera.  Additional keyword arguments are passed to
+        NanoMqttCamera.  With camera processes, the keyword arguments must
+        be picklable, the camera entities are created by the worker, and
+        inference and consumers are refused with a ValueError.
         '''
-        self._cameras.append(NanoMqttCamera(name, self._client, self._dev, input=input, 
-                                            output=output, inference=inference, 
-                                            inference_network=inference_network, 
-                                            inference_threshold=inference_threshold))
+        if self._camera_processes:
+            camera = CameraProcess(name, self._client, self._dev,
+                                   camera_kwargs=dict(input=input, output=output, inference=inference,
+                                                      inference_network=inference_network,
+                                                      inference_threshold=inference_threshold,
+                                                      background_load=self._background_loading, **kwargs),
+                                   rate_controller=self._rate_controller)
+            self._metrics.register(name, camera.metrics)
+            self._cameras.append(camera)
+        else:
+            from .NanoMqttCamera import NanoMqttCamera
+            self._cameras.append(NanoMqttCamera(name, self._client, self._dev, input=input, 
+                                                output=output, inference=inference, 
+                                                inference_network=inference_network, 
+                                                inference_threshold=inference_threshold,
+                                                models=self._models, scheduler=self._scheduler,
+                                                metrics=self._metrics, rate_controller=self._rate_controller,
+                                                background_load=self._background_loading, **kwargs))
         self._cameras[-1].initialize()
         self._camera_enabled = True
     
-    def initialize_inference(self, name: str, client: Client, jetson_inference, network: str = None, threshold: float = 0.5):
+    def initialize_inference(self, name: str, client: Client, jetson_inference, network: str = None, threshold: float = 0.5, **kwargs):
         '''
         Initialize the inference entities
 
-        
+        This method initializes the inference and sets up the Home Assistant
+        MQTT entities.  Additional keyword arguments are passed to
+        NanoMqttInference.
         '''
-        self._inferences.append(NanoMqttInference(name, self._client, self._dev, jetson_inference, network=network))
+        from .NanoMqttInference import NanoMqttInference
+        self._inferences.append(NanoMqttInference(name, self._client, self._dev, jetson_inference, network=network,
+                                                  threshold=threshold, models=self._models,
+                                                  scheduler=self._scheduler, metrics=self._metrics,
+                                                  rate_controller=self._rate_controller,
+                                                  background_load=self._background_loading, **kwargs))
         self._inferences[-1].initialize()
         self._inference_enabled = True
 
+    def initialize_metrics(self, diagnostics: bool = True, interval: float = 10, port: int = None):
+        '''
+        Initialize the metrics
+
+        This method sets up the Home Assistant diagnostic sensors publishing
+        the metrics every interval seconds, and serves the metrics in the
+        Prometheus text format on http://<host>:<port>/metrics when a port
+        is given.
+        '''
+        if diagnostics:
+            self._diagnostics = NanoMqttDiagnostics(self._name, self._client, self._dev, self._metrics, interval=interval)
+        if port is not None:
+            self._metrics_server = self._metrics.serve(port)
+
     def start_hardware_sensors(self):
         '''
         Start the hardware sensors
@@ -144,9 +297,18 @@ class JetsonNanoHaMqtt:
 
         This method starts the device.
         '''
+        if self._publish_queue is not None:
+            self._publish_queue.start()
+        if isinstance(self._client, MQTTDiscoveryCache):
+            self._client.save()
+            self._client.watch_status()
+        if self._rate_controller is not None:
+            self._rate_controller.start(self._jetson)
         self.start_hardware_sensors()
         self.start_camera()
         self.start_inference()
+        if self._diagnostics is not None:
+            self._diagnostics.start()
     
     def stop(self):
         '''
@@ -154,6 +316,91 @@ class JetsonNanoHaMqtt:
 
         This method stops the device.
         '''
+        if isinstance(self._client, MQTTDiscoveryCache):
+            self._client.unwatch_status()
         self.stop_camera()
         self.stop_hardware_sensors()
         self.stop_inference()
+        self._scheduler.stop()
+        if self._rate_controller is not None:
+            self._rate_controller.stop()
+        if self._diagnostics is not None:
+            self._diagnostics.stop()
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+            self._metrics_server = None
+        if self._publish_queue is not None:
+            self._publish_queue.stop()
+
+    async def start_async(self, loop=None, workers: int = None, mqtt: bool = True):
+        '''
+        Start the device on an event loop
+
+        This coroutine starts the device on one asyncio event loop in place
+        of the sensor and camera threads.  The hardware sensors, cameras and
+        diagnostics run as tasks, with capture, inference and encode on an
+        executor of workers threads (default: two per camera).  With mqtt,
+        the MQTT socket is driven by the loop, so the client's network
+        thread (loop_start) must not be running.  Camera processes and MQTT
+        inferences keep their own workers.
+        '''
+        loop = loop if loop is not None else asyncio.get_event_loop()
+        if self._publish_queue is not None:
+            self._publish_queue.start()
+        if isinstance(self._client, MQTTDiscoveryCache):
+            self._client.save()
+            self._client.watch_status()
+        if mqtt:
+            self._mqtt_asyncio = MQTTAsyncio(self._mqtt, loop)
+            self._mqtt_asyncio.attach()
+        if self._rate_controller is not None:
+            self._rate_controller.start(self._jetson)
+        if self._hw_sensors_enabled:
+            self._tasks.append(loop.create_task(self._hw_sensors.publish_hardware_sensors_task(self._jetson)))
+        if self._camera_enabled:
+            if workers is None:
+                workers = max(2, 2 * len(self._cameras))
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+            for camera in self._cameras:
+                if isinstance(camera, CameraProcess):
+                    camera.start()
+                    continue
+                camera.start_async(loop=loop, executor=self._executor, on_start=self._pipelines.append)
+        self.start_inference()
+        if self._diagnostics is not None:
+            self._tasks.append(loop.create_task(self._diagnostics.publish_diagnostics_task()))
+
+    async def stop_async(self, timeout: float = 2):
+        '''
+        Stop the device on an event loop
+
+        This coroutine cancels the tasks and waits up to timeout seconds for
+        them, including the pipelines of cameras that started once their
+        network loaded.  Calls still running on the executor are left to
+        finish on their own.
+        '''
+        for camera in self._cameras:
+            if not isinstance(camera, CameraProcess):
+                camera.cancel_pending_start()
+        for task in self._tasks:
+            task.cancel()
+        pipelines = list(self._pipelines)
+        for pipeline in pipelines:
+            pipeline.stop()
+        waits = [pipeline.wait_stopped(timeout) for pipeline in pipelines]
+        if self._tasks:
+            waits.append(asyncio.wait(self._tasks, timeout=timeout))
+        if waits:
+            await asyncio.gather(*waits)
+        self._tasks = []
+        self._pipelines = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        # The remaining workers are stopped off the loop, which keeps
+        # writing the messages they flush
+        await asyncio.get_event_loop().run_in_executor(None, self.stop)
+        if self._mqtt_asyncio is not None:
+            self._mqtt_asyncio.detach()
+            self._mqtt_asyncio = None
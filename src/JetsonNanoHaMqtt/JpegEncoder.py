@@ -0,0 +1,174 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple
+from io import BytesIO
+import numpy as np
+import threading
+import os
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
+
+def scaled_size(width: int, height: int, max_size: Tuple[int, int] = None) -> Tuple[int, int]:
+    '''
+    Scaled image size
+
+    This function returns the size that fits the image inside max_size
+    while keeping the aspect ratio.  Images are never scaled up.
+    '''
+    if max_size is None:
+        return width, height
+    scale = min(1.0, max_size[0] / width, max_size[1] / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class PilJpegBackend():
+    '''
+    PIL JPEG Backend
+
+    This class encodes JPEG images with Pillow.
+    '''
+    name = "pil"
+    _image = None                       # The Pillow Image module
+
+    def __init__(self):
+        from PIL import Image
+        self._image = Image
+
+    def encode(self, frame: np.ndarray, quality: int, max_size: Tuple[int, int], buffer: BytesIO) -> bytes:
+        img = self._image.fromarray(frame)
+        size = scaled_size(img.width, img.height, max_size)
+        if size != img.size:
+            img = img.resize(size, self._image.BILINEAR)
+        buffer.seek(0)
+        buffer.truncate()
+        img.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+
+class TurboJpegBackend():
+    '''
+    TurboJPEG Backend
+
+    This class encodes JPEG images with libjpeg-turbo through PyTurboJPEG.
+    Images are scaled with Pillow before encoding.
+    '''
+    name = "turbojpeg"
+    _jpeg = None                        # The TurboJPEG instance
+
+    def __init__(self):
+        if TurboJPEG is None:
+            raise ImportError("PyTurboJPEG is not installed")
+        self._jpeg = TurboJPEG()
+
+    def encode(self, frame: np.ndarray, quality: int, max_size: Tuple[int, int], buffer: BytesIO) -> bytes:
+        height, width = frame.shape[:2]
+        size = scaled_size(width, height, max_size)
+        if size != (width, height):
+            from PIL import Image
+            frame = np.asarray(Image.fromarray(frame).resize(size, Image.BILINEAR))
+        return self._jpeg.encode(np.ascontiguousarray(frame), quality=quality, pixel_format=TJPF_RGB)
+
+
+class JpegEncoder():
+    '''
+    JPEG Encoder
+
+    This class encodes image arrays as JPEG on a pool of worker threads
+    sized to the CPU core count.  Each worker reuses its own output buffer.
+    The backend is TurboJPEG when it is installed, otherwise Pillow.
+    '''
+    _shared = None                      # The shared encoder
+    _shared_lock = threading.Lock()     # The shared encoder lock
+    _backend = None                     # The encoder backend
+    _executor: ThreadPoolExecutor = None  # The worker pool
+    _buffers = None                     # The per worker output buffers
+    _lock = None                        # The encoder counters lock
+    quality = 75                        # The default JPEG quality
+    encoded = 0                         # The number of encoded images
+
+    def __init__(self, workers: int = None, backend = None, quality: int = 75):
+        '''
+        Initialize the encoder
+
+        The backend can be "pil", "turbojpeg", a backend object, or None to
+        pick the fastest installed backend.
+        '''
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if backend is None:
+            backend = "turbojpeg" if TurboJPEG is not None else "pil"
+        if backend == "pil":
+            backend = PilJpegBackend()
+        elif backend == "turbojpeg":
+            backend = TurboJpegBackend()
+        self._backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg")
+        self._buffers = threading.local()
+        self._lock = threading.Lock()
+        self.quality = quality
+        self.encoded = 0
+
+    @classmethod
+    def shared(cls) -> 'JpegEncoder':
+        '''
+        The shared encoder
+
+        This method returns the encoder shared by every entity, creating it
+        on first use.
+        '''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        if frame.dtype != np.uint8:
+            frame = np.clip(frame, 0, 255).astype(np.uint8)
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = frame[..., :3]
+        return frame
+
+    def _encode(self, frame: np.ndarray, quality: int, max_size: Tuple[int, int]) -> bytes:
+        buffer = getattr(self._buffers, "buffer", None)
+        if buffer is None:
+            buffer = self._buffers.buffer = BytesIO()
+        out = self._backend.encode(self._prepare(frame), quality, max_size, buffer)
+        with self._lock:
+            self.encoded += 1
+        return out
+
+    def submit(self, frame: np.ndarray, quality: int = None, max_size: Tuple[int, int] = None) -> Future:
+        '''
+        Submit an image for encoding
+
+        This method queues the image array on the worker pool and returns a
+        future with the JPEG bytes.  The array must stay valid until the
+        future completes.
+        '''
+        if quality is None:
+            quality = self.quality
+        return self._executor.submit(self._encode, frame, quality, max_size)
+
+    def encode(self, frame: np.ndarray, quality: int = None, max_size: Tuple[int, int] = None) -> bytes:
+        '''
+        Encode an image
+
+        This method encodes the image array on the worker pool and waits for
+        the JPEG bytes.
+        '''
+        return self.submit(frame, quality, max_size).result()
+
+    def close(self):
+        '''
+        Close the encoder
+
+        This method waits for queued images and stops the workers.
+        '''
+        self._executor.shutdown(wait=True)
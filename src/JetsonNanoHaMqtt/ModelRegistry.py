@@ -0,0 +1,230 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+
+class ModelEntry():
+    '''
+    Model Entry
+
+    This class holds a loaded network in the model registry.
+    '''
+    key = None                          # The registry key
+    model = None                        # The loaded network
+    size: float = 0                     # The estimated memory in MB
+    refs = 0                            # The number of users
+    last_used: float = None             # The time of the last acquire or release
+    ready = None                        # The event set once the network is loaded
+    error = None                        # The load error
+
+    def __init__(self, key, size: float):
+        self.key = key
+        self.size = size
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.ready = threading.Event()
+        self.error = None
+
+
+class ModelRegistry():
+    '''
+    Model Registry
+
+    This class shares loaded networks between cameras and inferences.  A
+    network is keyed by its class, network name, threshold and options and
+    is reference counted.  Idle networks stay loaded until their memory is
+    needed, then the least recently used idle network is evicted first.
+    '''
+    _shared = None                      # The shared registry
+    _shared_lock = threading.Lock()     # The shared registry lock
+    _lock = None                        # The registry lock
+    _entries: OrderedDict = None        # The entries in least recently used order
+    _models: dict = None                # The entry of each loaded network by id
+    _loader: ThreadPoolExecutor = None  # The background load pool
+    max_loads = 2                       # The number of networks loaded in parallel
+    budget: float = None                # The memory budget in MB
+    sizes: dict = None                  # The estimated memory of each network in MB
+    default_size: float = 100           # The estimated memory of other networks in MB
+    loads = 0                           # The number of loaded networks
+    hits = 0                            # The number of acquires sharing a loaded network
+    evictions = 0                       # The number of evicted networks
+    load_time: float = 0.0              # The total load time in seconds
+
+    def __init__(self, budget: float = None, sizes: dict = None, default_size: float = 100,
+                 max_loads: int = 2):
+        '''
+        Initialize the registry
+
+        The budget caps the estimated memory of the loaded networks in MB.
+        sizes maps network names to their estimated memory in MB.  Up to
+        max_loads networks are loaded in the background at once.
+        '''
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._models = {}
+        self._loader = None
+        self.max_loads = max_loads
+        self.budget = budget
+        self.sizes = dict(sizes) if sizes else {}
+        self.default_size = default_size
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @classmethod
+    def shared(cls) -> 'ModelRegistry':
+        '''
+        The shared registry
+
+        This method returns the registry shared by every entity, creating it
+        on first use.
+        '''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def key(network_class, network: str, threshold: float = None, **options):
+        return (network_class, network, threshold, tuple(sorted(options.items())))
+
+    @property
+    def memory(self) -> float:
+        '''
+        The estimated memory of the loaded networks in MB
+        '''
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def metrics(self) -> dict:
+        '''
+        The registry metrics
+
+        This method returns the load, hit and eviction counts and the state
+        of the loaded networks.
+        '''
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "load_time": self.load_time,
+                "loaded": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.refs > 0),
+                "memory": sum(entry.size for entry in self._entries.values()),
+                "budget": self.budget,
+            }
+
+    def _evict(self, size: float):
+        # Evict idle networks, least recently used first, until size fits
+        if self.budget is None:
+            return
+        used = sum(entry.size for entry in self._entries.values())
+        for key in list(self._entries.keys()):
+            if used + size <= self.budget:
+                break
+            entry = self._entries[key]
+            if entry.refs > 0 or not entry.ready.is_set():
+                continue
+            print("Evicting model " + str(key[1]))
+            del self._entries[key]
+            self._models.pop(id(entry.model), None)
+            entry.model = None
+            used -= entry.size
+            self.evictions += 1
+        if used + size > self.budget:
+            raise MemoryError("Model memory budget of {} MB exceeded loading {} MB".format(self.budget, size))
+
+    def acquire(self, network_class, network: str, threshold: float = None, **options):
+        '''
+        Acquire a network
+
+        This method returns the loaded network for the key, loading it if
+        needed, and takes a reference on it.  Networks with different keys
+        load in parallel.  Raises MemoryError if the network does not fit
+        the budget after evicting the idle networks.
+        '''
+        key = self.key(network_class, network, threshold, **options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs += 1
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                loading = False
+            else:
+                size = self.sizes.get(network, self.default_size)
+                self._evict(size)
+                entry = ModelEntry(key, size)
+                entry.refs = 1
+                self._entries[key] = entry
+                loading = True
+        if not loading:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+            with self._lock:
+                self.hits += 1
+            return entry.model
+        start = time.monotonic()
+        try:
+            if threshold is None:
+                model = network_class(network, **options)
+            else:
+                model = network_class(network, threshold=threshold, **options)
+        except Exception as e:
+            with self._lock:
+                self._entries.pop(key, None)
+            entry.error = e
+            entry.ready.set()
+            raise
+        with self._lock:
+            entry.model = model
+            self._models[id(model)] = entry
+            self.loads += 1
+            self.load_time += time.monotonic() - start
+        entry.ready.set()
+        return model
+
+    def load(self, network_class, network: str, threshold: float = None, **options) -> Future:
+        '''
+        Load a network in the background
+
+        This method acquires the network on the background load pool and
+        returns a future of the network, so the networks of several entities
+        load in parallel.
+        '''
+        with self._lock:
+            if self._loader is None:
+                self._loader = ThreadPoolExecutor(max_workers=self.max_loads, thread_name_prefix="model load")
+        return self._loader.submit(self.acquire, network_class, network, threshold, **options)
+
+    def release(self, model):
+        '''
+        Release a network
+
+        This method drops a reference on the network.  An idle network stays
+        loaded until its memory is needed.
+        '''
+        with self._lock:
+            entry = self._models.get(id(model))
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(entry.key)
+
+    def evict_idle(self):
+        '''
+        Evict the idle networks
+
+        This method unloads every network that has no users.
+        '''
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.refs == 0 and entry.ready.is_set():
+                    del self._entries[key]
+                    self._models.pop(id(entry.model), None)
+                    entry.model = None
+                    self.evictions += 1
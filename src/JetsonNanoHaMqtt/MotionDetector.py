@@ -0,0 +1,102 @@
+from typing import List, Tuple
+from .FrameChangeGate import gray_signature
+import numpy as np
+import time
+
+class MotionDetector():
+    '''
+    Motion Detector
+
+    This class detects motion by differencing a downscaled grayscale frame
+    against a running average of the previous frames.  Motion is seen when
+    more than the area fraction of the unmasked pixels moved by more than
+    the sensitivity in gray levels.  Motion stays active for the cooldown
+    after it was last seen.
+    '''
+    _sensitivity = 8.0                  # The gray level difference of a moving pixel
+    _area = 0.01                        # The fraction of moving pixels that is motion
+    _cooldown = 10                      # The seconds motion stays active
+    _size = 64                          # The signature size in pixels
+    _alpha = 0.5                        # The background update rate
+    _masks: List[Tuple[float, float, float, float]] = None  # The ignored regions
+    _mask: np.ndarray = None            # The signature pixels that are watched
+    _background: np.ndarray = None      # The running average signature
+    _last_motion: float = None          # The time motion was last seen
+    active = False                      # The motion status
+    moved: float = 0.0                  # The fraction of moving pixels in the last frame
+    frames = 0                          # The number of checked frames
+    motion_frames = 0                   # The number of frames with motion
+
+    def __init__(self, sensitivity: float = 8.0, area: float = 0.01, cooldown: float = 10,
+                 masks: List[Tuple[float, float, float, float]] = None, size: int = 64,
+                 alpha: float = 0.5):
+        '''
+        Initialize the motion detector
+
+        masks lists regions to ignore as (left, top, right, bottom)
+        fractions of the frame, e.g. (0, 0, 1, 0.1) ignores the top tenth
+        where a timestamp overlay changes every second.
+        '''
+        self._sensitivity = sensitivity
+        self._area = area
+        self._cooldown = cooldown
+        self._masks = list(masks) if masks else []
+        self._size = size
+        self._alpha = alpha
+        self._mask = None
+        self._background = None
+        self._last_motion = None
+        self.active = False
+        self.moved = 0.0
+        self.frames = 0
+        self.motion_frames = 0
+
+    def build_mask(self, shape: tuple) -> np.ndarray:
+        '''
+        Build the watched pixel mask
+
+        This method returns a boolean array of the signature shape that is
+        False inside the masked regions.
+        '''
+        height, width = shape
+        mask = np.ones(shape, dtype=bool)
+        for left, top, right, bottom in self._masks:
+            mask[int(top * height):int(np.ceil(bottom * height)),
+                 int(left * width):int(np.ceil(right * width))] = False
+        return mask
+
+    def detect(self, frame: np.ndarray, now: float = None) -> bool:
+        '''
+        Detect motion in a frame
+
+        This method compares the frame with the background, updates the
+        background and returns True while motion is active.
+        '''
+        if now is None:
+            now = time.monotonic()
+        signature = gray_signature(frame, self._size)
+        self.frames += 1
+        if self._background is None or self._background.shape != signature.shape:
+            self._background = signature
+            self._mask = self.build_mask(signature.shape)
+            self.moved = 0.0
+        else:
+            moving = np.abs(signature - self._background) > self._sensitivity
+            watched = moving[self._mask]
+            self.moved = float(watched.mean()) if watched.size else 0.0
+            self._background += self._alpha * (signature - self._background)
+            if self.moved >= self._area:
+                self._last_motion = now
+                self.motion_frames += 1
+        self.active = self._last_motion is not None and now - self._last_motion <= self._cooldown
+        return self.active
+
+    def reset(self):
+        '''
+        Reset the motion detector
+
+        This method forgets the background and ends the motion.
+        '''
+        self._background = None
+        self._last_motion = None
+        self.active = False
@@ -1,20 +1,30 @@
 from paho.mqtt.client import Client
 from HaMqtt.MQTTUtil import HaDeviceClass
 from .mqtt.MQTTCamera import MQTTCamera
-from HaMqtt.MQTTSensor import MQTTSensor
 from .mqtt.MQTTText import MQTTText
-import uuid
-from jetson.inference import detectNet, imageNet
-from jetson.utils import (videoSource, cudaToNumpy, cudaAllocMapped, cudaCrop, 
-                          cudaDeviceSynchronize)
-import threading
-from PIL import Image
-from numpy import asarray
-from io import BytesIO
+from .mqtt.MQTTBinarySensor import MQTTBinarySensor
+from .mqtt.MQTTButton import MQTTButton
+from .mqtt.MQTTOptionalConfig import MQTTOptionalSensor
+from .NanoMqttUtil import entity_unique_id
+from jetson.utils import (videoSource, cudaToNumpy, cudaCrop, cudaResize, cudaMemcpy, cudaDeviceSynchronize)
 from datetime import datetime
-import time
+from .CameraPipeline import CameraPipeline, AsyncCameraPipeline, CameraFrame
+from .FrameChangeGate import FrameChangeGate
+from .MotionDetector import MotionDetector
+from .DetectionTracker import DetectionFilter, DetectionTracker, TrackEvent, detection_box
+from .JpegEncoder import JpegEncoder, scaled_size
+from .ModelRegistry import ModelRegistry
+from .InferenceScheduler import InferenceScheduler
+from .CudaBufferPool import CudaBufferPool
+from .NanoMqttMetrics import NanoMqttMetrics
+from .AdaptiveRateController import AdaptiveRateController
+from concurrent.futures import CancelledError, Future
+from typing import Callable
+import asyncio
 import pytz
 import re
+import threading
+import time
 
 class NanoMqttCamera():
     '''
@@ -34,12 +44,108 @@ class NanoMqttCamera():
     _camera_inference_network = None    # The camera inference network
     _camera_inference_threshold = 0.5   # The camera inference threshold
     _camera_inference = None            # The camera inference object
+    _camera_inference_shared = False    # The camera inference is from the model registry
+    _models: ModelRegistry = None       # The model registry
+    _scheduler: InferenceScheduler = None  # The inference scheduler
+    _buffers: CudaBufferPool = None     # The CUDA buffer pool
+    _inference_priority: int = 0        # The inference scheduler priority
+    _inference_deadline: float = None   # The seconds a frame may wait for the GPU
+    _camera_pipeline: CameraPipeline = None  # The camera pipeline
+    _metrics: NanoMqttMetrics = None    # The stage latency metrics
+    _rate_controller: AdaptiveRateController = None  # The adaptive rate controller
+    _change_gate: FrameChangeGate = None  # The camera change gate
+    _motion: MotionDetector = None      # The motion detector gating the inference
+    _motion_published = None            # The last published motion status
+    _detection_filter: DetectionFilter = None  # The detection class and confidence filter
+    _tracker: DetectionTracker = None   # The detection tracker
+    _preview_size: tuple = None         # The maximum preview frame size
+    _full_interval: float = None        # The seconds between full resolution frames
+    _full_on_detection = True           # The full resolution frame on detection status
+    _last_full: float = None            # The time of the last full resolution frame
+    _encoder: JpegEncoder = None        # The JPEG encoder
+    _jpeg_quality: int = None           # The JPEG quality
+    _jpeg_max_size: tuple = None        # The maximum published frame size
+    _background_load = False            # The background network load status
+    _load: Future = None                # The background network load
+    _pending_start = None               # The start deferred until the network is loaded
+    _async_start = None                 # The deferred start scheduled on the event loop
+    _lock = None                        # The network load lock
+    _consumers: list = None             # The networks run on the captured frames
+    _on_demand = False                  # The on-demand publishing status
+    _on_demand_window: float = 0        # The seconds frames are published after a request
+    _publish_until: float = None        # The time the on-demand window ends
+    _snapshot_pending = False           # The requested snapshot status
+    _demand = None                      # The event set on a snapshot request
+    _source_open = True                 # The video source status
+    snapshots = 0                       # The number of requested snapshots published
     camera = None                       # The camera MQTT Entity
     camera_inference = None             # The camera inference MQTT Picture Entity
     camera_inference_labels = None      # The camera inference labels
     camera_inference_timestamp = None   # The camera inference timestamp MQTT Entity
+    camera_motion = None                # The camera motion MQTT Binary Sensor
+    camera_preview = None               # The camera preview MQTT Entity
+    camera_snapshot = None              # The camera snapshot MQTT Button
     
-    def __init__(self, name: str, client: Client, dev: dict, input: str = None, output: str = None, inference: bool = False, inference_network: str = None, inference_threshold: float = 0.5):
+    def __init__(self, name: str, client: Client, dev: dict, input: str = None, output: str = None, inference: bool = False, inference_network: str = None, inference_threshold: float = 0.5, video_source = None, detector = None, change_threshold: float = None, change_keepalive: float = 60, encoder: JpegEncoder = None, jpeg_quality: int = None, jpeg_max_size: tuple = None, models: ModelRegistry = None,
+                 scheduler: InferenceScheduler = None, inference_priority: int = 0, inference_deadline: float = None,
+                 buffers: CudaBufferPool = None, metrics: NanoMqttMetrics = None,
+                 rate_controller: AdaptiveRateController = None, motion: bool = False,
+                 motion_sensitivity: float = 8.0, motion_area: float = 0.01,
+                 motion_cooldown: float = 10, motion_masks: list = None,
+                 detection_classes: list = None, detection_confidence: dict = None,
+                 tracking: bool = False, track_iou: float = 0.3, track_leave: float = 5,
+                 preview_size: tuple = None, full_interval: float = None, full_on_detection: bool = True,
+                 background_load: bool = False, consumers: list = None, on_demand: bool = False,
+                 on_demand_window: float = 0):
+        '''
+        Initialize the camera
+
+        A video source and a detector can be passed in place of the
+        jetson-inference objects, e.g. stubs to run without a GPU.  Setting a
+        change threshold skips frames that did not change since the last
+        published frame, except once every keep-alive interval.  Frames are
+        encoded on the shared JPEG encoder unless another one is passed, and
+        scaled to fit jpeg_max_size (width, height) when it is set.  The
+        detection network is shared through the model registry and runs on
+        the inference scheduler at inference_priority.  A frame still waiting
+        for the GPU after inference_deadline seconds is dropped.  Detection
+        snapshots are cropped into images reused from the CUDA buffer pool.
+        With metrics, the latency of each pipeline stage, the dropped frames
+        and the queue depths are recorded under the camera name.  A rate
+        controller slows the capture when the board is hot or busy.
+
+        With motion enabled, a motion detector runs on the CPU in front of
+        the inference and the detection network only runs while motion is
+        active.  A pixel moves when its gray level changes by more than
+        motion_sensitivity, and motion is seen when more than motion_area of
+        the pixels outside motion_masks moved.  Motion stays active for
+        motion_cooldown seconds and is published as a binary sensor.
+
+        Detections are limited to the detection_classes names when set, and
+        detection_confidence maps class names to their confidence floor.
+        With tracking, detections are matched across frames by IoU and the
+        label, timestamp and snapshot are only published when an object
+        appears, changes class, or was not seen for track_leave seconds.
+
+        Setting preview_size (width, height) adds a preview camera entity
+        that publishes every frame scaled down on the GPU before encoding.
+        The full resolution frame is then published every full_interval
+        seconds, and on detection when full_on_detection is set.
+
+        With background_load, the detection network loads on the model
+        registry's load pool.  The camera entities are unavailable and the
+        camera does not start until the network is loaded.
+
+        consumers lists CameraConsumer networks that run on the captured
+        frames at their own rates, without stalling the camera,
+        and publish to their own entities.
+
+        With on_demand, frames are only encoded and published when a
+        snapshot is requested on the snapshot button, and for
+        on_demand_window seconds after a request.  A camera without
+        detection, motion or consumers then closes its video source and
+        stops capturing until the next request.
+        '''
         print("Initializing NanoMqttCamera")
         print("Name: " + name)
         print("inf: " + str(inference))
@@ -49,11 +155,52 @@ class NanoMqttCamera():
         self._name = name
         self._dev = dev
         self._camera_input = input
-        self._camera_input_dev = None
         self._camera_output = output
         self._camera_inference_enabled = inference
         self._camera_inference_network = inference_network
         self._camera_inference_threshold = inference_threshold
+        self._camera_input_dev = video_source
+        self._camera_inference = detector
+        self._camera_pipeline = None
+        self._models = models if models is not None else ModelRegistry.shared()
+        self._scheduler = scheduler if scheduler is not None else InferenceScheduler.shared()
+        self._inference_priority = inference_priority
+        self._inference_deadline = inference_deadline
+        self._buffers = buffers
+        self._metrics = metrics
+        self._rate_controller = rate_controller
+        self._motion = None
+        if motion:
+            self._motion = MotionDetector(motion_sensitivity, motion_area, motion_cooldown, motion_masks)
+        self._detection_filter = None
+        if detection_classes is not None or detection_confidence:
+            self._detection_filter = DetectionFilter(detection_classes, detection_confidence)
+        self._tracker = None
+        if tracking:
+            self._tracker = DetectionTracker(track_iou, track_leave)
+        self._preview_size = preview_size
+        self._full_interval = full_interval
+        self._full_on_detection = full_on_detection
+        self._last_full = None
+        self._change_gate = None
+        if change_threshold is not None:
+            self._change_gate = FrameChangeGate(change_threshold, keepalive=change_keepalive)
+        self._encoder = encoder if encoder is not None else JpegEncoder.shared()
+        self._jpeg_quality = jpeg_quality
+        self._jpeg_max_size = jpeg_max_size
+        self._background_load = background_load
+        self._load = None
+        self._pending_start = None
+        self._async_start = None
+        self._lock = threading.Lock()
+        self._consumers = list(consumers) if consumers else []
+        self._on_demand = on_demand
+        self._on_demand_window = on_demand_window
+        self._publish_until = None
+        self._snapshot_pending = False
+        self._demand = threading.Event()
+        self._source_open = True
+        self.snapshots = 0
 
     def initialize(self):
         '''
@@ -61,20 +208,101 @@ class NanoMqttCamera():
         
         This method initializes the Home Assistant MQTT sensors for the camera.
         '''
-        if self._camera_input is not None:
-            self._camera_input_dev = videoSource(self._camera_input)
+        if self._camera_input is not None or self._camera_input_dev is not None:
+            if self._buffers is None:
+                self._buffers = CudaBufferPool.shared()
+            if self._camera_input_dev is None:
+                self._camera_input_dev = videoSource(self._camera_input)
             camera_name = re.sub('[^A-Za-z0-9]', '_', self._name)
-            self.camera = MQTTCamera(self._name, "jetson_cam_" + camera_name, self._client, unique_id=str(uuid.uuid4()), device_dict=self._dev)
+            self.camera = MQTTCamera(self._name, "jetson_cam_" + camera_name, self._client, unique_id=entity_unique_id(self._dev, self._name), device_dict=self._dev)
+            if self._preview_size is not None:
+                self.camera_preview = MQTTCamera(self._name + " Preview", "jetson_cam_preview_" + camera_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Preview"), device_dict=self._dev)
+            if self._motion is not None:
+                self.camera_motion = MQTTBinarySensor(self._name + " Motion", "jetson_cam_motion_" + camera_name, self._client, "motion", unique_id=entity_unique_id(self._dev, self._name + " Motion"), device_dict=self._dev)
+            if self._on_demand:
+                self.camera_snapshot = MQTTButton(self._name + " Snapshot", "jetson_cam_snapshot_" + camera_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Snapshot"), device_dict=self._dev)
             if self._camera_inference_enabled:
-                self.camera_inference_labels = MQTTText(self._name + " Label", "jetson_cam_inference_label_" + camera_name, self._client, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-                self.camera_inference_timestamp = MQTTSensor(self._name + " Inference Timestamp", "jetson_cam_inference_timestamp_" + camera_name, self._client, "", HaDeviceClass.TIMESTAMP, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-                self.camera_inference = MQTTCamera(self._name + " Inference", "jetson_cam_inference_picture_" + camera_name, self._client, unique_id=str(uuid.uuid4()), device_dict=self._dev) 
-                self._camera_inference = detectNet(self._camera_inference_network, threshold=self._camera_inference_threshold)
+                self.camera_inference_labels = MQTTText(self._name + " Label", "jetson_cam_inference_label_" + camera_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Label"), device_dict=self._dev)
+                self.camera_inference_timestamp = MQTTOptionalSensor(self._name + " Inference Timestamp", "jetson_cam_inference_timestamp_" + camera_name, self._client, "", HaDeviceClass.TIMESTAMP, unique_id=entity_unique_id(self._dev, self._name + " Inference Timestamp"), device_dict=self._dev)
+                self.camera_inference = MQTTCamera(self._name + " Inference", "jetson_cam_inference_picture_" + camera_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Inference"), device_dict=self._dev) 
+                if self._camera_inference is None:
+                    from jetson.inference import detectNet
+                    if self._background_load:
+                        self._load = self._models.load(detectNet, self._camera_inference_network, threshold=self._camera_inference_threshold)
+                    else:
+                        self._camera_inference = self._models.acquire(detectNet, self._camera_inference_network, threshold=self._camera_inference_threshold)
+                        self._camera_inference_shared = True
+            for consumer in self._consumers:
+                consumer.initialize(self._name, self._client, self._dev, self._models, self._scheduler,
+                                    metrics=self._metrics, background_load=self._background_load,
+                                    buffers=self._buffers)
+            if self._metrics is not None:
+                self._metrics.register(self._name, self.metrics)
             self._camera_enabled = True
+            if self._load is not None:
+                self.publish_availability(False)
+                self._load.add_done_callback(self.on_network_loaded)
             return True
         else:
             return False
     
+    @property
+    def ready(self) -> bool:
+        '''
+        The camera has its detection network
+        '''
+        return self._load is None
+
+    def entities(self) -> list:
+        '''
+        The camera entities
+
+        This method returns the Home Assistant MQTT entities of the camera.
+        '''
+        return [entity for entity in (self.camera, self.camera_preview, self.camera_motion, self.camera_snapshot,
+                                      self.camera_inference_labels, self.camera_inference_timestamp,
+                                      self.camera_inference) if entity is not None]
+
+    def publish_availability(self, available: bool):
+        '''
+        Publish the camera availability
+
+        This method marks every camera entity online or offline.
+        '''
+        for entity in self.entities():
+            if available:
+                entity.send_online()
+            else:
+                entity.send_offline()
+
+    def on_network_loaded(self, load: Future):
+        '''
+        Finish the background network load
+
+        This method is called on the load pool once the detection network
+        is loaded.  It marks the camera available and runs a start that
+        waited for the network.  A camera whose network failed to load stays
+        unavailable.
+        '''
+        try:
+            model = load.result()
+        except Exception as e:
+            print(self._name + " network failed to load: " + str(e))
+            return
+        with self._lock:
+            if not self._camera_enabled:
+                self._models.release(model)
+                return
+            self._camera_inference = model
+            self._camera_inference_shared = True
+            self._load = None
+            pending = self._pending_start
+            self._pending_start = None
+        print(self._name + " network loaded")
+        self.publish_availability(True)
+        if pending is not None:
+            pending()
+
     def close(self):
         '''
         Close the camera
@@ -83,92 +311,492 @@ class NanoMqttCamera():
         '''
         if self._camera_enabled:
             self.stop()
+            with self._lock:
+                self._camera_enabled = False
+            if self._camera_inference_shared:
+                self._models.release(self._camera_inference)
+                self._camera_inference = None
+                self._camera_inference_shared = False
             if self._camera_inference_enabled:
-                self.cam_motion.close()
-                self.cam_motion_timestamp.close()
+                self.camera_inference_labels.close()
+                self.camera_inference_timestamp.close()
+                self.camera_inference.close()
                 self._camera_inference_enabled = False
+            if self.camera_motion is not None:
+                self.camera_motion.close()
+                self.camera_motion = None
+            if self.camera_preview is not None:
+                self.camera_preview.close()
+                self.camera_preview = None
+            if self.camera_snapshot is not None:
+                self.camera_snapshot.close()
+                self.camera_snapshot = None
+            for consumer in self._consumers:
+                consumer.close()
             self.camera.close()
-            self._camera_enabled = False
-    
-    def publish_camera(self, img):
+
+    def metrics(self) -> dict:
         '''
-        stream the camera snapshot to Home Assistant
-        
-        This method streams the camera and publishes the snapshot to Home Assistant.
+        The camera metrics
+
+        This method returns the captured frames and the frames dropped and
+        waiting in front of each pipeline stage.
+        '''
+        pipeline = self._camera_pipeline
+        if pipeline is None:
+            return {}
+        metrics = {"captured": pipeline.captured}
+        for stage, dropped in pipeline.dropped.items():
+            metrics[stage + "_dropped"] = dropped
+        for stage, depth in pipeline.queue_depth.items():
+            metrics[stage + "_queue"] = depth
+        if self._change_gate is not None:
+            metrics["unchanged"] = self._change_gate.skipped
+        if self._motion is not None:
+            metrics["motion_frames"] = self._motion.motion_frames
+            metrics["motion_moved"] = round(self._motion.moved, 4)
+        for consumer in self._consumers:
+            metrics[consumer.name + "_runs"] = consumer.runs
+            metrics[consumer.name + "_dropped"] = consumer.dropped
+            metrics[consumer.name + "_skipped"] = consumer.skipped
+        if self._on_demand:
+            metrics["snapshots"] = self.snapshots
+            metrics["idle"] = 0 if self._source_open else 1
+        if self._tracker is not None:
+            metrics["tracks"] = len(self._tracker.tracks)
+            metrics["track_events"] = self._tracker.events
+        return metrics
+
+    @property
+    def capture_needed(self) -> bool:
+        '''
+        The frames are needed without a snapshot request
+
+        True when the detection, the motion detector or a consumer runs on
+        the captured frames.
+        '''
+        return self._camera_inference_enabled or self._motion is not None or bool(self._consumers)
+
+    def publishing(self, now: float = None) -> bool:
+        '''
+        Check if frames are published
+
+        This method returns True if the camera is not on demand, a snapshot
+        was requested, or the on-demand window is open.
+        '''
+        if not self._on_demand or self._snapshot_pending:
+            return True
+        now = time.monotonic() if now is None else now
+        return self._publish_until is not None and now < self._publish_until
+
+    def request_snapshot(self, client, userdata, msg):
+        '''
+        Request a snapshot
+
+        This method is the MQTT callback of the snapshot button.  It
+        requests the next frame and opens the on-demand window.  A number
+        sent in place of the press opens the window for that many seconds,
+        e.g. from an automation while a dashboard is viewed.
+        '''
+        window = self._on_demand_window
+        payload = msg.payload.decode("utf-8", "replace") if isinstance(msg.payload, bytes) else str(msg.payload)
+        if payload != MQTTButton.payload_press:
+            try:
+                window = float(payload)
+            except ValueError:
+                print(self._name + " invalid snapshot request: " + payload)
+                return
+        until = time.monotonic() + window
+        if self._publish_until is None or until > self._publish_until:
+            self._publish_until = until
+        self._snapshot_pending = True
+        self._demand.set()
+
+    def wait_for_demand(self) -> bool:
+        '''
+        Wait for a snapshot request
+
+        This method closes the video source while no frame is requested and
+        waits up to a second for a request, then reopens it.  Returns False
+        if no frame is requested.
+        '''
+        self._demand.clear()
+        if not self.publishing():
+            if self._source_open:
+                self._camera_input_dev.Close()
+                self._source_open = False
+            if not self._demand.wait(1):
+                return False
+        if not self._source_open:
+            self._camera_input_dev.Open()
+            self._source_open = True
+        return True
+
+    def capture_frame(self):
+        '''
+        Capture a frame
+
+        This method captures a frame from the camera input and copies it on
+        the device into a buffer from the CUDA buffer pool, so a frame still
+        queued in the pipeline is not overwritten when the video source
+        reuses its ring buffer.  Release the frame with release_frame.  Returns None if
+        the capture timed out, or if an on-demand camera that only captures
+        for requests has no request.
+        '''
+        if self._on_demand and not self.capture_needed and not self.wait_for_demand():
+            return None
+        img = self._camera_input_dev.Capture()
+        if img is None:
+            return None
+        copy = self._buffers.acquire(img.width, img.height, img.format)
+        cudaMemcpy(copy, img)
+        self._buffers.record_copy(CudaBufferPool.size((img.width, img.height, img.format)))
+        return CameraFrame(copy, datetime.now(pytz.timezone('US/Central')))
+
+    def release_frame(self, frame: CameraFrame):
+        '''
+        Release a frame
+
+        This method returns the image of a captured frame to the CUDA buffer
+        pool once the frame left the pipeline.
+        '''
+        self._buffers.release(frame.img)
+
+    def consume_frame(self, frame: CameraFrame):
         '''
-        if self._camera_inference_enabled:
-            if self._camera_inference is not None:
-                detections = self._camera_inference.Detect(img, overlay="labels,conf")
+        Run the consumers on a frame
+
+        This method hands the captured frame to each consumer that is due.
+        The consumers retain the frame and do not wait for their networks.
+        '''
+        now = time.monotonic()
+        for consumer in self._consumers:
+            if consumer.due(now):
+                try:
+                    consumer.consume(frame.img)
+                except Exception as e:
+                    print(self._name + " " + consumer.name + " failed: " + str(e))
+        return frame
+
+    def stages(self) -> list:
+        '''
+        The pipeline stages
+
+        This method returns the (name, callable) stages run on each captured
+        frame.
+        '''
+        stages = [("inference", self.infer_frame), ("encode", self.encode_frame), ("publish", self.publish_frame)]
+        if self._consumers:
+            stages.insert(0, ("consumers", self.consume_frame))
+        return stages
+
+    def infer_frame(self, frame: CameraFrame):
+        '''
+        Run the inference on a frame
+
+        This method submits the detection to the inference scheduler and
+        waits for it.  A frame the scheduler dropped as stale is dropped.
+        With the motion detector enabled, a frame without motion skips the
+        detection.  Without a network the frame does not queue on the
+        scheduler.
+        '''
+        if self._motion is not None:
+            frame.motion = self._motion.detect(cudaToNumpy(frame.img))
+            if not frame.motion:
+                return frame
+        if self._camera_inference is None:
+            return self.detect_frame(frame)
+        try:
+            return self._scheduler.run(self._name, self.detect_frame, frame,
+                                       priority=self._inference_priority,
+                                       timeout=self._inference_deadline, model=self._camera_inference)
+        except CancelledError:
+            return None
+
+    def detect_frame(self, frame: CameraFrame):
+        '''
+        Detect objects in a frame
+
+        This method runs the detection network on the frame and crops the
+        bounding box of the detections into a snapshot.  With tracking, only
+        the objects that appeared or changed class are cropped, and a frame
+        without track events has no label or snapshot, and the label is
+        "LABEL left" once the last tracked object left.  The overlay is
+        drawn on a device copy of a frame a consumer still reads.  Executed
+        on the inference scheduler.
+        '''
+        img = frame.img
+        if self._camera_inference_enabled and self._camera_inference is not None:
+            if self._buffers.retained(img):
+                copy = self._buffers.acquire(img.width, img.height, img.format)
+                cudaMemcpy(copy, img)
+                self._buffers.record_copy(CudaBufferPool.size((img.width, img.height, img.format)))
+                self._buffers.release(img)
+                frame.img = img = copy
+            class_desc = self._camera_inference.GetClassDesc
+            frame.detections = self._camera_inference.Detect(img, overlay="labels,conf")
+            if self._detection_filter is not None:
+                frame.detections = self._detection_filter.filter(frame.detections, class_desc)
+            if self._tracker is not None:
+                frame.events = self._tracker.update(frame.detections, class_desc)
+                detections = [event.track for event in frame.events if event.kind != TrackEvent.LEFT]
+                boxes = [track.box for track in detections]
+                if frame.events:
+                    if detections:
+                        frame.label = detections[-1].label
+                    elif self._tracker.tracks:
+                        frame.label = self._tracker.tracks[-1].label
+                    else:
+                        # The last tracked object left
+                        frame.label = frame.events[-1].track.label + " left"
             else:
-                detections = []
-
-            motion = None
-            if (len(detections) > 0):
-                det_left = img.width
-                det_top = img.height
-                det_right = 0
-                det_bottom = 0
+                boxes = []
+                for detection in frame.detections:
+                    boxes.append(detection_box(detection))
+                if boxes:
+                    frame.label = class_desc(frame.detections[-1].ClassID)
+            if len(boxes) > 0:
                 # Set the ROI to the bounding box of the detections
-                for detection in detections:
-                    print(detection)
-                    print(self._camera_inference.GetClassDesc(detection.ClassID))
-                    if detection.Left < det_left:
-                        det_left = detection.Left
-                    if detection.Top < det_top:
-                        det_top = detection.Top
-                    if detection.Right > det_right:
-                        det_right = detection.Right
-                    if detection.Bottom > det_bottom:
-                        det_bottom = detection.Bottom
-                roi = (int(det_left), int(det_top), int(det_right), int(det_bottom))
-                motion = self._camera_inference.GetClassDesc(detection.ClassID)
-                self.camera_inference_labels.publish_state(motion)
-                self.camera_inference_timestamp.publish_state(datetime.now(pytz.timezone('US/Central')).isoformat())
-                snapshot = cudaAllocMapped(width=roi[2]-roi[0], height=roi[3]-roi[1], format=img.format)
-                cudaCrop(img, snapshot, roi)
-                cudaDeviceSynchronize()
-                out_np = cudaToNumpy(snapshot)
-                out_img = Image.fromarray(out_np)
-                img_byte_arr = BytesIO()
-                out_img.save(img_byte_arr, format='JPEG')
-                out_img = img_byte_arr.getvalue()
-                self.camera_inference.publish_image(out_img)
-                del snapshot
+                frame.roi = (int(min(box[0] for box in boxes)), int(min(box[1] for box in boxes)),
+                             int(max(box[2] for box in boxes)), int(max(box[3] for box in boxes)))
+                frame.snapshot = self._buffers.acquire(frame.roi[2]-frame.roi[0], frame.roi[3]-frame.roi[1], img.format)
+                cudaCrop(img, frame.snapshot, frame.roi)
+        cudaDeviceSynchronize()
+        return frame
+
+    def encode_image(self, out_np) -> bytes:
+        '''
+        Encode an image
+
+        This method encodes an image array as a JPEG on the shared encoder
+        pool.
+        '''
+        return self._encoder.encode(out_np, quality=self._jpeg_quality, max_size=self._jpeg_max_size)
+
+    def scale_frame(self, frame: CameraFrame):
+        '''
+        Scale a frame
+
+        This method resizes the frame on the GPU into an image from the CUDA
+        buffer pool that fits the preview size.  Returns None if the frame
+        already fits.
+        '''
+        img = frame.img
+        width, height = scaled_size(img.width, img.height, self._preview_size)
+        if (width, height) == (img.width, img.height):
+            return None
+        preview = self._buffers.acquire(width, height, img.format)
+        cudaResize(img, preview)
         cudaDeviceSynchronize()
-        out_np = cudaToNumpy(img)
-        out_img = Image.fromarray(out_np)
-        img_byte_arr = BytesIO()
-        out_img.save(img_byte_arr, format='JPEG')
-        out_img = img_byte_arr.getvalue()
-        self.camera.publish_image(out_img)
-            
+        return preview
+
+    def full_frame_due(self, frame: CameraFrame, now: float = None) -> bool:
+        '''
+        Check if the full resolution frame is due
+
+        This method returns True if the full resolution frame should be
+        published: on every frame without a preview, otherwise every
+        full_interval seconds and on detection.
+        '''
+        if self._preview_size is None or self._full_interval is None:
+            return True
+        if self._full_on_detection and frame.label is not None:
+            return True
+        now = time.monotonic() if now is None else now
+        return self._last_full is None or now - self._last_full >= self._full_interval
+
+    def encode_frame(self, frame: CameraFrame):
+        '''
+        Encode a frame
+
+        This method encodes the frame, the preview and the detection
+        snapshot.  With the change gate enabled, a frame that did not change
+        since the last published frame is not encoded.  An on-demand camera
+        only encodes the frame and the preview while publishing, and always
+        encodes the full frame for a snapshot request.
+        '''
+        snapshot_image = None
+        if frame.snapshot is not None:
+            snapshot_image = self._encoder.submit(cudaToNumpy(frame.snapshot), quality=self._jpeg_quality)
+        requested = self._snapshot_pending
+        publishing = self.publishing()
+        preview_image = None
+        preview = None
+        if self._preview_size is not None and publishing:
+            preview = self.scale_frame(frame)
+            preview_np = cudaToNumpy(preview if preview is not None else frame.img)
+            preview_image = self._encoder.submit(preview_np, quality=self._jpeg_quality)
+        if requested or (publishing and self.full_frame_due(frame)):
+            out_np = cudaToNumpy(frame.img)
+            if requested or self._change_gate is None or self._change_gate.changed(out_np):
+                frame.image = self.encode_image(out_np)
+                self._last_full = time.monotonic()
+            if requested:
+                self._snapshot_pending = False
+                self.snapshots += 1
+        if preview_image is not None:
+            frame.preview_image = preview_image.result()
+            self._buffers.release(preview)
+        if snapshot_image is not None:
+            frame.snapshot_image = snapshot_image.result()
+            self._buffers.release(frame.snapshot)
+            frame.snapshot = None
+        return frame
+
+    def publish_frame(self, frame: CameraFrame):
+        '''
+        Publish a frame
+
+        This method publishes the encoded frame and the inference results to
+        Home Assistant.  The motion status is published when it changes.
+        '''
+        if frame.motion is not None and frame.motion != self._motion_published:
+            if frame.motion:
+                self.camera_motion.set_on()
+            else:
+                self.camera_motion.set_off()
+            self._motion_published = frame.motion
+        if frame.label is not None:
+            self.camera_inference_labels.publish_state(frame.label)
+            self.camera_inference_timestamp.publish_state(frame.timestamp.isoformat())
+        if frame.snapshot_image is not None:
+            self.camera_inference.publish_image(frame.snapshot_image)
+        if frame.preview_image is not None:
+            self.camera_preview.publish_image(frame.preview_image)
+        if frame.image is not None:
+            self.camera.publish_image(frame.image)
+        return frame
+
+    def publish_camera(self, img):
+        '''
+        stream the camera snapshot to Home Assistant
+        
+        This method runs every stage on the calling thread and publishes the
+        snapshot to Home Assistant.
+        '''
+        frame = CameraFrame(img, datetime.now(pytz.timezone('US/Central')))
+        for name, stage in self.stages():
+            frame = stage(frame)
+            if frame is None:
+                break
 
     def publish_camera_loop(self, frequency: int = 1):
         '''
         Publish the camera snapshot in a loop
         
-        This method publishes the camera snapshot in a loop.
+        This method publishes the camera snapshot in a loop on the calling
+        thread until the camera is stopped.
         '''
-        while True:
-            img = self._camera_input_dev.Capture()
-            self.publish_camera(img)
-            time.sleep(frequency)
+        self._camera_pipeline = CameraPipeline(self._name, self._capture_and_publish, [], frequency=frequency,
+                                               metrics=self._metrics, rate_controller=self._rate_controller)
+        self._camera_pipeline.capture_loop()
+
+    def _capture_and_publish(self):
+        frame = self.capture_frame()
+        if frame is not None:
+            self.publish_camera(frame.img)
+            self.release_frame(frame)
+        return frame
     
-    def start(self, frequency: int = 1):
+    def start(self, frequency: int = 1, queue_size: int = 1):
         '''
         Start the camera
         
-        This method starts the camera.
+        This method starts the camera pipeline.  Capture, inference, encode
+        and publish each run on their own thread.
         '''
+        with self._lock:
+            if self._load is not None:
+                self._pending_start = lambda: self.start(frequency, queue_size)
+                return
         if self._camera_enabled:
-            self._camera_thread = threading.Thread(target=self.publish_camera_loop, args=(frequency,))
-            self._camera_thread.start()
+            self.subscribe_snapshot()
+            self._camera_pipeline = CameraPipeline(self._name, self.capture_frame, self.stages(),
+                                                   frequency=frequency, queue_size=queue_size,
+                                                   metrics=self._metrics,
+                                                   rate_controller=self._rate_controller,
+                                                   release=self.release_frame)
+            self._camera_pipeline.start()
     
+    def start_async(self, frequency: int = 1, queue_size: int = 1, loop=None, executor=None,
+                    on_start: Callable = None) -> AsyncCameraPipeline:
+        '''
+        Start the camera on an event loop
+
+        This method starts the camera pipeline as tasks on the asyncio event
+        loop and returns it.  Capture, inference and encode run on the
+        executor and the publish runs on the loop.  Must be called on the
+        loop thread.  on_start is given the pipeline once it starts, also
+        when the start waits for the network; None is returned then.
+        '''
+        with self._lock:
+            if self._load is not None:
+                loop = loop if loop is not None else asyncio.get_event_loop()
+                start = self._async_start = object()
+                self._pending_start = lambda: loop.call_soon_threadsafe(
+                    self.resume_async, start, frequency, queue_size, loop, executor, on_start)
+                return None
+        if self._camera_enabled:
+            self.subscribe_snapshot()
+            self._camera_pipeline = AsyncCameraPipeline(self._name, self.capture_frame, self.stages(),
+                                                        frequency=frequency, queue_size=queue_size,
+                                                        metrics=self._metrics,
+                                                        rate_controller=self._rate_controller,
+                                                        loop=loop, executor=executor, inline=("publish",),
+                                                        release=self.release_frame)
+            self._camera_pipeline.start()
+            if on_start is not None:
+                on_start(self._camera_pipeline)
+        return self._camera_pipeline
+
+    def resume_async(self, start, frequency: int, queue_size: int, loop, executor, on_start: Callable):
+        '''
+        Run a deferred start on the event loop
+
+        This method starts the pipeline that waited for the network, unless
+        the camera was stopped since.  Runs on the loop thread.
+        '''
+        with self._lock:
+            if self._async_start is not start:
+                return
+            self._async_start = None
+        self.start_async(frequency, queue_size, loop, executor, on_start)
+
+    def subscribe_snapshot(self):
+        '''
+        Subscribe to the snapshot button
+
+        This method subscribes an on-demand camera to the snapshot button
+        and requests a first snapshot, so the camera shows a current frame.
+        '''
+        if self.camera_snapshot is None:
+            return
+        self._snapshot_pending = True
+        self._client.subscribe(self.camera_snapshot.cmd_topic)
+        self._client.message_callback_add(self.camera_snapshot.cmd_topic, self.request_snapshot)
+
+    def cancel_pending_start(self):
+        '''
+        Cancel a deferred start
+
+        This method drops a start that waits for the network, including one
+        already scheduled on the event loop.
+        '''
+        with self._lock:
+            self._pending_start = None
+            self._async_start = None
+
     def stop(self):
         '''
         Stop the camera
         
-        This method stops the camera.
+        This method stops the camera pipeline and unsubscribes from the
+        snapshot button.
         '''
-        if self._camera_enabled:
-            self._camera_thread.join()
+        self.cancel_pending_start()
+        if self.camera_snapshot is not None:
+            self._client.unsubscribe(self.camera_snapshot.cmd_topic)
+            self._client.message_callback_remove(self.camera_snapshot.cmd_topic)
+        if self._camera_pipeline is not None:
+            self._camera_pipeline.stop()
+            self._camera_pipeline = None
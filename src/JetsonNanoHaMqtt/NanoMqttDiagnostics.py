@@ -0,0 +1,140 @@
+from paho.mqtt.client import Client
+from HaMqtt.MQTTUtil import HaDeviceClass
+from .mqtt.MQTTJsonSensor import MQTTJsonSensor
+from .NanoMqttMetrics import NanoMqttMetrics
+from .NanoMqttUtil import entity_unique_id
+import asyncio
+import json
+import re
+import threading
+
+class NanoMqttDiagnostics():
+    '''
+    Nano MQTT Diagnostics
+
+    This class publishes the pipeline metrics as Home Assistant diagnostic
+    sensors under the device, one sensor per metrics source with the
+    source's metrics as its attributes.
+    '''
+    _client = None                      # The MQTT client
+    _name = None                        # The name of the device
+    _dev = None                         # The device dictionary
+    _metrics: NanoMqttMetrics = None    # The metrics to publish
+    _interval: float = 10               # The publish interval in seconds
+    _stop_event = None                  # The stop event
+    _thread: threading.Thread = None    # The publish thread
+    state_topic: str = None             # The JSON state topic
+    sensors: dict = None                # The diagnostic sensors by source key
+
+    def __init__(self, name: str, client: Client, dev: dict, metrics: NanoMqttMetrics,
+                 interval: float = 10, state_topic: str = None):
+        '''
+        Initialize the diagnostics
+
+        Every interval seconds the metrics are published as one JSON
+        document to the state topic.  A diagnostic sensor is created for
+        each source the first time it is seen.
+        '''
+        self._client = client
+        self._name = name
+        self._dev = dev
+        self._metrics = metrics
+        self._interval = interval
+        if state_topic is None:
+            state_topic = "jetson/" + re.sub('[^A-Za-z0-9]', '_', name).lower() + "/diagnostics/state"
+        self.state_topic = state_topic
+        self._stop_event = threading.Event()
+        self.sensors = {}
+
+    def create_sensor(self, source: str, key: str) -> MQTTJsonSensor:
+        '''
+        Create a diagnostic sensor
+
+        This method creates the Home Assistant diagnostic sensor of a
+        source.  Its state is the number of metrics the source reports and
+        its attributes are the metrics, both read from the JSON state topic.
+        The sensor has no device class.
+        '''
+        name = self._name + " " + source + " diagnostics"
+        return MQTTJsonSensor(name, key, self._client, "", HaDeviceClass.NONE, self.state_topic,
+                              json_key=key + ".metrics", json_attributes_key=key + ".values",
+                              entity_category="diagnostic", unique_id=entity_unique_id(self._dev, name),
+                              device_dict=self._dev)
+
+    def publish_diagnostics(self):
+        '''
+        Publish the diagnostics
+
+        This method reads the metrics and publishes them as one JSON
+        document with the numeric metrics of each source.  Metrics without a
+        number yet, e.g. the latency of a stage that never ran, are skipped.
+        '''
+        state = {}
+        for source, values in self._metrics.snapshot().items():
+            key = "jetson_diag_" + re.sub('[^A-Za-z0-9]', '_', source).lower()
+            if key not in self.sensors:
+                self.sensors[key] = self.create_sensor(source, key)
+            numbers = {metric: value for metric, value in values.items()
+                       if isinstance(value, (int, float)) and not isinstance(value, bool)}
+            state[key] = {"metrics": len(numbers), "values": numbers}
+        self._client.publish(self.state_topic, json.dumps(state))
+
+    def publish_diagnostics_loop(self):
+        '''
+        Publish the diagnostics in a loop
+
+        This method publishes the diagnostics every interval until the
+        diagnostics are stopped.
+        '''
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.publish_diagnostics()
+            except Exception as e:
+                print("Diagnostics publish failed: " + str(e))
+
+    async def publish_diagnostics_task(self):
+        '''
+        Publish the diagnostics on an event loop
+
+        This coroutine publishes the metrics every interval seconds until
+        cancelled.
+        '''
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.publish_diagnostics()
+            except Exception as e:
+                print("Diagnostics publish failed: " + str(e))
+
+    def start(self):
+        '''
+        Start the diagnostics
+
+        This method starts the publish thread.
+        '''
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self.publish_diagnostics_loop, name="diagnostics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the diagnostics
+
+        This method stops the publish thread.
+        '''
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        '''
+        Close the diagnostics
+
+        This method stops the diagnostics and closes the diagnostic sensors.
+        '''
+        self.stop()
+        for sensor in self.sensors.values():
+            sensor.close()
+        self.sensors = {}
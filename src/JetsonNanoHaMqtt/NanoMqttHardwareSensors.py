@@ -1,10 +1,15 @@
+from typing import List
 from paho.mqtt.client import Client
-from HaMqtt.MQTTUtil import HaDeviceClass
-from HaMqtt.MQTTSensor import MQTTSensor
-from HaMqtt.MQTTThermometer import MQTTThermometer
-import uuid
+from .mqtt.MQTTJsonSensor import MQTTJsonSensor, MQTTJsonThermometer
+from .mqtt.MQTTOptionalConfig import MQTTOptionalSensor, MQTTOptionalThermometer
+from .HardwareSensor import HardwareSensor, ScheduledSensor, HARDWARE_SENSORS, discover_sensors
+from .NanoMqttUtil import entity_unique_id
+import asyncio
+import json
+import re
 import threading
 import time
+from .SensorDeadband import SensorDeadband
 from jtop import jtop
 
 class NanoMqttHardwareSensors():
@@ -16,51 +21,91 @@ class NanoMqttHardwareSensors():
     _client = None                        # The MQTT client
     _name = None                          # The name of the hardware sensors
     _dev = None                           # The device dictionary
-    _hardware_sensors_enabled = False     # The hardware sensors status
+    _hw_sensors_enabled = False           # The hardware sensors status
     _jetson = None                        # The jetson object
+    _table: List[HardwareSensor] = None   # The hardware sensor table
+    _frequency: float = 5                 # The default sample interval
+    _intervals: dict = None               # The sample interval of each jtop stat key
+    _deadbands: dict = None               # The deadband of each jtop stat key
+    _deadband: float = None               # The default absolute deadband
+    _deadband_pct: float = None           # The default percent deadband
+    _heartbeat: float = 60                # The default heartbeat in seconds
+    _batched = False                      # The batched JSON state status
+    _batch: dict = None                   # The batched JSON state
+    _batch_changed = False                # The batched JSON state changed status
+    _attached = False                     # The jtop update callback status
+    _running = False                      # The fallback loop status
+    _hw_sensors_thread: threading.Thread = None  # The fallback loop thread
+    state_topic: str = None               # The batched JSON state topic
+    sensors: List[ScheduledSensor] = None # The discovered hardware sensors
 
-    
-    jetson_temp_ao = None                 # The jetson AO temperature
-    jetson_temp_cpu = None                # The jetson CPU temperature
-    jetson_temp_gpu = None                # The jetson GPU temperature
-    jetson_temp_pll = None                # The jetson PLL temperature
-    jetson_temp_thermal = None            # The jetson thermal temperature
-    jetson_cpu1_pct = None                # The jetson CPU1 percentage
-    jetson_cpu2_pct = None                # The jetson CPU2 percentage
-    jetson_cpu3_pct = None                # The jetson CPU3 percentage
-    jetson_cpu4_pct = None                # The jetson CPU4 percentage
-    jetson_gpu1_pct = None                # The jetson GPU1 percentage
-    jetson_fan_pct = None                 # The jetson fan speed percentage
-    jetson_pwr_cur = None                 # The jetson power current
-    jetson_pwr_avg = None                 # The jetson power average
-    
-    def __init__(self, name: str, client: Client, dev: dict, jetson: jtop):
+    def __init__(self, name: str, client: Client, dev: dict, jetson: jtop,
+                 deadband: float = None, deadband_pct: float = None,
+                 heartbeat: float = 60, deadbands: dict = None,
+                 batched: bool = False, state_topic: str = None,
+                 table: List[HardwareSensor] = None, intervals: dict = None):
+        '''
+        Initialize the hardware sensors
+
+        A sensor is published when its value moves past the absolute or
+        percent deadband, or on any change when neither is set, and at least
+        once every heartbeat seconds.  deadbands maps jtop stat keys (e.g.
+        "Temp CPU") to a SensorDeadband overriding the defaults.
+
+        In batched mode every tick publishes one JSON document to the state
+        topic and each sensor reads its value with a value template.
+
+        The sensors are discovered from the jtop stats with the hardware
+        sensor table.  intervals maps jtop stat keys to sample intervals in
+        seconds overriding the table.
+        '''
         self._client = client
         self._name = name
         self._dev = dev
         self._jetson = jetson
+        self._deadband = deadband
+        self._deadband_pct = deadband_pct
+        self._heartbeat = heartbeat
+        self._deadbands = dict(deadbands) if deadbands else {}
+        self._batched = batched
+        self._batch = {}
+        self._batch_changed = False
+        if state_topic is None:
+            state_topic = "jetson/" + re.sub('[^A-Za-z0-9]', '_', name).lower() + "/hardware/state"
+        self.state_topic = state_topic
+        self._table = table if table is not None else HARDWARE_SENSORS
+        self._intervals = dict(intervals) if intervals else {}
+        self.sensors = []
+
+    def create_entity(self, sensor: ScheduledSensor):
+        '''
+        Create a sensor entity
+
+        This method creates the Home Assistant MQTT sensor or thermometer for
+        a hardware sensor, reading from the batched state topic in batched
+        mode.
+        '''
+        spec = sensor.spec
+        if spec.thermometer:
+            if self._batched:
+                return MQTTJsonThermometer(sensor.name, sensor.node_id, self._client, spec.unit, self.state_topic, unique_id=entity_unique_id(self._dev, sensor.name), device_dict=self._dev)
+            return MQTTOptionalThermometer(sensor.name, sensor.node_id, self._client, spec.unit, unique_id=entity_unique_id(self._dev, sensor.name), device_dict=self._dev)
+        if self._batched:
+            return MQTTJsonSensor(sensor.name, sensor.node_id, self._client, spec.unit, spec.device_class, self.state_topic, unique_id=entity_unique_id(self._dev, sensor.name), device_dict=self._dev)
+        return MQTTOptionalSensor(sensor.name, sensor.node_id, self._client, spec.unit, spec.device_class, unique_id=entity_unique_id(self._dev, sensor.name), device_dict=self._dev)
 
     def initialize(self):
         '''
         Initialize the hardware sensors
-        
-        This method initializes  the Home Assistant MQTT sensors.
-        '''
-        self.cpu1_pct = MQTTSensor("Jetson CPU1", "jetson_cpu1_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.cpu2_pct = MQTTSensor("Jetson CPU2", "jetson_cpu2_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.cpu3_pct = MQTTSensor("Jetson CPU3", "jetson_cpu3_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.cpu4_pct = MQTTSensor("Jetson CPU4", "jetson_cpu4_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.gpu1_pct = MQTTSensor("Jetson GPU1", "jetson_gpu1_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.fan_pct = MQTTSensor("Jetson Fan", "jetson_fan_pct", self._client, "%", HaDeviceClass.POWER_FACTOR, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.th_ao = MQTTThermometer("Jetson Temp AO", "jetson_t_ao", self._client, "°C", device_dict=self._dev)
-        self.th_cpu = MQTTThermometer("Jetson Temp CPU", "jetson_t_cpu", self._client, "°C", device_dict=self._dev)
-        self.th_gpu = MQTTThermometer("Jetson Temp GPU", "jetson_t_gpu", self._client, "°C", device_dict=self._dev)
-        self.th_pll = MQTTThermometer("Jetson Temp PLL", "jetson_t_pll", self._client, "°C", device_dict=self._dev)
-        self.th_thermal = MQTTThermometer("Jetson Temp Thermal", "jetson_t_thermal", self._client, "°C", device_dict=self._dev)
-        self.pwr_cur = MQTTSensor("Jetson Power Current", "jetson_pwr_cur", self._client, "mW", HaDeviceClass.POWER, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.pwr_avg = MQTTSensor("Jetson Power Average", "jetson_pwr_avg", self._client, "mW", HaDeviceClass.POWER, unique_id=str(uuid.uuid4()), device_dict=self._dev)
+
+        This method discovers the hardware sensors from the jtop stats and
+        initializes the Home Assistant MQTT sensors.
+        '''
+        self.sensors = discover_sensors(self._jetson.stats, self._table, self._frequency, self._intervals)
+        for sensor in self.sensors:
+            sensor.entity = self.create_entity(sensor)
         self._hw_sensors_enabled = True
-    
+
     def close(self):
         '''
         Close the hardware sensors
@@ -68,74 +113,148 @@ class NanoMqttHardwareSensors():
         This method closes the Home Assistant MQTT sensors.
         '''
         if self._hw_sensors_enabled:
-            self.cpu1_pct.close()
-            self.cpu2_pct.close()
-            self.cpu3_pct.close()
-            self.cpu4_pct.close()
-            self.gpu1_pct.close()
-            self.fan_pct.close()
-            self.th_ao.close()
-            self.th_cpu.close()
-            self.th_gpu.close()
-            self.th_pll.close()
-            self.th_thermal.close()
-            self.pwr_cur.close()
-            self.pwr_avg.close()
             self.stop()
+            for sensor in self.sensors:
+                sensor.entity.close()
             self._hw_sensors_enabled = False
 
+    def deadband(self, key: str) -> SensorDeadband:
+        '''
+        Get the deadband of a sensor
+
+        This method returns the deadband for the jtop stat key, creating it
+        from the default settings if it was not configured.
+        '''
+        if key not in self._deadbands:
+            self._deadbands[key] = SensorDeadband(self._deadband, self._deadband_pct, self._heartbeat)
+        return self._deadbands[key]
+
+    def publish_sensor(self, key: str, sensor, value, state=None) -> bool:
+        '''
+        Publish a sensor
+
+        This method publishes the state of the sensor if the raw value moved
+        past the deadband of the jtop stat key or the heartbeat expired.
+        '''
+        state = value if state is None else state
+        if self._batched:
+            try:
+                self._batch[sensor.json_key] = float(state)
+            except (TypeError, ValueError):
+                self._batch[sensor.json_key] = state
+        if not self.deadband(key).should_publish(value):
+            return False
+        if self._batched:
+            self._batch_changed = True
+        else:
+            sensor.publish_state(state)
+        return True
+
+    def publish_batch(self):
+        '''
+        Publish the batched state
+
+        This method publishes the values of every sensor as one JSON
+        document if any sensor moved past its deadband.
+        '''
+        if self._batch_changed:
+            self._client.publish(self.state_topic, json.dumps(self._batch), retain=True)
+        self._batch_changed = False
+
+    def publish_sensors(self, jetson: jtop, sensors: List[ScheduledSensor]):
+        '''
+        Publish a set of hardware sensors
+
+        This method samples the jtop stats once and publishes the given
+        sensors that changed.
+        '''
+        stats = jetson.stats
+        for sensor in sensors:
+            value = sensor.spec.read(jetson, stats, sensor.key)
+            if value is None:
+                continue
+            self.publish_sensor(sensor.key, sensor.entity, value, sensor.spec.formatter(value))
+        if self._batched:
+            self.publish_batch()
+
     def publish_hardware_sensors(self, jetson: jtop):
         '''
         Publish the hardware sensors
-        
-        This method publishes the sensors metrics to Home Assistant.
+
+        This method publishes the sensors metrics that changed to Home
+        Assistant.  In batched mode the metrics are published together in
+        one JSON document.
         '''
-        self.cpu1_pct.publish_state(f'{jetson.stats["CPU1"]:3}')
-        self.cpu2_pct.publish_state(f'{jetson.stats["CPU2"]:3}')
-        if jetson.stats["CPU3"] is "OFF":
-            c3_pct = -1
-        else:
-            c3_pct = f'{jetson.stats["CPU3"]:3}'
-        if jetson.stats["CPU4"] is "OFF":
-            c4_pct = -1
-        else:
-            c4_pct = f'{jetson.stats["CPU4"]:3}'
-        self.cpu3_pct.publish_state(c3_pct)
-        self.cpu4_pct.publish_state(c4_pct)
-        self.gpu1_pct.publish_state(f'{jetson.stats["GPU1"]:3}')
-        self.fan_pct.publish_state(f'{jetson.stats["fan"]:2.2f}')
-        self.th_ao.publish_state(f'{jetson.stats["Temp AO"]:2.2f}')
-        self.th_cpu.publish_state(f'{jetson.stats["Temp CPU"]:2.2f}')
-        self.th_gpu.publish_state(f'{jetson.stats["Temp GPU"]:2.2f}')
-        self.th_pll.publish_state(f'{jetson.stats["Temp PLL"]:2.2f}')
-        self.th_thermal.publish_state(f'{jetson.stats["Temp thermal"]:2.2f}')
-        self.pwr_cur.publish_state(jetson.stats['power cur'])
-        self.pwr_avg.publish_state(jetson.stats['power avg'])
-
-    def publish_hardware_sensors_loop(self, jetson: jtop, frequency: int = 5):
+        self.publish_sensors(jetson, self.sensors)
+
+    def on_jtop_update(self, jetson: jtop):
+        '''
+        Publish the due hardware sensors
+
+        This method is called by jtop for every new sample and publishes the
+        sensors whose sample interval is due, so no sample is read twice.
+        '''
+        now = time.monotonic()
+        due = [sensor for sensor in self.sensors if sensor.due(now)]
+        if due:
+            self.publish_sensors(jetson, due)
+
+    def publish_hardware_sensors_loop(self, jetson: jtop):
         '''
         Publish the hardware sensors
-        
-        This method publishes the sensors metrics to Home Assistant.
-        '''
-        while jetson.ok():
-            self.publish_hardware_sensors(jetson)
-            time.sleep(frequency)
-    
-    def start(self, jetson: jtop, frequency: int = 5):
-        '''
-        Start the hardware sensors loop
-        
-        This method starts the hardware sensors loop.
-        '''
-        self._hw_sensors_thread = threading.Thread(target=self.publish_hardware_sensors_loop, args=(jetson, frequency))
-        self._hw_sensors_thread.start()
-    
-    def stop(self):
+
+        This method publishes the due sensors each time jtop has a new
+        sample, for jtop versions without update callbacks.
         '''
-        Stop the hardware sensors loop
-        
-        This method stops the hardware sensors loop.
+        while self._running and jetson.ok():
+            self.on_jtop_update(jetson)
+
+    async def publish_hardware_sensors_task(self, jetson: jtop):
         '''
-        self._hw_sensors_thread.join()
+        Publish the hardware sensors on an event loop
 
+        This coroutine publishes the due sensors and sleeps until the next
+        sensor is due, until cancelled.
+        '''
+        self._jetson = jetson
+        while True:
+            self.on_jtop_update(jetson)
+            now = time.monotonic()
+            next_due = min((sensor.next_due for sensor in self.sensors), default=now + self._frequency)
+            await asyncio.sleep(max(next_due - now, 0.05))
+
+    def start(self, jetson: jtop, frequency: int = None):
+        '''
+        Start the hardware sensors
+
+        This method publishes the sensors once and attaches them to the jtop
+        update callback, so they are online without waiting for a sample.
+        The frequency changes the default sample interval.
+        '''
+        if frequency is not None:
+            for sensor in self.sensors:
+                if sensor.spec.interval is None and sensor.key not in self._intervals:
+                    sensor.interval = frequency
+        self._jetson = jetson
+        if hasattr(jetson, "attach"):
+            self.on_jtop_update(jetson)
+            jetson.attach(self.on_jtop_update)
+            self._attached = True
+        else:
+            self._running = True
+            self._hw_sensors_thread = threading.Thread(target=self.publish_hardware_sensors_loop, args=(jetson,), daemon=True)
+            self._hw_sensors_thread.start()
+
+    def stop(self):
+        '''
+        Stop the hardware sensors
+
+        This method detaches the sensors from the jtop update callback.
+        '''
+        if self._attached:
+            self._jetson.detach(self.on_jtop_update)
+            self._attached = False
+        if self._hw_sensors_thread is not None:
+            self._running = False
+            self._hw_sensors_thread.join()
+            self._hw_sensors_thread = None
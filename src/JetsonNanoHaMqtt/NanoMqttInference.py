@@ -2,13 +2,23 @@ import re
 from paho.mqtt.client import Client
 from .mqtt.MQTTCamera import MQTTCamera
 from .mqtt.MQTTText import MQTTText
-import uuid
-from jetson.inference import detectNet, imageNet
-from jetson.utils import (cudaFromNumpy, cudaToNumpy, cudaDeviceSynchronize, 
-                          cudaOverlay)
-from PIL import Image
+from .NanoMqttUtil import entity_unique_id
+from jetson.utils import (cudaToNumpy, cudaDeviceSynchronize, cudaOverlay)
 from numpy import asarray
+import numpy as np
+import struct
 from io import BytesIO
+from .JpegEncoder import JpegEncoder
+from .ModelRegistry import ModelRegistry
+from .InferenceScheduler import InferenceScheduler
+from .CudaBufferPool import CudaBufferPool
+from .NanoMqttMetrics import NanoMqttMetrics
+from .AdaptiveRateController import AdaptiveRateController
+from concurrent.futures import CancelledError, Future
+from .BoundedQueue import BoundedQueue
+import json
+import threading
+import time
 
 class NanoMqttInference():
     '''
@@ -35,17 +45,81 @@ class NanoMqttInference():
     _filter_mode: str = None
     #_default_filter_mode_segNet: str = "point"
     #_segNet_buffers = None
+    RAW_RGB8 = b"RGB8"
+    BATCH = b"BTCH"
+    BATCH_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+    _max_batch = 16
+    batch_topic: str = None
+    batches = 0
+    _models: ModelRegistry = None
+    _buffers: CudaBufferPool = None
+    bytes_copied = 0
+    _scheduler: InferenceScheduler = None
+    _metrics: NanoMqttMetrics = None
+    _rate_controller: AdaptiveRateController = None
+    _inference_priority: int = 0
+    _inference_deadline: float = None
+    _encoder: JpegEncoder = None
+    _jpeg_quality: int = None
+    _jpeg_max_size: tuple = None
+    OVERFLOW_DROP_OLDEST = "drop_oldest"
+    OVERFLOW_DROP_NEWEST = "drop_newest"
+    OVERFLOW_REJECT = "reject"
+    _overflow = OVERFLOW_DROP_OLDEST
+    _queue_size = 4
+    _inference_queue: BoundedQueue = None
+    _inference_thread: threading.Thread = None
+    _inference_running = False
+    queue_wait: float = 0.0
+    queue_wait_max: float = 0.0
+    rejected = 0
+    _background_load = False
+    _load: Future = None
+    _start_pending = False
+    _results = False
+    _lock = None
     inference_camera: MQTTCamera = None
     inference_label: MQTTText = None
 
     def __init__(self, name: str, client: Client, dev: dict, jetson_inference, 
                  network: str, threshold: float = 0.5, overlay: str = None,
-                 alpha: float = None):
+                 alpha: float = None, encoder: JpegEncoder = None,
+                 jpeg_quality: int = None, jpeg_max_size: tuple = None,
+                 queue_size: int = 4, overflow: str = OVERFLOW_DROP_OLDEST,
+                 models: ModelRegistry = None, scheduler: InferenceScheduler = None,
+                 priority: int = 0, deadline: float = None, buffers: CudaBufferPool = None,
+                 metrics: NanoMqttMetrics = None, rate_controller: AdaptiveRateController = None,
+                 background_load: bool = False, results: bool = False, max_batch: int = 16):
         '''
         Initialize the inference
         
-        This method initializes the inference.
+        This method initializes the inference.  Output images are encoded on
+        the shared JPEG encoder unless another one is passed.  Requests wait
+        in a queue of queue_size for the inference worker.  When the queue is
+        full the overflow policy drops the oldest request, drops the newest
+        request, or rejects the newest request with a "Busy" label.  The
+        network is shared through the model registry and runs on the
+        inference scheduler at priority.  A request still waiting for the GPU
+        after deadline seconds is dropped.  Request images are decoded into
+        images reused from the CUDA buffer pool.  With metrics, the queue
+        wait and the latency of the decode, inference, encode and publish are
+        recorded under the inference name.  A rate controller refuses a share
+        of the requests with a "Busy" label when the board is hot or busy.
+        With background_load, the network loads on the model registry's load
+        pool and the entities are unavailable until it is loaded.
+
+        In results mode the network runs without an overlay and no image is
+        encoded or published.  Every detection, pose or image class is
+        published as compact JSON to the label's attributes topic, and the
+        label keeps its summary.
+
+        A batch request carries up to max_batch images and a correlation id
+        in one message.  Its images run through the network in a single
+        scheduler submission and their results are published as one JSON
+        reply to the batch topic of the correlation id.
         '''
+        if overflow not in (self.OVERFLOW_DROP_OLDEST, self.OVERFLOW_DROP_NEWEST, self.OVERFLOW_REJECT):
+            raise ValueError("Unknown overflow policy: " + str(overflow))
         print(jetson_inference.__name__)
         self._client = client
         self._dev = dev
@@ -58,6 +132,30 @@ class NanoMqttInference():
             self._overlay = overlay
         if alpha:
             self._alpha = alpha
+        self._encoder = encoder if encoder is not None else JpegEncoder.shared()
+        self._models = models if models is not None else ModelRegistry.shared()
+        self._scheduler = scheduler if scheduler is not None else InferenceScheduler.shared()
+        self._inference_priority = priority
+        self._inference_deadline = deadline
+        self._buffers = buffers
+        self._metrics = metrics
+        self._rate_controller = rate_controller
+        self._jpeg_quality = jpeg_quality
+        self._jpeg_max_size = jpeg_max_size
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._inference_queue = BoundedQueue(queue_size)
+        self._inference_thread = None
+        self.queue_wait = 0.0
+        self.queue_wait_max = 0.0
+        self.rejected = 0
+        self._background_load = background_load
+        self._load = None
+        self._start_pending = False
+        self._lock = threading.Lock()
+        self._results = results
+        self._max_batch = max_batch
+        self.batches = 0
 
     def initialize(self):
         '''
@@ -66,17 +164,75 @@ class NanoMqttInference():
         This method initializes the Home Assistant MQTT sensors for the inference.
         '''
         entity_name = re.sub('[^0-0A-Za-z]', '_', self._name)
+        if self._buffers is None:
+            self._buffers = CudaBufferPool.shared()
         print(self._jetson_inference.__name__)
         if self._jetson_inference.__name__ == "imageNet":
-            self._inference = self._jetson_inference(self._inference_network)
+            threshold = None
         elif self._jetson_inference.__name__ in ["detectNet", "poseNet"]:
-            self._inference = self._jetson_inference(self._inference_network, threshold=self._inference_threshold)
+            threshold = self._inference_threshold
         else:
             raise Exception("Inference not supported")
-        
-        self.inference_label = MQTTText(self._name + " Inference", "jetson_inference_" + entity_name, self._client, unique_id=str(uuid.uuid4()), device_dict=self._dev)
-        self.inference_camera = MQTTCamera(self._name + " Inference Camera", "jetson_inference_camera_" + entity_name, self._client, unique_id=str(uuid.uuid4()), device_dict=self._dev)
+        if self._background_load:
+            self._load = self._models.load(self._jetson_inference, self._inference_network, threshold)
+        else:
+            self._inference = self._models.acquire(self._jetson_inference, self._inference_network, threshold)
+
+        self.inference_label = MQTTText(self._name + " Inference", "jetson_inference_" + entity_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Inference"), device_dict=self._dev, json_attributes=self._results)
+        self.batch_topic = f'{self.inference_label.base_topic}/text/batch'
+        if not self._results:
+            self.inference_camera = MQTTCamera(self._name + " Inference Camera", "jetson_inference_camera_" + entity_name, self._client, unique_id=entity_unique_id(self._dev, self._name + " Inference Camera"), device_dict=self._dev)
+        if self._metrics is not None:
+            self._metrics.register(self._name, self.metrics)
         self._inference_enabled = True
+        if self._load is not None:
+            for entity in self.entities():
+                entity.send_offline()
+            self._load.add_done_callback(self.on_network_loaded)
+
+    def entities(self) -> list:
+        '''
+        The inference entities
+
+        This method returns the Home Assistant MQTT entities of the
+        inference.
+        '''
+        return [entity for entity in (self.inference_label, self.inference_camera) if entity is not None]
+
+    @property
+    def ready(self) -> bool:
+        '''
+        The inference has its network
+        '''
+        return self._load is None
+
+    def on_network_loaded(self, load: Future):
+        '''
+        Finish the background network load
+
+        This method is called on the load pool once the network is loaded.
+        It marks the entities available and runs a start that waited for
+        the network.  An inference whose network failed to load stays
+        unavailable.
+        '''
+        try:
+            model = load.result()
+        except Exception as e:
+            print(self._name + " network failed to load: " + str(e))
+            return
+        with self._lock:
+            if not self._inference_enabled:
+                self._models.release(model)
+                return
+            self._inference = model
+            self._load = None
+            start = self._start_pending
+            self._start_pending = False
+        print(self._name + " network loaded")
+        for entity in self.entities():
+            entity.send_online()
+        if start:
+            self.start()
 
     def close(self):
         '''
@@ -85,96 +241,410 @@ class NanoMqttInference():
         This method closes the Home Assistant MQTT sensors for the inference.
         '''
         if self._inference_enabled:
-            self.inference_camera.close()
-            self.inference_label.close()
+            for entity in self.entities():
+                entity.close()
             self.stop()
-            self._inference_enabled = False
+            with self._lock:
+                self._inference_enabled = False
+            if self._inference is not None:
+                self._models.release(self._inference)
+                self._inference = None
         
+    def encode_image(self, out_np) -> bytes:
+        '''
+        Encode an image
+
+        This method encodes an image array as a JPEG on the shared encoder
+        pool.
+        '''
+        return self._encoder.encode(out_np, quality=self._jpeg_quality, max_size=self._jpeg_max_size)
+
+    def decode_image(self, payload: bytes):
+        '''
+        Decode an image
+
+        This method decodes the payload into an image from the CUDA buffer
+        pool and returns (image, raw).  A raw payload starts with the RAW_RGB8
+        magic followed by the width and height as big endian 16 bit integers
+        and the RGB pixels, and is copied straight into the image.  Any other
+        payload is decoded with Pillow.
+        '''
+        if payload[:4] == self.RAW_RGB8:
+            width, height = struct.unpack_from(">HH", payload, 4)
+            size = width * height * 3
+            if len(payload) != 8 + size:
+                raise ValueError("Raw image payload size does not match {}x{}".format(width, height))
+            pixels = np.frombuffer(payload, dtype=np.uint8, count=size, offset=8).reshape(height, width, 3)
+            raw = True
+        else:
+            from PIL import Image
+            img = Image.open(BytesIO(payload))
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGB")
+            pixels = asarray(img)
+            raw = False
+        height, width, channels = pixels.shape
+        cuda_img = self._buffers.acquire(width, height, "rgb8" if channels == 3 else "rgba8")
+        cudaToNumpy(cuda_img)[...] = pixels
+        self._buffers.record_copy(pixels.nbytes)
+        self.bytes_copied = pixels.nbytes
+        return cuda_img, raw
+
+    @classmethod
+    def encode_batch(cls, correlation_id: str, images: list) -> bytes:
+        '''
+        Encode a batch request
+
+        This method returns the batch request payload for the correlation id
+        and the encoded or raw images.
+        '''
+        batch_id = correlation_id.encode("utf-8")
+        payload = [cls.BATCH, struct.pack(">B", len(batch_id)), batch_id, struct.pack(">H", len(images))]
+        for image in images:
+            payload.append(struct.pack(">I", len(image)))
+            payload.append(image)
+        return b"".join(payload)
+
+    def decode_batch(self, payload: bytes):
+        '''
+        Decode a batch request
+
+        This method returns the (correlation id, images) of a batch payload.
+        A batch payload starts with the BATCH magic followed by the length of
+        the correlation id as an 8 bit integer, the correlation id, the
+        number of images as a big endian 16 bit integer, then each image as
+        its length as a big endian 32 bit integer and its bytes.
+        '''
+        length = payload[4]
+        correlation_id = bytes(payload[5:5 + length]).decode("utf-8")
+        if not self.BATCH_ID.match(correlation_id):
+            raise ValueError("Invalid batch correlation id: " + repr(correlation_id))
+        count, = struct.unpack_from(">H", payload, 5 + length)
+        offset = 7 + length
+        images = []
+        for i in range(count):
+            size, = struct.unpack_from(">I", payload, offset)
+            offset += 4
+            if offset + size > len(payload):
+                raise ValueError("Batch image {} is truncated".format(i))
+            images.append(payload[offset:offset + size])
+            offset += size
+        if offset != len(payload):
+            raise ValueError("Batch payload has trailing bytes")
+        return correlation_id, images
+
+    def infer(self, cuda_img, overlay: bool = True):
+        '''
+        Run the network
+
+        This method runs the network on the image, drawing the overlay if
+        requested, without waiting for the GPU.
+        '''
+        if self._jetson_inference.__name__ == "detectNet":
+            return self._inference.Detect(cuda_img, overlay="lines,labels,conf" if overlay else "none")
+        elif self._jetson_inference.__name__ == "imageNet":
+            return self._inference.Classify(cuda_img)
+        if self._overlay is None:
+            self._overlay = self._default_overlay_poseNet
+        return self._inference.Process(cuda_img, overlay=self._overlay if overlay else "none")
+
+    def run_inference(self, cuda_img):
+        '''
+        Run the network
+
+        This method runs the network on the image and waits for the GPU.
+        Executed on the inference scheduler.
+        '''
+        result = self.infer(cuda_img, overlay=not self._results)
+        cudaDeviceSynchronize()
+        return result
+
+    def run_batch(self, images: list) -> list:
+        '''
+        Run the network on a batch
+
+        This method runs the network on each image without an overlay and
+        waits for the GPU once.  Executed on the inference scheduler.
+        '''
+        results = [self.infer(cuda_img, overlay=False) if cuda_img is not None else None for cuda_img in images]
+        cudaDeviceSynchronize()
+        return results
+
     def publish_inference(self, client, userdata, msg):
         '''
         Publish the inference to Home Assistant
         
         This method publishes the inference to Home Assistant.
-        Executed when a message is received on the command topic.
-        '''
-        img_bytes = BytesIO(msg.payload)
-        img = Image.open(img_bytes)
-        print("Image received: " + self._jetson_inference.__name__)
-        print(img.size)
-        cuda_img = cudaFromNumpy(asarray(img))
-        out_img: Image = None
-        if self._jetson_inference.__name__ == "detectNet":
-            detections = self._inference.Detect(cuda_img, overlay="lines,labels,conf")
-            out_np = cudaToNumpy(cuda_img)
-            cudaDeviceSynchronize()
-            out_img = Image.fromarray(out_np)
-            img_byte_arr = BytesIO()
-            out_img.save(img_byte_arr, format=img.format)
-            out_img = img_byte_arr.getvalue()
-            # print the detections
-            print("detected {:d} objects in image".format(len(detections)))
-
-            if len(detections) > 0:
-                for detection in detections:
-                    print(detection)
-                    print(self._inference.GetClassDesc(detection.ClassID))
-
-                self.inference_label.publish_state(self._inference.GetClassDesc(detections[0].ClassID))
+        Executed on the inference worker for each queued request.  The
+        network runs on the inference scheduler.
+        '''
+        if msg.payload[:4] == self.BATCH:
+            self.publish_batch(msg)
+            return
+        start = time.perf_counter()
+        cuda_img, raw = self.decode_image(msg.payload)
+        decoded = time.perf_counter()
+        try:
+            try:
+                result = self._scheduler.run(self._name, self.run_inference, cuda_img,
+                                             priority=self._inference_priority,
+                                             timeout=self._inference_deadline, model=self._inference)
+            except CancelledError:
+                print(self._name + " inference dropped by the scheduler")
+                return
+            inferred = time.perf_counter()
+            out_img: bytes = None
+            if self._results:
+                self.publish_results(result, cuda_img.width, cuda_img.height)
+            elif self._jetson_inference.__name__ == "detectNet":
+                detections = result
+                out_img = self.encode_image(cudaToNumpy(cuda_img))
+                if len(detections) > 0:
+                    self.inference_label.publish_state(self._inference.GetClassDesc(detections[0].ClassID))
+                    self.inference_camera.publish_image(out_img)
+                else:
+                    self.inference_label.publish_state("None")
+                del out_img
+            elif self._jetson_inference.__name__ == "imageNet":
+                class_id, confidence = result
+                self.inference_label.publish_state(self._inference.GetClassDesc(class_id))
+                if raw:
+                    self.inference_camera.publish_image(self.encode_image(cudaToNumpy(cuda_img)))
+                else:
+                    self.inference_camera.publish_image(msg.payload)
+            elif self._jetson_inference.__name__ == "poseNet":
+                poses = result
+                out_img = self.encode_image(cudaToNumpy(cuda_img))
+
+                self.inference_label.publish_state(len(poses))
                 self.inference_camera.publish_image(out_img)
-            else:
-                self.inference_label.publish_state("None")
-            del out_img
-        elif self._jetson_inference.__name__ == "imageNet":
-            class_id, confidence = self._inference.Classify(cuda_img)
-            self.inference_label.publish_state(self._inference.GetClassDesc(class_id))
-            self.inference_camera.publish_image(img_bytes.getvalue())
-        elif self._jetson_inference.__name__ == "poseNet":
-            if self._overlay is None:
-                self._overlay = self._default_overlay_poseNet
-            poses = self._inference.Process(cuda_img, overlay=self._overlay)
-
-            # print the pose results
-            print("detected {:d} objects in image".format(len(poses)))
-            
-            for pose in poses:
-                print(pose)
-                print(pose.Keypoints)
-                print('Links', pose.Links)
-
-            out_np = cudaToNumpy(cuda_img)
-            cudaDeviceSynchronize()
-            out_img = Image.fromarray(out_np)
-            img_byte_arr = BytesIO()
-            out_img.save(img_byte_arr, format=img.format)
-            out_img = img_byte_arr.getvalue()
-
-            self.inference_label.publish_state(len(poses))
-            self.inference_camera.publish_image(out_img)
-
-            del poses
-
-        del cuda_img
-        del img
-        del img_bytes
+
+                del poses
+        finally:
+            self._buffers.release(cuda_img)
+        if self._metrics is not None:
+            self._metrics.observe(self._name, "decode", decoded - start)
+            self._metrics.observe(self._name, "inference", inferred - decoded)
+            self._metrics.observe(self._name, "publish", time.perf_counter() - inferred)
     
+    def publish_batch(self, msg):
+        '''
+        Publish a batch inference
+
+        This method decodes the images of a batch request, runs them on the
+        inference scheduler in one submission and publishes their results as
+        one JSON reply to the batch topic of the correlation id.  An image
+        that fails to decode gets an error in place of its results, and a
+        batch dropped by the scheduler gets an error for every image.
+        '''
+        start = time.perf_counter()
+        try:
+            correlation_id, payloads = self.decode_batch(msg.payload)
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+            print(self._name + " invalid batch request: " + str(e))
+            return
+        reply = {"id": correlation_id}
+        if len(payloads) > self._max_batch:
+            reply["error"] = "Batch of {} images exceeds {}".format(len(payloads), self._max_batch)
+            self._client.publish(self.batch_topic + "/" + correlation_id, json.dumps(reply, separators=(",", ":")), qos=1)
+            return
+        images = []
+        errors = {}
+        for i, payload in enumerate(payloads):
+            try:
+                images.append(self.decode_image(payload)[0])
+            except Exception as e:
+                images.append(None)
+                errors[i] = str(e)
+        decoded = time.perf_counter()
+        try:
+            try:
+                results = self._scheduler.run(self._name, self.run_batch, images,
+                                              priority=self._inference_priority,
+                                              timeout=self._inference_deadline, model=self._inference)
+            except CancelledError:
+                print(self._name + " batch dropped by the scheduler")
+                results = None
+            inferred = time.perf_counter()
+            replies = []
+            for i, cuda_img in enumerate(images):
+                if cuda_img is None:
+                    replies.append({"error": errors[i]})
+                elif results is None:
+                    replies.append({"error": "Dropped"})
+                else:
+                    replies.append(self.inference_results(results[i], cuda_img.width, cuda_img.height))
+        finally:
+            for cuda_img in images:
+                if cuda_img is not None:
+                    self._buffers.release(cuda_img)
+        reply["results"] = replies
+        self._client.publish(self.batch_topic + "/" + correlation_id, json.dumps(reply, separators=(",", ":")), qos=1)
+        self.batches += 1
+        if self._metrics is not None:
+            self._metrics.observe(self._name, "decode", decoded - start)
+            self._metrics.observe(self._name, "inference", inferred - decoded)
+            self._metrics.observe(self._name, "publish", time.perf_counter() - inferred)
+
+    def inference_results(self, result, width: int, height: int) -> dict:
+        '''
+        The inference results
+
+        This method returns the network result as a dictionary: every
+        detection with its class, confidence and (left, top, right, bottom)
+        box, every pose with its keypoints and links, or the image class
+        and confidence.
+        '''
+        name = self._jetson_inference.__name__
+        results = {"network": name, "width": width, "height": height}
+        if name == "detectNet":
+            results["detections"] = [{
+                "class": self._inference.GetClassDesc(detection.ClassID),
+                "class_id": detection.ClassID,
+                "confidence": round(detection.Confidence, 4),
+                "box": [round(detection.Left, 1), round(detection.Top, 1),
+                        round(detection.Right, 1), round(detection.Bottom, 1)],
+            } for detection in result]
+        elif name == "imageNet":
+            class_id, confidence = result
+            results["class"] = self._inference.GetClassDesc(class_id)
+            results["class_id"] = class_id
+            results["confidence"] = round(confidence, 4)
+        else:
+            results["poses"] = [{
+                "id": pose.ID,
+                "keypoints": [{"name": self._inference.GetKeypointName(keypoint.ID), "id": keypoint.ID,
+                               "x": round(keypoint.x, 1), "y": round(keypoint.y, 1)}
+                              for keypoint in pose.Keypoints],
+                "links": [list(link) for link in pose.Links],
+            } for pose in result]
+        return results
+
+    def result_label(self, results: dict):
+        '''
+        The inference label
+
+        This method returns the label of the results: the class of the first
+        detection, the image class, or the number of poses.
+        '''
+        if "detections" in results:
+            return results["detections"][0]["class"] if results["detections"] else "None"
+        if "poses" in results:
+            return len(results["poses"])
+        return results["class"]
+
+    def publish_results(self, result, width: int, height: int):
+        '''
+        Publish the inference results
+
+        This method publishes the results as compact JSON to the label
+        attributes topic and their summary to the label.
+        '''
+        results = self.inference_results(result, width, height)
+        self.inference_label.publish_attributes(json.dumps(results, separators=(",", ":")))
+        self.inference_label.publish_state(self.result_label(results))
+
+    def queue_inference(self, client, userdata, msg):
+        '''
+        Queue an inference request
+
+        This method puts the message on the inference queue.  Executed on
+        the MQTT network thread when a message is received on the command
+        topic, so it must not block.
+        '''
+        if self._rate_controller is not None and not self._rate_controller.admit(self._name):
+            self.rejected += 1
+            self.inference_label.publish_state("Busy")
+            return
+        if self._inference_queue.put((time.monotonic(), msg)):
+            return
+        if self._overflow == self.OVERFLOW_REJECT:
+            self.rejected += 1
+            self.inference_label.publish_state("Busy")
+        print(self._name + " inference queue full, request dropped")
+
+    def inference_loop(self):
+        '''
+        Run the inference worker
+
+        This method takes requests from the inference queue and runs them
+        until the inference is stopped.
+        '''
+        while self._inference_running:
+            item = self._inference_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            queued, msg = item
+            self.queue_wait = time.monotonic() - queued
+            self.queue_wait_max = max(self.queue_wait_max, self.queue_wait)
+            if self._metrics is not None:
+                self._metrics.observe(self._name, "queue", self.queue_wait)
+            try:
+                self.publish_inference(self._client, None, msg)
+            except Exception as e:
+                print(self._name + " inference failed: " + str(e))
+
+    def metrics(self) -> dict:
+        '''
+        The inference metrics
+
+        This method returns the requests waiting, dropped and rejected by
+        the inference queue and the batches run.
+        '''
+        return {"queue": self.queue_depth, "dropped": self.dropped, "rejected": self.rejected,
+                "batches": self.batches}
+
+    @property
+    def queue_depth(self) -> int:
+        '''
+        The number of requests waiting in the inference queue
+        '''
+        return len(self._inference_queue)
+
+    @property
+    def dropped(self) -> int:
+        '''
+        The number of requests dropped because the inference queue was full
+        '''
+        return self._inference_queue.dropped
+
     def start(self):
         '''
         Start the inference listener
         
-        This method starts the inference listener.  It subscribes to the 
-        command topic and sets the callback for the message.
+        This method starts the inference worker and the inference listener.
+        It subscribes to the command topic and sets the callback that queues
+        the message for the worker.  With the network still loading, the
+        inference starts once it is loaded.
         '''
+        with self._lock:
+            if self._load is not None:
+                self._start_pending = True
+                return
         if self._inference_enabled:
+            policy = BoundedQueue.DROP_OLDEST if self._overflow == self.OVERFLOW_DROP_OLDEST else BoundedQueue.DROP_NEWEST
+            self._inference_queue = BoundedQueue(self._queue_size, policy)
+            self._inference_running = True
+            self._inference_thread = threading.Thread(target=self.inference_loop, name=self._name + " inference", daemon=True)
+            self._inference_thread.start()
             self._client.subscribe(self.inference_label.cmd_topic)
-            self._client.message_callback_add(self.inference_label.cmd_topic, self.publish_inference)
+            self._client.message_callback_add(self.inference_label.cmd_topic, self.queue_inference)
     
     def stop(self):
         '''
         Stop the inference
         
-        This method stops the inference listener.  It unsubscribes to the
-        command topic and removes the callback for the message.
+        This method stops the inference listener and the inference worker.
+        It unsubscribes to the command topic and removes the callback for the
+        message.
         '''
+        with self._lock:
+            self._start_pending = False
         if self._inference_enabled:
             self._client.unsubscribe(self.inference_label.cmd_topic)
             self._client.message_callback_remove(self.inference_label.cmd_topic)
+        if self._inference_thread is not None:
+            self._inference_running = False
+            self._inference_queue.close()
+            self._inference_thread.join()
+            self._inference_thread = None
@@ -0,0 +1,259 @@
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import threading
+import time
+import re
+
+class LatencyHistogram():
+    '''
+    Latency Histogram
+
+    This class keeps the latest samples of a stage latency in a fixed-size
+    ring buffer.  Percentiles and the rate are computed when they are read,
+    so recording a sample is a couple of list writes.
+    '''
+    _size = 512                         # The number of samples kept
+    _values: list = None                # The latency samples in seconds
+    _times: list = None                 # The sample times
+    _index = 0                          # The next sample slot
+    count = 0                           # The number of samples recorded
+    total: float = 0.0                  # The sum of every sample in seconds
+
+    def __init__(self, size: int = 512):
+        self._size = size
+        self._values = [0.0] * size
+        self._times = [0.0] * size
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, now: float = None):
+        '''
+        Record a sample
+        '''
+        self._values[self._index] = seconds
+        self._times[self._index] = time.monotonic() if now is None else now
+        self._index = (self._index + 1) % self._size
+        self.count += 1
+        self.total += seconds
+
+    def _window(self):
+        filled = min(self.count, self._size)
+        if filled < self._size:
+            return self._values[:filled], self._times[:filled]
+        return (self._values[self._index:] + self._values[:self._index],
+                self._times[self._index:] + self._times[:self._index])
+
+    def percentiles(self, *quantiles: float) -> list:
+        '''
+        Latency percentiles
+
+        This method returns the latency at each quantile (0-1) over the
+        samples kept, or None when there are no samples.
+        '''
+        values = sorted(self._window()[0])
+        if not values:
+            return [None for _ in quantiles]
+        return [values[min(len(values) - 1, int(q * len(values)))] for q in quantiles]
+
+    def rate(self, now: float = None) -> float:
+        '''
+        Sample rate
+
+        This method returns the samples per second over the samples kept.
+        '''
+        times = self._window()[1]
+        if len(times) < 2:
+            return 0.0
+        span = (time.monotonic() if now is None else now) - times[0]
+        return (len(times) - 1) / span if span > 0 else 0.0
+
+
+class StageTimer():
+    '''
+    Stage Timer
+
+    This class times a block of code into a stage histogram.
+    '''
+
+    def __init__(self, metrics: 'NanoMqttMetrics', source: str, stage: str):
+        self._metrics = metrics
+        self._source = source
+        self._stage = stage
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._source, self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class NanoMqttMetrics():
+    '''
+    Nano MQTT Metrics
+
+    This class collects the stage latency histograms, counters and gauges of
+    every camera and inference.  Sources can also register collectors that
+    return gauges when the metrics are read, e.g. queue depths.
+    '''
+    _lock = None                        # The metrics lock
+    _size = 512                         # The histogram size
+    _histograms: dict = None            # The histograms by (source, stage)
+    _counters: dict = None              # The counters by (source, name)
+    _gauges: dict = None                # The gauges by (source, name)
+    _collectors: list = None            # The (source, callable) gauge collectors
+
+    def __init__(self, size: int = 512):
+        self._lock = threading.Lock()
+        self._size = size
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+
+    def observe(self, source: str, stage: str, seconds: float):
+        '''
+        Record a stage latency
+        '''
+        key = (source, stage)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self._size)
+            histogram.observe(seconds)
+
+    def timer(self, source: str, stage: str) -> StageTimer:
+        '''
+        Time a stage
+
+        This method returns a context manager recording the time spent in
+        its block as a stage latency.
+        '''
+        return StageTimer(self, source, stage)
+
+    def count(self, source: str, name: str, value: int = 1):
+        '''
+        Increment a counter
+        '''
+        key = (source, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, source: str, name: str, value: float):
+        '''
+        Set a gauge
+        '''
+        with self._lock:
+            self._gauges[(source, name)] = value
+
+    def register(self, source: str, collector: Callable):
+        '''
+        Register a gauge collector
+
+        The collector is called when the metrics are read and returns a
+        dictionary of gauge names to values for the source.
+        '''
+        with self._lock:
+            self._collectors.append((source, collector))
+
+    def snapshot(self) -> dict:
+        '''
+        Read the metrics
+
+        This method returns {source: {name: value}} with the rate and the
+        p50/p95/p99 latency of each stage, the counters and the gauges.
+        '''
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            collectors = list(self._collectors)
+        for source, collector in collectors:
+            try:
+                for name, value in collector().items():
+                    gauges[(source, name)] = value
+            except Exception as e:
+                print("Metrics collector for " + source + " failed: " + str(e))
+        metrics = {}
+        for (source, stage), histogram in histograms:
+            p50, p95, p99 = histogram.percentiles(0.5, 0.95, 0.99)
+            values = metrics.setdefault(source, {})
+            values[stage + "_fps"] = round(histogram.rate(), 2)
+            values[stage + "_p50_ms"] = round(p50 * 1000, 2) if p50 is not None else None
+            values[stage + "_p95_ms"] = round(p95 * 1000, 2) if p95 is not None else None
+            values[stage + "_p99_ms"] = round(p99 * 1000, 2) if p99 is not None else None
+        for (source, name), value in list(counters.items()) + list(gauges.items()):
+            metrics.setdefault(source, {})[name] = value
+        return metrics
+
+    @staticmethod
+    def _label(value: str) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+    def prometheus(self) -> str:
+        '''
+        Prometheus text format
+
+        This method returns the metrics in the Prometheus text exposition
+        format.
+        '''
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = dict(self._counters)
+        lines = ["# TYPE jetson_stage_latency_seconds summary"]
+        rates = ["# TYPE jetson_stage_rate gauge"]
+        for (source, stage), histogram in histograms:
+            labels = 'source="{}",stage="{}"'.format(self._label(source), self._label(stage))
+            for quantile, value in zip(("0.5", "0.95", "0.99"), histogram.percentiles(0.5, 0.95, 0.99)):
+                if value is not None:
+                    lines.append('jetson_stage_latency_seconds{{{},quantile="{}"}} {}'.format(labels, quantile, value))
+            lines.append('jetson_stage_latency_seconds_sum{{{}}} {}'.format(labels, histogram.total))
+            lines.append('jetson_stage_latency_seconds_count{{{}}} {}'.format(labels, histogram.count))
+            rates.append('jetson_stage_rate{{{}}} {}'.format(labels, histogram.rate()))
+        lines.extend(rates)
+        lines.append("# TYPE jetson_counter_total counter")
+        for (source, name), value in counters.items():
+            lines.append('jetson_counter_total{{source="{}",name="{}"}} {}'.format(self._label(source), self._label(name), value))
+        lines.append("# TYPE jetson_gauge gauge")
+        for source, values in self.snapshot().items():
+            for name, value in values.items():
+                if re.search('_(fps|p50_ms|p95_ms|p99_ms)$', name) or (source, name) in counters:
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append('jetson_gauge{{source="{}",name="{}"}} {}'.format(self._label(source), self._label(name), value))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9100, host: str = "") -> HTTPServer:
+        '''
+        Serve the Prometheus endpoint
+
+        This method starts an HTTP server on a daemon thread answering
+        /metrics with the Prometheus text format, and returns the server.
+        '''
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class MetricsServer(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        server = MetricsServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
@@ -0,0 +1,12 @@
+import uuid
+
+def entity_unique_id(dev: dict, name: str) -> str:
+    '''
+    Entity unique id
+
+    This function derives a stable unique id for a Home Assistant entity
+    from the device identifiers (board model and serial number) and the
+    entity name, so the same entity keeps its id across restarts.
+    '''
+    identifiers = dev.get("identifiers", []) if dev else []
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, "/".join(str(i) for i in identifiers) + "/" + name))
@@ -0,0 +1,84 @@
+import time
+
+class SensorDeadband():
+    '''
+    Sensor Deadband
+
+    This class remembers the last published value of a sensor and decides
+    whether a new value should be published.  A numeric value is published
+    when it moves past the absolute or percent deadband, or on any change
+    when neither is set.  Any other value, such as OFF, is published when it
+    changes.  Every value is published when the heartbeat interval expires.
+    '''
+    _absolute = None                    # The absolute deadband
+    _percent = None                     # The percent deadband
+    _heartbeat = 60                     # The seconds between forced publishes
+    _last_value = None                  # The last published value
+    _last_published = None              # The time of the last publish
+    published = 0                       # The number of published values
+    suppressed = 0                      # The number of suppressed values
+
+    def __init__(self, absolute: float = None, percent: float = None, heartbeat: float = 60):
+        self._absolute = absolute
+        self._percent = percent
+        self._heartbeat = heartbeat
+        self._last_value = None
+        self._last_published = None
+        self.published = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def _number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def exceeded(self, value) -> bool:
+        '''
+        Check the deadband
+
+        This method returns True if the value moved past the deadband since
+        the last published value.
+        '''
+        if self._last_value is None:
+            return True
+        new = self._number(value)
+        old = self._number(self._last_value)
+        if new is None or old is None:
+            return value != self._last_value
+        delta = abs(new - old)
+        if self._absolute is not None and delta > self._absolute:
+            return True
+        if self._percent is not None and delta > abs(old) * self._percent / 100.0:
+            return True
+        return self._absolute is None and self._percent is None and delta > 0
+
+    def should_publish(self, value, now: float = None) -> bool:
+        '''
+        Check if a value should be published
+
+        This method returns True if the value moved past the deadband or the
+        heartbeat expired, and records the value as published.
+        '''
+        if now is None:
+            now = time.monotonic()
+        heartbeat = (self._heartbeat is not None and self._last_published is not None
+                     and now - self._last_published >= self._heartbeat)
+        if heartbeat or self.exceeded(value):
+            self._last_value = value
+            self._last_published = now
+            self.published += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def reset(self):
+        '''
+        Reset the deadband
+
+        This method forgets the last published value so the next value is
+        published.
+        '''
+        self._last_value = None
+        self._last_published = None
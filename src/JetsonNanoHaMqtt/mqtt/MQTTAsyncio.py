@@ -0,0 +1,120 @@
+from paho.mqtt.client import Client, MQTT_ERR_SUCCESS
+import asyncio
+
+class MQTTAsyncio():
+    '''
+    MQTT Asyncio
+
+    Drives the socket of an MQTT client from an asyncio event loop in place
+    of the client's network thread.  The socket is read when the loop sees
+    it readable and written only while the client has data waiting, so no
+    thread polls the socket.  Messages may still be published from other
+    threads; the writer is registered on the loop thread.  A task runs the
+    client keep-alive once a second and reconnects a lost connection on
+    the executor.
+    '''
+    _client: Client = None              # The MQTT client
+    _loop = None                        # The event loop
+    _sock = None                        # The registered socket
+    _misc_task = None                   # The keep-alive task
+    _reconnect = True                   # The reconnect status
+    reconnects = 0                      # The number of reconnect attempts
+
+    def __init__(self, client: Client, loop=None, reconnect: bool = True):
+        self._client = client
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._reconnect = reconnect
+        self._sock = None
+        self._misc_task = None
+        self.reconnects = 0
+
+    def on_socket_open(self, client, userdata, sock):
+        self._loop.call_soon_threadsafe(self._add_reader, sock)
+
+    def on_socket_close(self, client, userdata, sock):
+        self._loop.call_soon_threadsafe(self._remove, sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self._loop.call_soon_threadsafe(self._loop.add_writer, sock, self._write, sock)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self._loop.call_soon_threadsafe(self._loop.remove_writer, sock)
+
+    def _add_reader(self, sock):
+        self._sock = sock
+        self._loop.add_reader(sock, self._client.loop_read)
+
+    def _write(self, sock):
+        self._client.loop_write()
+        if not self._client.want_write():
+            self._loop.remove_writer(sock)
+
+    def _remove(self, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._sock is sock:
+            self._sock = None
+
+    async def misc_loop(self):
+        '''
+        Run the client keep-alive
+
+        This coroutine runs the client keep-alive once a second and
+        reconnects a lost connection, waiting longer after each failed
+        attempt, until cancelled.
+        '''
+        backoff = 1
+        while True:
+            if self._client.loop_misc() == MQTT_ERR_SUCCESS or not self._reconnect:
+                await asyncio.sleep(1)
+                continue
+            self.reconnects += 1
+            try:
+                await self._loop.run_in_executor(None, self._client.reconnect)
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("MQTT reconnect failed: " + str(e))
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def attach(self):
+        '''
+        Attach the client
+
+        This method registers the socket callbacks, adds a socket the client
+        already opened to the loop and starts the keep-alive task.  Must be
+        called on the loop thread, and the client's network thread must not
+        be running.
+        '''
+        client = self._client
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+        sock = client.socket()
+        if sock is not None:
+            self._add_reader(sock)
+            if client.want_write():
+                self._loop.add_writer(sock, self._write, sock)
+        self._misc_task = self._loop.create_task(self.misc_loop())
+        return self._misc_task
+
+    def detach(self):
+        '''
+        Detach the client
+
+        This method stops the keep-alive task and removes the socket from
+        the loop.  Must be called on the loop thread.
+        '''
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+        client = self._client
+        client.on_socket_open = None
+        client.on_socket_close = None
+        client.on_socket_register_write = None
+        client.on_socket_unregister_write = None
+        if self._sock is not None:
+            self._remove(self._sock)
@@ -0,0 +1,34 @@
+from paho.mqtt.client import Client
+from HaMqtt.MQTTDevice import MQTTDevice
+from .MQTTDiscovery import MQTTDiscovery
+from HaMqtt import MQTTUtil
+import uuid
+
+class MQTTBinarySensor(MQTTDiscovery, MQTTDevice):
+    '''
+    MQTT Binary Sensor device
+
+    Sets up an MQTT binary sensor device that can be used with Home Assistant.
+    '''
+    device_type = "binary_sensor"
+    initial_state = MQTTUtil.OFF
+
+    def __init__(self, name: str, node_id: str, client: Client, device_class: str = None,
+                 unique_id: str = None, device_dict=None):
+        self.device_class = device_class
+        self.state = False
+        super().__init__(name, node_id, client, True, unique_id=unique_id if unique_id is not None else str(uuid.uuid4()), device_dict=device_dict)
+
+    def initialize(self):
+        self.add_config_option("payload_on", MQTTUtil.ON.decode())
+        self.add_config_option("payload_off", MQTTUtil.OFF.decode())
+        if self.device_class is not None:
+            self.add_config_option("device_class", self.device_class)
+
+    def set_on(self):
+        self.state = True
+        self.publish_state(MQTTUtil.ON)
+
+    def set_off(self):
+        self.state = False
+        self.publish_state(MQTTUtil.OFF)
@@ -0,0 +1,28 @@
+from paho.mqtt.client import Client
+from HaMqtt.MQTTDevice import MQTTDevice
+from .MQTTDiscovery import MQTTDiscovery
+import uuid
+
+class MQTTButton(MQTTDiscovery, MQTTDevice):
+    '''
+    MQTT Button device
+
+    Sets up an MQTT button device that can be used with Home Assistant.  A
+    press is published to the command topic.
+    '''
+    device_type = "button"
+    payload_press = "PRESS"
+
+    def __init__(self, name: str, node_id: str, client: Client, unique_id: str = None, device_dict=None):
+        self.cmd_topic = ""
+        super().__init__(name, node_id, client, True, unique_id=unique_id if unique_id is not None else str(uuid.uuid4()), device_dict=device_dict)
+
+    def close(self):
+        self._client.unsubscribe(self.cmd_topic)
+        super(MQTTButton, self).close()
+
+    def initialize(self):
+        self.cmd_topic = f'{self.base_topic}/button/cmd'
+        self.conf_dict.pop("state_topic", None)
+        self.add_config_option("command_topic", self.cmd_topic)
+        self.add_config_option("payload_press", self.payload_press)
@@ -1,8 +1,9 @@
 from paho.mqtt.client import Client
 from HaMqtt.MQTTDevice import MQTTDevice
+from .MQTTDiscovery import MQTTDiscovery
 import uuid
 
-class MQTTCamera(MQTTDevice):
+class MQTTCamera(MQTTDiscovery, MQTTDevice):
     '''
     MQTT Camera device
     
@@ -10,8 +11,8 @@ class MQTTCamera(MQTTDevice):
     '''
     device_type = "camera"
 
-    def __init__(self, name: str, node_id, client: Client, unique_id: str = str(uuid.uuid4()), device_dict=None):
-        super().__init__(name, node_id, client, unique_id=unique_id, device_dict=device_dict)
+    def __init__(self, name: str, node_id, client: Client, unique_id: str = None, device_dict=None):
+        super().__init__(name, node_id, client, unique_id=unique_id if unique_id is not None else str(uuid.uuid4()), device_dict=device_dict)
 
     def initialize(self):
         self.topic = f'{self.base_topic}/state'
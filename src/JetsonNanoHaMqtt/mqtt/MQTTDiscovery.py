@@ -0,0 +1,17 @@
+import json
+
+class MQTTDiscovery():
+    '''
+    MQTT discovery mixin
+
+    Sends the discovery config and the availability of a device without
+    HaMqtt's 10 ms pause between them; both go out in order on the one
+    connection.  The initial state is sent unless send_initial is False,
+    also when a discovery cache skipped the unchanged config.
+    '''
+
+    def _send_discovery(self, send_initial=True):
+        self._client.publish(self.config_topic, json.dumps(self.conf_dict), retain=True)
+        self.send_online()
+        if send_initial:
+            self.publish_state(self.__class__.initial_state)
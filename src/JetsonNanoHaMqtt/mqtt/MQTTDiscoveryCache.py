@@ -0,0 +1,143 @@
+from paho.mqtt.client import Client, MQTTMessageInfo
+import hashlib
+import threading
+import json
+import os
+
+class CachedMessageInfo(MQTTMessageInfo):
+    '''
+    The message info of a config the discovery cache did not send again
+    '''
+    cached = True
+
+
+class MQTTDiscoveryCache():
+    '''
+    MQTT Discovery Cache
+
+    Wraps an MQTT client and remembers a hash of every retained Home
+    Assistant discovery config it publishes.  A config that is unchanged
+    since it was last published is not sent again; the message info
+    returned for it is marked cached.  When Home Assistant announces it is
+    online on its status topic, the cache is cleared and every config is
+    sent again, as Home Assistant may have lost them.  Every other call is
+    passed to the client.
+    '''
+
+    def __init__(self, client: Client, path: str, prefix: str = "homeassistant/"):
+        self._client = client
+        self._path = path
+        self._prefix = prefix
+        self._status_topic = prefix + "status"
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._configs = {}
+        self._dirty = False
+        self.sent = 0
+        self.skipped = 0
+        self.republished = 0
+        self.load()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def load(self):
+        '''
+        Load the cache
+
+        This method reads the config hashes from the cache file.  A missing
+        or unreadable file starts an empty cache.
+        '''
+        try:
+            with open(self._path) as f:
+                self._hashes = json.load(f)
+        except (OSError, ValueError):
+            self._hashes = {}
+
+    def save(self):
+        '''
+        Save the cache
+
+        This method writes the config hashes to the cache file if they
+        changed.
+        '''
+        with self._lock:
+            if not self._dirty:
+                return
+            hashes = dict(self._hashes)
+            self._dirty = False
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(hashes, f)
+        os.replace(tmp_path, self._path)
+
+    def clear(self):
+        '''
+        Clear the cache
+
+        This method forgets every config so they are all sent again.
+        '''
+        with self._lock:
+            self._hashes = {}
+            self._dirty = True
+
+    def watch_status(self):
+        '''
+        Watch the Home Assistant status
+
+        This method subscribes to the Home Assistant status topic, where
+        Home Assistant publishes "online" when it starts.
+        '''
+        self._client.message_callback_add(self._status_topic, self.on_status)
+        self._client.subscribe(self._status_topic)
+
+    def unwatch_status(self):
+        '''
+        Stop watching the Home Assistant status
+        '''
+        self._client.message_callback_remove(self._status_topic)
+        self._client.unsubscribe(self._status_topic)
+
+    def on_status(self, client, userdata, msg):
+        '''
+        Republish the configs
+
+        This method clears the cache and publishes every config published
+        since the start again when Home Assistant comes online.
+        '''
+        if msg.payload != b"online":
+            return
+        self.clear()
+        with self._lock:
+            configs = list(self._configs.items())
+        for topic, (payload, qos) in configs:
+            self.publish(topic, payload, qos, retain=True)
+        self.republished += len(configs)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, **kwargs):
+        if topic.startswith(self._prefix) and topic.endswith("/config"):
+            if payload is None:
+                data = b""
+            elif isinstance(payload, (bytes, bytearray)):
+                data = bytes(payload)
+            else:
+                data = str(payload).encode("utf-8")
+            digest = hashlib.sha1(data).hexdigest()
+            with self._lock:
+                if len(data) == 0:
+                    # An empty config removes the entity
+                    self._configs.pop(topic, None)
+                    if self._hashes.pop(topic, None) is not None:
+                        self._dirty = True
+                elif retain and self._hashes.get(topic) == digest:
+                    self._configs[topic] = (payload, qos)
+                    self.skipped += 1
+                    info = CachedMessageInfo(0)
+                    info._set_as_published()
+                    return info
+                elif retain:
+                    self._configs[topic] = (payload, qos)
+                    self._hashes[topic] = digest
+                    self._dirty = True
+                self.sent += 1
+        return self._client.publish(topic, payload, qos, retain, **kwargs)
@@ -0,0 +1,74 @@
+from paho.mqtt.client import Client
+from HaMqtt.MQTTSensor import MQTTSensor
+from HaMqtt.MQTTThermometer import MQTTThermometer
+from .MQTTOptionalConfig import MQTTOptionalConfig
+from .MQTTDiscovery import MQTTDiscovery
+import uuid
+
+class MQTTJsonState(MQTTOptionalConfig, MQTTDiscovery):
+    '''
+    MQTT JSON state mixin
+
+    Points the state topic of a device at a JSON document shared with other
+    devices and extracts the device value with a value template.  An entity
+    category such as "diagnostic" can be set.  The JSON document is
+    published by the owner of the shared topic, so the device never
+    publishes its own state there, not even the initial state on discovery.
+    With a JSON attributes key, the object under that key of the same
+    document sets the entity attributes.
+    '''
+    json_state_topic = None
+    json_key = None
+    json_attributes_key = None
+    entity_category = None
+
+    def _send_discovery(self, send_initial=True):
+        super()._send_discovery(send_initial=False)
+
+    def publish_state(self, payload):
+        pass
+
+    def initialize(self):
+        super().initialize()
+        self.state_topic = self.json_state_topic
+        self.add_config_option("state_topic", self.json_state_topic)
+        self.add_config_option("value_template", "{{ value_json." + self.json_key + " }}")
+        if self.json_attributes_key is not None:
+            self.add_config_option("json_attributes_topic", self.json_state_topic)
+            self.add_config_option("json_attributes_template", "{{ value_json." + self.json_attributes_key + " | tojson }}")
+        if self.entity_category is not None:
+            self.add_config_option("entity_category", self.entity_category)
+
+
+class MQTTJsonSensor(MQTTJsonState, MQTTSensor):
+    '''
+    MQTT JSON Sensor device
+
+    Sets up an MQTT sensor that reads its value from a shared JSON state
+    topic.
+    '''
+
+    def __init__(self, name: str, node_id: str, client: Client, unit, device_class, json_state_topic: str,
+                 json_key: str = None, entity_category: str = None, json_attributes_key: str = None, **kwargs):
+        self.json_state_topic = json_state_topic
+        self.json_key = json_key if json_key is not None else node_id
+        self.json_attributes_key = json_attributes_key
+        self.entity_category = entity_category
+        kwargs.setdefault("unique_id", str(uuid.uuid4()))
+        super().__init__(name, node_id, client, unit, device_class, **kwargs)
+
+
+class MQTTJsonThermometer(MQTTJsonState, MQTTThermometer):
+    '''
+    MQTT JSON Thermometer device
+
+    Sets up an MQTT thermometer that reads its value from a shared JSON state
+    topic.
+    '''
+
+    def __init__(self, name: str, node_id: str, client: Client, unit, json_state_topic: str,
+                 json_key: str = None, **kwargs):
+        self.json_state_topic = json_state_topic
+        self.json_key = json_key if json_key is not None else node_id
+        kwargs.setdefault("unique_id", str(uuid.uuid4()))
+        super().__init__(name, node_id, client, unit, **kwargs)
@@ -0,0 +1,48 @@
+from HaMqtt.MQTTSensor import MQTTSensor
+from HaMqtt.MQTTThermometer import MQTTThermometer
+from HaMqtt.MQTTUtil import HaDeviceClass
+from .MQTTDiscovery import MQTTDiscovery
+import uuid
+
+class MQTTOptionalConfig():
+    '''
+    MQTT optional config mixin
+
+    Leaves a device class of HaDeviceClass.NONE and an empty unit out of the
+    discovery config, since Home Assistant rejects them.
+    '''
+
+    def initialize(self):
+        super().initialize()
+        if self.conf_dict.get("device_class") == HaDeviceClass.NONE.value:
+            del self.conf_dict["device_class"]
+        if not self.conf_dict.get("unit_of_measurement", True):
+            del self.conf_dict["unit_of_measurement"]
+
+
+class MQTTOptionalSensor(MQTTOptionalConfig, MQTTDiscovery, MQTTSensor):
+    '''
+    MQTT Sensor device
+
+    Sets up an MQTT sensor that may have no device class or unit.
+    '''
+
+    def __init__(self, name: str, node_id: str, client, unit: str, device_class: HaDeviceClass,
+                 unique_id: str = None, device_dict: dict = None):
+        super().__init__(name, node_id, client, unit, device_class,
+                         unique_id=unique_id if unique_id is not None else str(uuid.uuid4()),
+                         device_dict=device_dict)
+
+
+class MQTTOptionalThermometer(MQTTOptionalConfig, MQTTDiscovery, MQTTThermometer):
+    '''
+    MQTT Thermometer device
+
+    Sets up an MQTT thermometer.
+    '''
+
+    def __init__(self, name: str, node_id: str, client, unit: str = "°C", unique_id: str = None,
+                 device_dict: dict = None):
+        super().__init__(name, node_id, client, unit,
+                         unique_id=unique_id if unique_id is not None else str(uuid.uuid4()),
+                         device_dict=device_dict)
@@ -0,0 +1,221 @@
+from paho.mqtt.client import Client, MQTTMessageInfo, MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN
+from collections import OrderedDict
+import threading
+import time
+
+class MQTTPublishQueue():
+    '''
+    MQTT Publish Queue
+
+    Wraps an MQTT client so publishing never blocks the caller and never
+    grows without bound.  Messages wait in a queue keyed by topic, so a new
+    message replaces the message still waiting on the same topic (latest
+    value wins) and keeps its place in the queue.  A sender thread hands the
+    messages to the client with at most max_inflight messages not yet
+    written to the broker, so a slow link holds messages here instead of in
+    the client's unbounded buffer.  When the queue exceeds max_bytes or
+    max_messages the oldest images and states are dropped; discovery configs
+    and availability are never dropped, and the newest message is always
+    kept, even when it alone exceeds max_bytes.  While the client is
+    disconnected the messages stay in the queue, where they coalesce,
+    instead of piling up in the client.  Messages published before start()
+    wait in the queue.  Every other call is passed to the client.
+    '''
+
+    def __init__(self, client: Client, max_bytes: int = 4 * 1024 * 1024, max_messages: int = 256,
+                 max_inflight: int = 4, policies: dict = None, prefix: str = "homeassistant/"):
+        '''
+        Initialize the publish queue
+
+        policies maps a Home Assistant entity type (e.g. "camera",
+        "sensor") or a topic prefix to the (qos, retain) of its images and
+        states, overriding the values the entity publishes with.
+        '''
+        self._client = client
+        self._max_bytes = max_bytes
+        self._max_messages = max_messages
+        self._max_inflight = max_inflight
+        self._policies = dict(policies) if policies else {}
+        self._prefix = prefix
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._inflight = []
+        self._running = False
+        self._thread = None
+        self.queued_bytes = 0
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    @staticmethod
+    def _size(payload) -> int:
+        if payload is None:
+            return 0
+        if isinstance(payload, (bytes, bytearray)):
+            return len(payload)
+        return len(str(payload))
+
+    def _control(self, topic: str) -> bool:
+        # Discovery configs and availability must reach the broker
+        return topic.startswith(self._prefix) and (topic.endswith("/config") or topic.endswith("/available"))
+
+    def policy(self, topic: str, qos: int, retain: bool) -> tuple:
+        '''
+        The QoS and retain of a topic
+
+        This method returns the (qos, retain) for the topic from the policy
+        of its topic prefix or entity type, or the given values.
+        '''
+        if self._control(topic):
+            return qos, retain
+        for key, policy in self._policies.items():
+            if "/" in key and topic.startswith(key):
+                return policy
+        if topic.startswith(self._prefix):
+            entity_type = topic[len(self._prefix):].split("/", 1)[0]
+            if entity_type in self._policies:
+                return self._policies[entity_type]
+        return qos, retain
+
+    def _drop_oldest(self, keep: str) -> bool:
+        for topic in self._pending:
+            if topic != keep and not self._control(topic):
+                payload = self._pending.pop(topic)[0]
+                self.queued_bytes -= self._size(payload)
+                self.dropped += 1
+                return True
+        return False
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, **kwargs):
+        '''
+        Queue a message
+
+        This method queues the message for the sender thread and returns at
+        once.  The returned message info is marked as published.
+        '''
+        qos, retain = self.policy(topic, qos, retain)
+        with self._cond:
+            previous = self._pending.get(topic)
+            if previous is not None:
+                self.queued_bytes -= self._size(previous[0])
+                self.coalesced += 1
+            self._pending[topic] = (payload, qos, retain, kwargs)
+            self.queued_bytes += self._size(payload)
+            while ((self.queued_bytes > self._max_bytes or len(self._pending) > self._max_messages)
+                   and self._drop_oldest(topic)):
+                pass
+            self._cond.notify()
+        info = MQTTMessageInfo(0)
+        info._set_as_published()
+        return info
+
+    def _wait_inflight(self):
+        # Wait until fewer than max_inflight messages are waiting in the
+        # client, forgetting the messages the client failed to queue.  A
+        # message published while disconnected is kept by the client and
+        # sent on reconnect, so it is not a failure
+        while self._running:
+            inflight = []
+            for info in self._inflight:
+                if info.rc == MQTT_ERR_NO_CONN:
+                    continue
+                if info.rc != MQTT_ERR_SUCCESS:
+                    self.failed += 1
+                elif not info.is_published():
+                    inflight.append(info)
+            self._inflight = inflight
+            if len(inflight) < self._max_inflight:
+                return
+            time.sleep(0.005)
+
+    def sender_loop(self):
+        '''
+        Run the sender
+
+        This method hands the queued messages to the client, oldest topic
+        first, until the queue is stopped.  Messages wait in the queue while
+        the client is disconnected.  A QoS 0 message the client could not
+        send for lack of a connection is queued again unless a newer one
+        is waiting.
+        '''
+        while True:
+            self._wait_inflight()
+            with self._cond:
+                while (not self._pending or not self._client.is_connected()) and self._running:
+                    self._cond.wait(0.5)
+                if not self._running:
+                    return
+                topic, message = self._pending.popitem(last=False)
+                payload, qos, retain, kwargs = message
+                self.queued_bytes -= self._size(payload)
+            try:
+                info = self._client.publish(topic, payload, qos, retain, **kwargs)
+                if info.rc == MQTT_ERR_NO_CONN and qos == 0:
+                    with self._cond:
+                        if topic not in self._pending:
+                            self._pending[topic] = message
+                            self._pending.move_to_end(topic, last=False)
+                            self.queued_bytes += self._size(payload)
+                    continue
+                self._inflight.append(info)
+                self.published += 1
+            except Exception as e:
+                self.failed += 1
+                print("Publish to " + topic + " failed: " + str(e))
+
+    def metrics(self) -> dict:
+        '''
+        The publish queue metrics
+
+        This method returns the queued messages and bytes and the published,
+        coalesced, dropped and failed message counts.
+        '''
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "queued_bytes": self.queued_bytes,
+                "inflight": len(self._inflight),
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def start(self):
+        '''
+        Start the sender
+
+        This method starts the sender thread if it is not running.
+        '''
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self.sender_loop, name="mqtt publish", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        '''
+        Stop the sender
+
+        This method hands the queued messages to the client for up to
+        timeout seconds while it is connected, then stops the sender thread.
+        Messages still queued are dropped.
+        '''
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self._client.is_connected():
+            with self._cond:
+                if not self._pending:
+                    break
+            time.sleep(0.01)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
@@ -1,21 +1,27 @@
 from paho.mqtt.client import Client
 from HaMqtt.MQTTDevice import MQTTDevice
+from .MQTTDiscovery import MQTTDiscovery
 import uuid
 
-class MQTTText(MQTTDevice):
+class MQTTText(MQTTDiscovery, MQTTDevice):
     '''
     MQTT Text device
 
-    Sets up an MQTT text device that can be used with Home Assistant.
+    Sets up an MQTT text device that can be used with Home Assistant.  With
+    json_attributes, a JSON document published to the attributes topic sets
+    the entity attributes.
     '''
     device_type = "text"
     initial_text = ""
 
-    def __init__(self, name: str, node_id: str, client: Client, unique_id: str = str(uuid.uuid4()), device_dict=None):
+    def __init__(self, name: str, node_id: str, client: Client, unique_id: str = None, device_dict=None,
+                 json_attributes: bool = False):
         self.state = self.__class__.initial_text
         self.cmd_topic = ""
         self.state_topic = ""
-        super().__init__(name, node_id, client, unique_id=unique_id, device_dict=device_dict)
+        self.json_attributes = json_attributes
+        self.attributes_topic = None
+        super().__init__(name, node_id, client, unique_id=unique_id if unique_id is not None else str(uuid.uuid4()), device_dict=device_dict)
 
     def close(self):
         self._client.unsubscribe(self.cmd_topic)
@@ -26,3 +32,9 @@ class MQTTText(MQTTDevice):
         self.state_topic = f'{self.base_topic}/text/state'
         self.add_config_option("command_topic", self.cmd_topic)
         self.add_config_option("state_topic", self.state_topic)
+        if self.json_attributes:
+            self.attributes_topic = f'{self.base_topic}/text/attributes'
+            self.add_config_option("json_attributes_topic", self.attributes_topic)
+
+    def publish_attributes(self, payload):
+        self._client.publish(self.attributes_topic, payload, retain=True)
@@ -0,0 +1,59 @@
+'''
+Test configuration
+
+The tests import the package from src without installing it and run it
+against the Jetson, jtop and MQTT stand-ins from the benchmarks, so they run
+on a plain Linux box.
+'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import stubs
+
+stubs.install()
+
+from paho.mqtt.client import MQTTMessageInfo
+import pytest
+
+
+class RecordingClient():
+    '''
+    paho Client stand-in
+
+    Records every published message instead of sending it.
+    '''
+
+    def __init__(self):
+        self.published = []
+        self.callbacks = {}
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        self.published.append((topic, payload, retain))
+        info = MQTTMessageInfo(len(self.published))
+        info.rc = 0
+        info._set_as_published()
+        return info
+
+    def payloads(self, topic: str) -> list:
+        return [payload for published, payload, _ in self.published if published == topic]
+
+    def subscribe(self, topic, qos: int = 0):
+        return 0, 0
+
+    def unsubscribe(self, topic):
+        return 0, 0
+
+    def message_callback_add(self, topic: str, callback):
+        self.callbacks[topic] = callback
+
+    def message_callback_remove(self, topic: str):
+        self.callbacks.pop(topic, None)
+
+
+@pytest.fixture
+def client() -> RecordingClient:
+    return RecordingClient()
@@ -0,0 +1,56 @@
+from JetsonNanoHaMqtt.AdaptiveRateController import AdaptiveRateController
+import pytest
+
+COOL = {"Temp GPU": 50.0, "Temp CPU": 50.0, "GPU1": 20}
+HOT = {"Temp GPU": 85.0, "Temp CPU": 60.0, "GPU1": 20}
+
+
+def test_heat_cuts_the_rate_down_to_the_minimum():
+    controller = AdaptiveRateController(hold=0, min_scale=0.2)
+    assert controller.update(HOT, now=0) == 0.5
+    assert controller.update(HOT, now=1) == 0.25
+    assert controller.update(HOT, now=2) == 0.2
+    assert controller.period(1.0) == 5.0
+
+
+def test_gpu_load_cuts_the_rate():
+    controller = AdaptiveRateController(hold=0)
+    assert controller.update(dict(COOL, GPU1=99), now=0) == 0.5
+
+
+def test_rate_recovers_step_by_step_once_cool():
+    controller = AdaptiveRateController(hold=0)
+    controller.update(HOT, now=0)
+    assert controller.update(COOL, now=1) == pytest.approx(0.6)
+    for now in range(2, 10):
+        controller.update(COOL, now=now)
+    assert controller.scale == 1.0
+
+
+def test_rate_is_held_between_the_marks():
+    controller = AdaptiveRateController(hold=0)
+    controller.update(HOT, now=0)
+    assert controller.update(dict(COOL, **{"Temp GPU": 75.0}), now=1) == 0.5
+
+
+def test_changes_wait_for_the_hold_time():
+    controller = AdaptiveRateController(hold=10)
+    controller.update(HOT, now=0)
+    assert controller.update(HOT, now=5) == 0.5
+    assert controller.update(HOT, now=10) == 0.25
+    assert controller.changes == 2
+
+
+def test_admission_follows_the_rate_scale():
+    controller = AdaptiveRateController(hold=0)
+    assert all(controller.admit("camera") for _ in range(10))
+    controller.update(HOT, now=0)
+    controller.update(HOT, now=1)
+    admitted = [controller.admit("camera") for _ in range(8)]
+    assert admitted == [True, False, False, True, False, False, False, True]
+    assert controller.throttled == 5
+
+
+def test_invalid_marks():
+    with pytest.raises(ValueError):
+        AdaptiveRateController(temp_high=70, temp_low=80)
@@ -0,0 +1,28 @@
+import bench
+import json
+import pytest
+import stubs
+
+
+@pytest.fixture(autouse=True)
+def config():
+    saved = dict(stubs.CONFIG)
+    yield
+    stubs.CONFIG.clear()
+    stubs.CONFIG.update(saved)
+
+
+def test_benchmarks_write_a_json_report(tmp_path):
+    output = tmp_path / "bench.json"
+    assert bench.main(["camera", "sensors", "--duration", "0.5", "--cameras", "1", "--width", "320",
+                       "--height", "240", "--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert report["parameters"]["cameras"] == 1
+    assert report["results"]["camera"]["Bench Camera 0"]["fps"] > 0
+    assert report["results"]["sensors"]["batched"]["messages_per_tick"] < \
+        report["results"]["sensors"]["individual"]["messages_per_tick"]
+
+
+def test_unknown_benchmark_is_an_error():
+    with pytest.raises(SystemExit):
+        bench.main(["unknown"])
@@ -0,0 +1,62 @@
+from JetsonNanoHaMqtt.BoundedQueue import BoundedQueue
+import pytest
+
+
+def test_full_queue_drops_the_oldest_item():
+    dropped = []
+    queue = BoundedQueue(2, on_drop=dropped.append)
+    assert queue.put(1) and queue.put(2) and queue.put(3)
+    assert queue.dropped == 1
+    assert dropped == [1]
+    assert len(queue) == 2
+    assert [queue.get(0), queue.get(0)] == [2, 3]
+
+
+def test_drop_newest_refuses_new_items():
+    dropped = []
+    queue = BoundedQueue(2, BoundedQueue.DROP_NEWEST, on_drop=dropped.append)
+    assert queue.put(1) and queue.put(2)
+    assert not queue.put(3)
+    assert queue.dropped == 1
+    assert dropped == [3]
+    assert [queue.get(0), queue.get(0)] == [1, 2]
+
+
+def test_get_times_out_when_empty():
+    assert BoundedQueue(1).get(0.01) is None
+
+
+def test_closed_queue_refuses_items_and_drains():
+    queue = BoundedQueue(2)
+    queue.put(1)
+    queue.close()
+    assert not queue.put(2)
+    assert queue.get() == 1
+    assert queue.get() is None
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        BoundedQueue(0)
+    with pytest.raises(ValueError):
+        BoundedQueue(1, "drop_random")
+
+
+def test_closed_queue_hands_refused_items_to_on_drop():
+    dropped = []
+    queue = BoundedQueue(1, on_drop=dropped.append)
+    queue.close()
+    assert not queue.put(1)
+    assert dropped == [1]
+    assert queue.dropped == 0
+
+
+def test_clear_hands_queued_items_to_on_drop():
+    dropped = []
+    queue = BoundedQueue(2, on_drop=dropped.append)
+    queue.put(1)
+    queue.put(2)
+    queue.clear()
+    assert len(queue) == 0
+    assert dropped == [1, 2]
+    assert queue.dropped == 0
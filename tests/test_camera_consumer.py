@@ -0,0 +1,102 @@
+from JetsonNanoHaMqtt.CameraConsumer import CameraConsumer
+from JetsonNanoHaMqtt.NanoMqttCamera import NanoMqttCamera
+from JetsonNanoHaMqtt.ModelRegistry import ModelRegistry
+from JetsonNanoHaMqtt.InferenceScheduler import InferenceScheduler
+from JetsonNanoHaMqtt.CudaBufferPool import CudaBufferPool
+from stubs import StubClient
+import threading
+import pytest
+import time
+
+DEV = {"identifiers": ["Jetson Nano", "1234"]}
+
+
+def test_consumers_run_on_the_captured_frames_at_their_own_rate():
+    client = StubClient()
+    scheduler = InferenceScheduler()
+    detect = CameraConsumer("Detect", "detectNet", "ssd-mobilenet-v2", interval=0)
+    classify = CameraConsumer("Classify", "imageNet", "googlenet", interval=0.2)
+    camera = NanoMqttCamera("Cam", client, DEV, input="stub://0", models=ModelRegistry(), scheduler=scheduler,
+                            consumers=[detect, classify])
+    camera.initialize()
+    topics = [detect.label.state_topic, classify.label.state_topic]
+    try:
+        camera.start(frequency=0.02)
+        time.sleep(0.5)
+        camera.stop()
+    finally:
+        camera.close()
+        scheduler.stop()
+    assert detect.runs > classify.runs > 0
+    assert classify.runs <= 4
+    assert [client.count(topic) > 0 for topic in topics] == [True, True]
+    assert detect.label is None
+
+
+def test_consumer_waits_for_its_network_and_interval():
+    consumer = CameraConsumer("Detect", "detectNet", "ssd-mobilenet-v2", interval=1)
+    assert not consumer.due(0)
+    consumer.initialize("Cam", StubClient(), DEV, ModelRegistry(), InferenceScheduler())
+    assert consumer.due(0)
+    assert not consumer.due(0.5)
+    assert consumer.due(1)
+
+
+def test_unsupported_network():
+    with pytest.raises(ValueError):
+        CameraConsumer("Segment", "segNet")
+
+
+def test_consumer_skips_frames_while_its_network_runs():
+    scheduler = InferenceScheduler()
+    buffers = CudaBufferPool()
+    consumer = CameraConsumer("Detect", "detectNet", "ssd-mobilenet-v2", interval=0)
+    consumer.initialize("Cam", StubClient(), DEV, ModelRegistry(), scheduler, buffers=buffers)
+    running, release = threading.Event(), threading.Event()
+
+    def run(img):
+        running.set()
+        release.wait(5)
+        return []
+    consumer.run = run
+    frame = buffers.acquire(32, 24, "rgb8")
+    try:
+        future = consumer.consume(frame)
+        assert running.wait(5)
+        assert consumer.consume(frame) is None
+        assert consumer.skipped == 1
+        # The camera is done with the frame, the consumer still holds it
+        buffers.release(frame)
+        assert buffers.metrics()["free"] == 0
+        release.set()
+        future.result(5)
+        deadline = time.monotonic() + 5
+        while consumer.runs == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert consumer.runs == 1
+        assert buffers.metrics()["free"] == 1
+    finally:
+        consumer.close()
+        scheduler.stop()
+
+
+def test_detection_overlay_is_drawn_on_a_copy_of_a_held_frame():
+    buffers = CudaBufferPool()
+    scheduler = InferenceScheduler()
+    camera = NanoMqttCamera("Cam", StubClient(), DEV, input="stub://0", inference=True,
+                            inference_network="ssd-mobilenet-v2", models=ModelRegistry(),
+                            scheduler=scheduler, buffers=buffers)
+    camera.initialize()
+    try:
+        frame = camera.capture_frame()
+        held = frame.img
+        buffers.retain(held)
+        camera.detect_frame(frame)
+        assert frame.img is not held
+        assert buffers.bytes_copied == 2 * held.array.nbytes
+        camera.release_frame(frame)
+        buffers.release(held)
+        assert buffers.metrics()["free"] == 2
+    finally:
+        camera.close()
+        scheduler.stop()
@@ -0,0 +1,145 @@
+from JetsonNanoHaMqtt.CameraPipeline import CameraPipeline, AsyncCameraPipeline
+import asyncio
+import threading
+import time
+
+
+def run_pipeline(stages, duration: float = 0.3) -> CameraPipeline:
+    count = iter(range(100000))
+    pipeline = CameraPipeline("test", lambda: next(count), stages, frequency=0.001)
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    return pipeline
+
+
+def test_slow_stage_drops_frames_instead_of_stalling_the_capture():
+    processed = []
+
+    def slow(frame):
+        time.sleep(0.02)
+        processed.append(frame)
+        return frame
+
+    pipeline = run_pipeline([("slow", slow)])
+    assert pipeline.captured > 2 * len(processed)
+    assert pipeline.dropped["slow"] > 0
+    assert processed == sorted(processed)
+
+
+def test_stage_returning_none_drops_the_frame():
+    lock = threading.Lock()
+    seen = []
+
+    def odd(frame):
+        return frame if frame % 2 else None
+
+    def collect(frame):
+        with lock:
+            seen.append(frame)
+        return frame
+
+    run_pipeline([("odd", odd), ("collect", collect)], duration=0.1)
+    with lock:
+        assert seen
+        assert all(frame % 2 for frame in seen)
+
+
+def test_failing_stage_keeps_the_pipeline_running():
+    seen = []
+
+    def fail(frame):
+        if frame == 0:
+            raise RuntimeError("bad frame")
+        seen.append(frame)
+        return frame
+
+    pipeline = run_pipeline([("fail", fail)], duration=0.1)
+    assert seen
+    assert not pipeline.running
+
+
+def test_every_frame_is_released_once():
+    lock = threading.Lock()
+    captured = []
+    released = []
+    count = iter(range(100000))
+
+    def capture():
+        frame = next(count)
+        with lock:
+            captured.append(frame)
+        return frame
+
+    def release(frame):
+        with lock:
+            released.append(frame)
+
+    def slow(frame):
+        time.sleep(0.01)
+        return frame
+
+    def odd(frame):
+        return frame if frame % 2 else None
+
+    pipeline = CameraPipeline("test", capture, [("slow", slow), ("odd", odd)], frequency=0.001,
+                              release=release)
+    pipeline.start()
+    time.sleep(0.3)
+    pipeline.stop()
+    with lock:
+        assert sum(pipeline.dropped.values()) > 0
+        assert len(released) == len(set(released))
+        assert sorted(released) == captured
+
+
+def test_async_pipeline_runs_until_stopped():
+    async def run():
+        count = iter(range(100000))
+        seen = []
+
+        def slow(frame):
+            time.sleep(0.02)
+            return frame
+
+        pipeline = AsyncCameraPipeline("test", lambda: next(count), [("slow", slow), ("collect", seen.append)],
+                                       frequency=0.001, loop=asyncio.get_running_loop(), inline=["collect"])
+        pipeline.start()
+        await asyncio.sleep(0.3)
+        assert pipeline.running
+        pipeline.stop()
+        await pipeline.wait_stopped(1)
+        assert not pipeline.running
+        assert seen == sorted(seen)
+        assert pipeline.captured > 2 * len(seen) > 0
+        assert pipeline.dropped["slow"] > 0
+    asyncio.run(run())
+
+
+def test_async_pipeline_releases_queued_frames_on_stop():
+    async def run():
+        count = iter(range(100000))
+        captured = []
+        released = []
+
+        def capture():
+            frame = next(count)
+            captured.append(frame)
+            return frame
+
+        def slow(frame):
+            time.sleep(0.02)
+            return frame
+
+        pipeline = AsyncCameraPipeline("test", capture, [("slow", slow)], frequency=0.001,
+                                       loop=asyncio.get_running_loop(), release=released.append)
+        pipeline.start()
+        await asyncio.sleep(0.2)
+        pipeline.stop()
+        await pipeline.wait_stopped(1)
+        # Give a stage call still running on the executor time to finish
+        await asyncio.sleep(0.05)
+        assert sum(pipeline.queue_depth.values()) == 0
+        assert len(released) == len(set(released))
+        assert len(captured) - len(released) <= 2
+    asyncio.run(run())
@@ -0,0 +1,59 @@
+from JetsonNanoHaMqtt.CameraProcess import CameraProcess
+from JetsonNanoHaMqtt.JpegEncoder import JpegEncoder
+from stubs import StubClient
+import multiprocessing
+import pytest
+import time
+
+DEV = {"identifiers": ["Jetson Nano", "1234"]}
+IMAGE = "homeassistant/camera/jetson_cam_Cam/camera"
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def camera():
+    # The worker is forked so it inherits the installed stand-ins.  It gets
+    # its own encoder, as the threads of the shared one are not forked.
+    client = StubClient()
+    camera = CameraProcess("Cam", client, DEV, camera_kwargs={"input": "stub://0", "encoder": JpegEncoder(workers=1)},
+                           heartbeat=0.2, start_method="fork")
+    camera.initialize()
+    camera.start(frequency=0.1)
+    yield client, camera
+    camera.close()
+
+
+def test_worker_frames_are_published_through_the_slots(camera):
+    client, camera = camera
+    assert wait_for(lambda: client.count(IMAGE) >= 3)
+    # Noise frames encode far past the inline size, so every image came
+    # back through a shared memory slot
+    assert client.bytes[IMAGE] > 3 * 65536
+    assert wait_for(lambda: "captured" in camera.metrics())
+    assert camera.metrics()["published"] >= 3
+
+
+def test_supervisor_restarts_an_exited_worker(camera):
+    client, camera = camera
+    assert wait_for(lambda: client.count(IMAGE) >= 1)
+    for child in multiprocessing.active_children():
+        if child.name == "Cam worker":
+            child.kill()
+    assert wait_for(lambda: camera.restarts == 1)
+    published = client.count(IMAGE)
+    assert wait_for(lambda: client.count(IMAGE) > published)
+
+
+def test_networks_are_refused_in_a_camera_process():
+    with pytest.raises(ValueError):
+        CameraProcess("Cam", StubClient(), DEV, camera_kwargs={"inference": True})
+    with pytest.raises(ValueError):
+        CameraProcess("Cam", StubClient(), DEV, camera_kwargs={"consumers": ["Detect"]})
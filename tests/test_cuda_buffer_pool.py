@@ -0,0 +1,72 @@
+from JetsonNanoHaMqtt.CudaBufferPool import CudaBufferPool
+
+
+class Image():
+    def __init__(self, width: int, height: int, format: str):
+        self.width = width
+        self.height = height
+        self.format = format
+
+
+def allocate(width: int = 0, height: int = 0, format: str = "rgb8") -> Image:
+    return Image(width, height, format)
+
+
+def test_released_images_are_reused():
+    pool = CudaBufferPool(allocate)
+    img = pool.acquire(64, 48, "rgb8")
+    pool.release(img)
+    assert pool.acquire(64, 48, "rgb8") is img
+    assert pool.allocations == 1
+    assert pool.reuses == 1
+
+
+def test_retained_images_return_after_the_last_release():
+    pool = CudaBufferPool(allocate)
+    img = pool.acquire(64, 48, "rgb8")
+    pool.retain(img)
+    assert pool.retained(img)
+    pool.release(img)
+    assert not pool.retained(img)
+    assert pool.metrics()["free"] == 0
+    pool.release(img)
+    assert pool.acquire(64, 48, "rgb8") is img
+
+
+def test_images_are_keyed_by_size_and_format():
+    pool = CudaBufferPool(allocate)
+    img = pool.acquire(64, 48, "rgb8")
+    pool.release(img)
+    assert pool.acquire(64, 48, "rgba8") is not img
+    assert pool.acquire(48, 64, "rgb8") is not img
+    assert pool.allocations == 3
+
+
+def test_free_images_are_capped_per_key():
+    pool = CudaBufferPool(allocate, max_free=2)
+    images = [pool.acquire(8, 8, "rgb8") for _ in range(3)]
+    for img in images:
+        pool.release(img)
+    assert pool.metrics()["free"] == 2
+    assert pool.evictions == 1
+
+
+def test_free_images_are_capped_in_bytes_oldest_first():
+    pool = CudaBufferPool(allocate, max_bytes=2 * 100 * 100 * 3)
+    first = pool.acquire(100, 100, "rgb8")
+    second = pool.acquire(100, 101, "rgb8")
+    third = pool.acquire(100, 99, "rgb8")
+    pool.release(first)
+    pool.release(second)
+    pool.release(third)
+    assert pool.free_bytes <= 2 * 100 * 100 * 3
+    assert pool.evictions == 1
+    assert pool.acquire(100, 100, "rgb8") is not first
+    assert pool.acquire(100, 99, "rgb8") is third
+
+
+def test_oversized_images_are_not_kept():
+    pool = CudaBufferPool(allocate, max_bytes=100)
+    pool.release(pool.acquire(100, 100, "rgb8"))
+    assert pool.free_bytes == 0
+    assert pool.metrics()["free"] == 0
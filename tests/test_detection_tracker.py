@@ -0,0 +1,51 @@
+from JetsonNanoHaMqtt.DetectionTracker import DetectionFilter, DetectionTracker, TrackEvent, box_iou
+from stubs import Detection
+
+LABELS = {1: "person", 2: "car"}
+
+
+def kinds(events) -> list:
+    return [(event.kind, event.track.label) for event in events]
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+    assert abs(box_iou((0, 0, 10, 10), (5, 0, 15, 10)) - 1 / 3) < 1e-9
+
+
+def test_new_object_is_reported_once():
+    tracker = DetectionTracker()
+    assert kinds(tracker.update([Detection(1, 0.9, 0, 0, 10, 10)], LABELS.get, now=0)) == [(TrackEvent.NEW, "person")]
+    assert tracker.update([Detection(1, 0.9, 1, 0, 11, 10)], LABELS.get, now=1) == []
+    assert len(tracker.tracks) == 1
+
+
+def test_class_change_is_reported():
+    tracker = DetectionTracker()
+    tracker.update([Detection(1, 0.9, 0, 0, 10, 10)], LABELS.get, now=0)
+    events = tracker.update([Detection(2, 0.9, 0, 0, 10, 10)], LABELS.get, now=1)
+    assert kinds(events) == [(TrackEvent.CHANGED, "car")]
+
+
+def test_missing_object_leaves_after_the_timeout():
+    tracker = DetectionTracker(leave_after=5)
+    tracker.update([Detection(1, 0.9, 0, 0, 10, 10)], LABELS.get, now=0)
+    assert tracker.update([], LABELS.get, now=4) == []
+    assert kinds(tracker.update([], LABELS.get, now=5)) == [(TrackEvent.LEFT, "person")]
+    assert tracker.tracks == []
+    assert tracker.events == 2
+
+
+def test_distant_detection_is_a_new_object():
+    tracker = DetectionTracker(iou_threshold=0.3)
+    tracker.update([Detection(1, 0.9, 0, 0, 10, 10)], LABELS.get, now=0)
+    events = tracker.update([Detection(1, 0.9, 50, 50, 60, 60)], LABELS.get, now=1)
+    assert kinds(events) == [(TrackEvent.NEW, "person")]
+    assert len(tracker.tracks) == 2
+
+
+def test_filter_by_class_and_confidence():
+    detection_filter = DetectionFilter(classes=["person"], min_confidence={"person": 0.6})
+    detections = [Detection(1, 0.9, 0, 0, 1, 1), Detection(1, 0.5, 0, 0, 1, 1), Detection(2, 0.9, 0, 0, 1, 1)]
+    assert detection_filter.filter(detections, LABELS.get) == detections[:1]
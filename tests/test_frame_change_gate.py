@@ -0,0 +1,35 @@
+from JetsonNanoHaMqtt.FrameChangeGate import FrameChangeGate
+import numpy as np
+
+
+def frame(level: int) -> np.ndarray:
+    return np.full((64, 64, 3), level, dtype=np.uint8)
+
+
+def test_first_frame_passes():
+    gate = FrameChangeGate(threshold=2.0, keepalive=None)
+    assert gate.changed(frame(10), now=0)
+    assert gate.passed == 1
+
+
+def test_frames_under_the_threshold_are_skipped():
+    gate = FrameChangeGate(threshold=2.0, keepalive=None)
+    gate.changed(frame(10), now=0)
+    assert not gate.changed(frame(11), now=1)
+    assert gate.changed(frame(13), now=2)
+    assert gate.skipped == 1
+    assert gate.passed == 2
+
+
+def test_keepalive_passes_an_unchanged_frame():
+    gate = FrameChangeGate(threshold=2.0, keepalive=60)
+    gate.changed(frame(10), now=0)
+    assert not gate.changed(frame(10), now=59)
+    assert gate.changed(frame(10), now=60)
+
+
+def test_reset_passes_the_next_frame():
+    gate = FrameChangeGate(threshold=2.0, keepalive=None)
+    gate.changed(frame(10), now=0)
+    gate.reset()
+    assert gate.changed(frame(10), now=1)
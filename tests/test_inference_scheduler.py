@@ -0,0 +1,100 @@
+from JetsonNanoHaMqtt.InferenceScheduler import InferenceScheduler
+from concurrent.futures import CancelledError
+import threading
+import time
+import pytest
+
+
+def blocked_scheduler():
+    # A scheduler whose single worker is held until the gate is set, so
+    # the tasks submitted meanwhile stay pending
+    scheduler = InferenceScheduler(max_concurrent=1)
+    gate = threading.Event()
+    running = threading.Event()
+
+    def hold():
+        running.set()
+        gate.wait(5)
+    scheduler.submit("hold", hold)
+    running.wait(5)
+    return scheduler, gate
+
+
+def test_run_returns_the_result():
+    scheduler = InferenceScheduler()
+    try:
+        assert scheduler.run("a", lambda x: x * 2, 21) == 42
+        assert scheduler.metrics()["a"]["executed"] == 1
+    finally:
+        scheduler.stop()
+
+
+def test_higher_priority_runs_first():
+    scheduler, gate = blocked_scheduler()
+    order = []
+    try:
+        low = scheduler.submit("low", order.append, "low", priority=0)
+        high = scheduler.submit("high", order.append, "high", priority=5)
+        gate.set()
+        low.result(5)
+        high.result(5)
+        assert order == ["high", "low"]
+    finally:
+        scheduler.stop()
+
+
+def test_expired_tasks_are_dropped():
+    scheduler, gate = blocked_scheduler()
+    try:
+        future = scheduler.submit("a", lambda: None, deadline=time.monotonic() - 1)
+        gate.set()
+        with pytest.raises(CancelledError):
+            future.result(5)
+        assert scheduler.metrics()["a"]["expired"] == 1
+    finally:
+        scheduler.stop()
+
+
+def test_full_source_drops_its_oldest_task():
+    scheduler, gate = blocked_scheduler()
+    try:
+        futures = [scheduler.submit("a", lambda i=i: i) for i in range(3)]
+        gate.set()
+        with pytest.raises(CancelledError):
+            futures[0].result(5)
+        assert [future.result(5) for future in futures[1:]] == [1, 2]
+        assert scheduler.metrics()["a"]["dropped"] == 1
+    finally:
+        scheduler.stop()
+
+
+def test_a_shared_network_runs_one_call_at_a_time():
+    scheduler = InferenceScheduler(max_concurrent=3)
+    shared, other = object(), object()
+    lock = threading.Lock()
+    active = {}
+    overlaps = []
+
+    def work(model):
+        with lock:
+            active[id(model)] = active.get(id(model), 0) + 1
+            if active[id(model)] > 1:
+                overlaps.append(model)
+        time.sleep(0.002)
+        with lock:
+            active[id(model)] -= 1
+
+    def client(source, model):
+        for _ in range(20):
+            scheduler.run(source, work, model, model=model)
+    threads = [threading.Thread(target=client, args=args)
+               for args in (("a", shared), ("b", shared), ("c", other))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert overlaps == []
+        assert scheduler.max_running <= 2
+    finally:
+        scheduler.stop()
@@ -0,0 +1,75 @@
+from JetsonNanoHaMqtt import JetsonNanoHaMqtt
+import asyncio
+import stubs
+
+IMAGE = "homeassistant/camera/jetson_cam_Cam/camera"
+
+
+async def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_device_runs_on_an_event_loop_until_stopped():
+    async def run():
+        client = stubs.StubClient()
+        jetson = stubs.jtop()
+        device = JetsonNanoHaMqtt("Test Nano", client, jetson)
+        device.initialize_device(jetson)
+        device.initialize_camera("Cam", client, input="stub://0")
+        await device.start_async(mqtt=False)
+        assert await wait_for(lambda: client.count(IMAGE) >= 2)
+        await device.stop_async()
+        published = client.count(IMAGE)
+        await asyncio.sleep(0.2)
+        assert client.count(IMAGE) == published
+    asyncio.run(run())
+
+
+def test_camera_started_after_its_network_loaded_is_stopped():
+    async def run():
+        client = stubs.StubClient()
+        jetson = stubs.jtop()
+        device = JetsonNanoHaMqtt("Test Nano", client, jetson, background_loading=True)
+        device.initialize_device(jetson)
+        device.initialize_camera("Cam", client, input="stub://0", inference=True,
+                                 inference_network="ssd-mobilenet-v2")
+        await device.start_async(mqtt=False)
+        assert client.count(IMAGE) == 0
+        assert await wait_for(lambda: client.count(IMAGE) >= 2)
+        await device.stop_async()
+        published = client.count(IMAGE)
+        await asyncio.sleep(0.2)
+        assert client.count(IMAGE) == published
+
+    load_latency = stubs.CONFIG["load_latency"]
+    stubs.CONFIG["load_latency"] = 0.2
+    try:
+        asyncio.run(run())
+    finally:
+        stubs.CONFIG["load_latency"] = load_latency
+
+
+def test_camera_stopped_while_its_network_loads_never_starts():
+    async def run():
+        client = stubs.StubClient()
+        jetson = stubs.jtop()
+        device = JetsonNanoHaMqtt("Test Nano", client, jetson, background_loading=True)
+        device.initialize_device(jetson)
+        device.initialize_camera("Cam", client, input="stub://0", inference=True,
+                                 inference_network="ssd-mobilenet-v2")
+        await device.start_async(mqtt=False)
+        await device.stop_async()
+        await asyncio.sleep(0.4)
+        assert client.count(IMAGE) == 0
+
+    load_latency = stubs.CONFIG["load_latency"]
+    stubs.CONFIG["load_latency"] = 0.2
+    try:
+        asyncio.run(run())
+    finally:
+        stubs.CONFIG["load_latency"] = load_latency
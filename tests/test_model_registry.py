@@ -0,0 +1,66 @@
+from JetsonNanoHaMqtt.ModelRegistry import ModelRegistry
+import pytest
+
+
+class Network():
+    created = 0
+
+    def __init__(self, network: str, threshold: float = None):
+        Network.created += 1
+        self.network = network
+        self.threshold = threshold
+
+
+def test_acquire_shares_a_loaded_network():
+    registry = ModelRegistry()
+    a = registry.acquire(Network, "ssd", 0.5)
+    b = registry.acquire(Network, "ssd", 0.5)
+    assert a is b
+    assert registry.loads == 1
+    assert registry.hits == 1
+    assert registry.acquire(Network, "ssd", 0.6) is not a
+
+
+def test_release_keeps_the_idle_network_loaded():
+    registry = ModelRegistry()
+    a = registry.acquire(Network, "ssd")
+    registry.release(a)
+    assert registry.metrics()["in_use"] == 0
+    assert registry.acquire(Network, "ssd") is a
+    assert registry.evictions == 0
+
+
+def test_budget_evicts_the_least_recently_used_idle_network():
+    registry = ModelRegistry(budget=250, sizes={"a": 100, "b": 100, "c": 100})
+    a = registry.acquire(Network, "a")
+    b = registry.acquire(Network, "b")
+    registry.release(b)
+    registry.release(a)
+    registry.acquire(Network, "c")
+    assert registry.evictions == 1
+    assert registry.memory == 200
+    assert registry.acquire(Network, "a") is a
+    assert registry.loads == 3
+
+
+def test_budget_never_evicts_a_network_in_use():
+    registry = ModelRegistry(budget=150, sizes={"a": 100, "b": 100})
+    registry.acquire(Network, "a")
+    with pytest.raises(MemoryError):
+        registry.acquire(Network, "b")
+    assert registry.evictions == 0
+
+
+def test_evict_idle():
+    registry = ModelRegistry()
+    a = registry.acquire(Network, "a")
+    registry.acquire(Network, "b")
+    registry.release(a)
+    registry.evict_idle()
+    assert registry.metrics()["loaded"] == 1
+
+
+def test_background_load():
+    registry = ModelRegistry()
+    model = registry.load(Network, "ssd").result(timeout=5)
+    assert registry.acquire(Network, "ssd") is model
@@ -0,0 +1,50 @@
+from JetsonNanoHaMqtt.MotionDetector import MotionDetector
+import numpy as np
+
+
+def frame(level: int = 0, box: tuple = None) -> np.ndarray:
+    img = np.full((128, 128, 3), level, dtype=np.uint8)
+    if box is not None:
+        left, top, right, bottom = box
+        img[top:bottom, left:right] = 255
+    return img
+
+
+def test_still_frames_have_no_motion():
+    motion = MotionDetector(cooldown=0)
+    assert not motion.detect(frame(), now=0)
+    assert not motion.detect(frame(), now=1)
+    assert motion.motion_frames == 0
+
+
+def test_moving_area_past_the_threshold_is_motion():
+    motion = MotionDetector(sensitivity=8.0, area=0.05, cooldown=0)
+    motion.detect(frame(), now=0)
+    assert motion.detect(frame(box=(0, 0, 64, 64)), now=1)
+    assert motion.moved >= 0.05
+
+
+def test_small_moving_area_is_not_motion():
+    motion = MotionDetector(sensitivity=8.0, area=0.05, cooldown=0)
+    motion.detect(frame(), now=0)
+    assert not motion.detect(frame(box=(0, 0, 8, 8)), now=1)
+
+
+def test_small_change_is_under_the_sensitivity():
+    motion = MotionDetector(sensitivity=8.0, area=0.01, cooldown=0)
+    motion.detect(frame(10), now=0)
+    assert not motion.detect(frame(15), now=1)
+
+
+def test_motion_stays_active_for_the_cooldown():
+    motion = MotionDetector(area=0.05, cooldown=10, alpha=1.0)
+    motion.detect(frame(), now=0)
+    assert motion.detect(frame(box=(0, 0, 64, 64)), now=1)
+    assert motion.detect(frame(box=(0, 0, 64, 64)), now=11)
+    assert not motion.detect(frame(box=(0, 0, 64, 64)), now=11.5)
+
+
+def test_masked_regions_are_ignored():
+    motion = MotionDetector(area=0.01, cooldown=0, masks=[(0, 0, 1, 0.5)])
+    motion.detect(frame(), now=0)
+    assert not motion.detect(frame(box=(0, 0, 128, 60)), now=1)
@@ -0,0 +1,82 @@
+from JetsonNanoHaMqtt.mqtt.MQTTAsyncio import MQTTAsyncio
+from paho.mqtt.client import MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN
+import asyncio
+import socket
+
+
+class SocketClient():
+    # The socket side of a paho client on one end of a socket pair
+    def __init__(self, sock):
+        self.sock = sock
+        self.rc = MQTT_ERR_SUCCESS
+        self.pending_write = False
+        self.reads = 0
+        self.writes = 0
+        self.reconnects = 0
+
+    def socket(self):
+        return self.sock
+
+    def loop_read(self):
+        self.sock.recv(1024)
+        self.reads += 1
+
+    def loop_write(self):
+        self.pending_write = False
+        self.writes += 1
+
+    def want_write(self) -> bool:
+        return self.pending_write
+
+    def loop_misc(self):
+        return self.rc
+
+    def reconnect(self):
+        self.reconnects += 1
+        self.rc = MQTT_ERR_SUCCESS
+
+
+async def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_socket_is_driven_by_the_loop_until_detached():
+    async def run():
+        sock, peer = socket.socketpair()
+        client = SocketClient(sock)
+        driver = MQTTAsyncio(client, asyncio.get_running_loop())
+        driver.attach()
+        peer.send(b"x")
+        assert await wait_for(lambda: client.reads == 1)
+        client.pending_write = True
+        client.on_socket_register_write(client, None, sock)
+        assert await wait_for(lambda: client.writes == 1)
+        driver.detach()
+        peer.send(b"y")
+        await asyncio.sleep(0.05)
+        assert client.reads == 1
+        sock.close()
+        peer.close()
+    asyncio.run(run())
+
+
+def test_lost_connection_is_reconnected():
+    async def run():
+        sock, peer = socket.socketpair()
+        client = SocketClient(sock)
+        client.rc = MQTT_ERR_NO_CONN
+        driver = MQTTAsyncio(client, asyncio.get_running_loop())
+        task = driver.attach()
+        assert await wait_for(lambda: client.reconnects == 1)
+        assert driver.reconnects == 1
+        driver.detach()
+        await asyncio.wait([task], timeout=1)
+        assert task.cancelled()
+        sock.close()
+        peer.close()
+    asyncio.run(run())
@@ -0,0 +1,92 @@
+from JetsonNanoHaMqtt.mqtt.MQTTDiscoveryCache import MQTTDiscoveryCache
+from JetsonNanoHaMqtt.mqtt.MQTTOptionalConfig import MQTTOptionalSensor
+from JetsonNanoHaMqtt.NanoMqttUtil import entity_unique_id
+from HaMqtt.MQTTUtil import HaDeviceClass
+from paho.mqtt.client import MQTTMessage
+
+CONFIG = "homeassistant/sensor/jetson_a/config"
+DEV = {"identifiers": ["Jetson Nano", "1234"]}
+
+
+def test_unchanged_config_is_not_sent_again(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    info = cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    assert info.cached
+    assert info.is_published()
+    assert client.payloads(CONFIG) == ['{"name": "a"}']
+    assert (cache.sent, cache.skipped) == (1, 1)
+
+
+def test_changed_config_is_sent(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    cache.publish(CONFIG, '{"name": "b"}', retain=True)
+    assert client.payloads(CONFIG) == ['{"name": "a"}', '{"name": "b"}']
+    assert cache.skipped == 0
+
+
+def test_empty_config_forgets_the_entity(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    cache.publish(CONFIG, "")
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    assert client.payloads(CONFIG) == ['{"name": "a"}', "", '{"name": "a"}']
+
+
+def test_other_topics_are_passed_to_the_client(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    cache.publish("homeassistant/sensor/jetson_a/state", "1", retain=True)
+    cache.publish("homeassistant/sensor/jetson_a/state", "1", retain=True)
+    assert client.payloads("homeassistant/sensor/jetson_a/state") == ["1", "1"]
+
+
+def test_saved_cache_skips_configs_after_a_restart(client, tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MQTTDiscoveryCache(client, path)
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    cache.save()
+    restarted = MQTTDiscoveryCache(client, path)
+    assert restarted.publish(CONFIG, '{"name": "a"}', retain=True).cached
+    assert len(client.payloads(CONFIG)) == 1
+
+
+def test_unreadable_cache_file_starts_empty(client, tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("not json")
+    cache = MQTTDiscoveryCache(client, str(path))
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    assert cache.sent == 1
+
+
+def test_entity_unique_id_is_stable_per_device_and_name():
+    assert entity_unique_id(DEV, "Jetson CPU1") == entity_unique_id(dict(DEV), "Jetson CPU1")
+    assert entity_unique_id(DEV, "Jetson CPU1") != entity_unique_id(DEV, "Jetson CPU2")
+    assert entity_unique_id(DEV, "Jetson CPU1") != entity_unique_id({"identifiers": ["Jetson Nano", "5678"]}, "Jetson CPU1")
+
+
+def test_restarted_entity_sends_availability_and_initial_state(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    for _ in range(2):
+        sensor = MQTTOptionalSensor("Jetson CPU1", "jetson_cpu1_pct", cache, "%", HaDeviceClass.POWER_FACTOR,
+                                    unique_id=entity_unique_id(DEV, "Jetson CPU1"), device_dict=DEV)
+    assert len(client.payloads(sensor.config_topic)) == 1
+    assert client.payloads(sensor.avail_topic) == ["online", "online"]
+    assert len(client.payloads(sensor.state_topic)) == 2
+
+
+def test_home_assistant_birth_republishes_the_configs(client, tmp_path):
+    cache = MQTTDiscoveryCache(client, str(tmp_path / "cache.json"))
+    cache.watch_status()
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    cache.publish(CONFIG, '{"name": "a"}', retain=True)
+    cache.publish("homeassistant/sensor/jetson_b/config", '{"name": "b"}', retain=True)
+    cache.publish("homeassistant/sensor/jetson_b/config", "")
+    birth = MQTTMessage(topic=b"homeassistant/status")
+    birth.payload = b"online"
+    client.callbacks["homeassistant/status"](client, None, birth)
+    assert client.payloads(CONFIG) == ['{"name": "a"}', '{"name": "a"}']
+    assert client.payloads("homeassistant/sensor/jetson_b/config") == ['{"name": "b"}', ""]
+    assert cache.republished == 1
+    # The republished config is cached again
+    assert cache.publish(CONFIG, '{"name": "a"}', retain=True).cached
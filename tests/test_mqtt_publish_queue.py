@@ -0,0 +1,125 @@
+from JetsonNanoHaMqtt.mqtt.MQTTPublishQueue import MQTTPublishQueue
+from stubs import StubClient
+import time
+
+
+def stopped_queue(**kwargs):
+    # Messages stay queued until the sender is started
+    client = StubClient()
+    return client, MQTTPublishQueue(client, **kwargs)
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_latest_message_on_a_topic_wins():
+    client, queue = stopped_queue()
+    for i in range(10):
+        queue.publish("jetson/cam/image", str(i))
+    assert queue.metrics()["queued"] == 1
+    assert queue.coalesced == 9
+    assert client.count("jetson/cam/image") == 0
+
+
+def test_oldest_states_are_dropped_over_the_cap():
+    client, queue = stopped_queue(max_messages=2)
+    queue.publish("jetson/a", "1")
+    queue.publish("jetson/b", "2")
+    queue.publish("jetson/c", "3")
+    assert queue.dropped == 1
+    queue.start()
+    try:
+        assert wait_for(lambda: queue.published == 2)
+        assert [client.count(topic) for topic in ("jetson/a", "jetson/b", "jetson/c")] == [0, 1, 1]
+    finally:
+        queue.stop()
+
+
+def test_oldest_images_are_dropped_over_the_byte_cap():
+    client, queue = stopped_queue(max_bytes=100)
+    queue.publish("jetson/a", b"x" * 60)
+    queue.publish("jetson/b", b"x" * 60)
+    assert queue.dropped == 1
+    assert queue.queued_bytes == 60
+
+
+def test_discovery_and_availability_are_never_dropped():
+    client, queue = stopped_queue(max_messages=1)
+    queue.publish("homeassistant/sensor/a/config", "{}")
+    queue.publish("homeassistant/sensor/a/available", "online")
+    queue.publish("homeassistant/sensor/a/state", "1")
+    queue.publish("homeassistant/sensor/b/state", "2")
+    queue.start()
+    try:
+        assert wait_for(lambda: queue.published == 3)
+        assert client.count("homeassistant/sensor/a/config") == 1
+        assert client.count("homeassistant/sensor/a/available") == 1
+        assert client.count("homeassistant/sensor/a/state") == 0
+        assert client.count("homeassistant/sensor/b/state") == 1
+    finally:
+        queue.stop()
+
+
+def test_oversized_message_is_kept():
+    client, queue = stopped_queue(max_bytes=100)
+    queue.publish("jetson/a", b"x" * 60)
+    queue.publish("jetson/b", b"x" * 200)
+    assert queue.dropped == 1
+    assert queue.metrics()["queued"] == 1
+    queue.start()
+    try:
+        assert wait_for(lambda: client.count("jetson/b") == 1)
+    finally:
+        queue.stop()
+
+
+def test_stop_without_start_returns_at_once():
+    client, queue = stopped_queue()
+    queue.publish("jetson/a", "1")
+    start = time.monotonic()
+    queue.stop()
+    assert time.monotonic() - start < 1
+    assert client.count("jetson/a") == 0
+
+
+def test_queued_messages_are_sent_in_order_on_start():
+    client, queue = stopped_queue()
+    queue.publish("jetson/a", "1")
+    queue.publish("jetson/a", "2")
+    queue.start()
+    try:
+        assert wait_for(lambda: client.count("jetson/a") == 1)
+        assert queue.published == 1
+        assert queue.failed == 0
+    finally:
+        queue.stop()
+
+
+def test_messages_are_held_while_disconnected():
+    client = StubClient()
+    client.connected = False
+    queue = MQTTPublishQueue(client)
+    queue.start()
+    try:
+        queue.publish("jetson/a", "1")
+        time.sleep(0.1)
+        assert client.count("jetson/a") == 0
+        assert queue.metrics()["queued"] == 1
+        client.connected = True
+        assert wait_for(lambda: client.count("jetson/a") == 1)
+        assert queue.failed == 0
+    finally:
+        queue.stop()
+
+
+def test_policies_override_qos_and_retain():
+    client, queue = stopped_queue(policies={"camera": (0, False), "jetson/": (1, True)})
+    assert queue.policy("homeassistant/camera/x/image", 1, True) == (0, False)
+    assert queue.policy("jetson/x/state", 0, False) == (1, True)
+    assert queue.policy("homeassistant/camera/x/config", 1, True) == (1, True)
@@ -0,0 +1,21 @@
+from JetsonNanoHaMqtt.NanoMqttCamera import NanoMqttCamera
+from JetsonNanoHaMqtt.ModelRegistry import ModelRegistry
+from JetsonNanoHaMqtt.InferenceScheduler import InferenceScheduler
+from stubs import StubClient
+
+DEV = {"identifiers": ["Jetson Nano", "1234"]}
+
+
+def test_frames_without_a_network_skip_the_scheduler():
+    scheduler = InferenceScheduler()
+    camera = NanoMqttCamera("Cam", StubClient(), DEV, input="stub://0", models=ModelRegistry(),
+                            scheduler=scheduler)
+    camera.initialize()
+    try:
+        frame = camera.capture_frame()
+        assert camera.infer_frame(frame) is frame
+        assert scheduler.metrics() == {}
+        camera.release_frame(frame)
+    finally:
+        camera.close()
+        scheduler.stop()
@@ -0,0 +1,27 @@
+from JetsonNanoHaMqtt.NanoMqttDiagnostics import NanoMqttDiagnostics
+from JetsonNanoHaMqtt.NanoMqttMetrics import NanoMqttMetrics
+import json
+
+DEV = {"identifiers": ["Jetson Nano", "1234"]}
+
+
+def test_each_source_is_one_sensor_with_its_metrics_as_attributes(client):
+    metrics = NanoMqttMetrics()
+    metrics.observe("Cam", "capture", 0.01)
+    metrics.register("Cam", lambda: {"dropped": 3, "idle": False, "label": "person"})
+    metrics.register("scheduler", lambda: {"pending": 1})
+    diagnostics = NanoMqttDiagnostics("Jetson", client, DEV, metrics)
+    diagnostics.publish_diagnostics()
+    diagnostics.publish_diagnostics()
+    assert sorted(diagnostics.sensors) == ["jetson_diag_cam", "jetson_diag_scheduler"]
+    state = json.loads(client.payloads(diagnostics.state_topic)[-1])
+    cam = state["jetson_diag_cam"]
+    assert set(cam["values"]) >= {"capture_fps", "capture_p95_ms", "dropped"}
+    assert "idle" not in cam["values"] and "label" not in cam["values"]
+    assert cam["metrics"] == len(cam["values"])
+    assert state["jetson_diag_scheduler"] == {"metrics": 1, "values": {"pending": 1}}
+    config = json.loads(client.payloads(diagnostics.sensors["jetson_diag_cam"].config_topic)[0])
+    assert config["value_template"] == "{{ value_json.jetson_diag_cam.metrics }}"
+    assert config["json_attributes_topic"] == diagnostics.state_topic
+    assert config["entity_category"] == "diagnostic"
+    diagnostics.close()
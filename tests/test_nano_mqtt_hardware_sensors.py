@@ -0,0 +1,116 @@
+from JetsonNanoHaMqtt.NanoMqttHardwareSensors import NanoMqttHardwareSensors
+from JetsonNanoHaMqtt.SensorDeadband import SensorDeadband
+from JetsonNanoHaMqtt.HardwareSensor import HARDWARE_SENSORS, ScheduledSensor, discover_sensors
+from JetsonNanoHaMqtt.mqtt.MQTTJsonSensor import MQTTJsonSensor
+from HaMqtt.MQTTUtil import HaDeviceClass
+import json
+
+
+class Sensor():
+    def __init__(self):
+        self.states = []
+
+    def publish_state(self, state):
+        self.states.append(state)
+
+
+def test_sensor_is_published_past_its_deadband():
+    sensors = NanoMqttHardwareSensors("Jetson", None, {}, None, deadband=1.0, heartbeat=None)
+    sensor = Sensor()
+    assert sensors.publish_sensor("Temp CPU", sensor, 40.0, "40.00")
+    assert not sensors.publish_sensor("Temp CPU", sensor, 40.5, "40.50")
+    assert sensors.publish_sensor("Temp CPU", sensor, 41.5, "41.50")
+    assert sensor.states == ["40.00", "41.50"]
+
+
+def test_deadbands_override_the_default_per_key():
+    sensors = NanoMqttHardwareSensors("Jetson", None, {}, None, deadband=1.0, heartbeat=None,
+                                      deadbands={"fan": SensorDeadband(absolute=10, heartbeat=None)})
+    fan, cpu = Sensor(), Sensor()
+    for value in (20, 25):
+        sensors.publish_sensor("fan", fan, value)
+        sensors.publish_sensor("CPU1", cpu, value)
+    assert fan.states == [20]
+    assert cpu.states == [20, 25]
+
+
+class Jetson():
+    def __init__(self, **stats):
+        self.stats = {"CPU1": 10, "CPU2": 20, "CPU3": "OFF", "CPU4": "OFF", "GPU1": 30, "fan": 40.0,
+                      "Temp AO": 41.0, "Temp CPU": 42.0, "Temp GPU": 43.0, "Temp PLL": 44.0,
+                      "Temp thermal": 45.0, "power cur": 1000, "power avg": 900, "RAM": 1000}
+        self.stats.update(stats)
+        self.ram = {"use": 1000, "tot": 4000}
+        self.callbacks = []
+
+    def attach(self, callback):
+        self.callbacks.append(callback)
+
+    def detach(self, callback):
+        self.callbacks.remove(callback)
+
+    def update(self, **stats):
+        self.stats.update(stats)
+        for callback in self.callbacks:
+            callback(self)
+
+
+def test_batched_mode_publishes_one_json_document(client):
+    jetson = Jetson()
+    sensors = NanoMqttHardwareSensors("Jetson", client, {"identifiers": ["test"]}, jetson, heartbeat=None, batched=True)
+    sensors.initialize()
+    client.published.clear()
+    sensors.publish_hardware_sensors(jetson)
+    sensors.publish_hardware_sensors(jetson)
+    jetson.stats["Temp CPU"] = 50.0
+    sensors.publish_hardware_sensors(jetson)
+    assert [topic for topic, _, _ in client.published] == [sensors.state_topic] * 2
+    first, second = [json.loads(payload) for payload in client.payloads(sensors.state_topic)]
+    assert first["jetson_cpu1_pct"] == 10.0
+    assert first["jetson_cpu3_pct"] == -1.0
+    assert first["jetson_t_cpu"] == 42.0
+    assert first["jetson_ram_pct"] == 25.0
+    assert second["jetson_t_cpu"] == 50.0
+
+
+def test_json_sensor_reads_its_value_from_the_shared_topic(client):
+    sensor = MQTTJsonSensor("Jetson CPU1", "jetson_cpu1_pct", client, "%", HaDeviceClass.POWER_FACTOR,
+                            "jetson/state", unique_id="cpu1", device_dict={"identifiers": ["test"]})
+    config = json.loads(client.payloads(sensor.config_topic)[0])
+    assert config["state_topic"] == "jetson/state"
+    assert config["value_template"] == "{{ value_json.jetson_cpu1_pct }}"
+    sensor.publish_state(10)
+    assert client.payloads("jetson/state") == []
+
+
+def test_sensors_are_discovered_from_the_jtop_stats():
+    sensors = discover_sensors({"CPU1": 1, "Temp thermal": 40.0, "RAM": 1000, "unknown": 1}, intervals={"CPU1": 2})
+    by_key = {sensor.key: sensor for sensor in sensors}
+    assert sorted(by_key) == ["CPU1", "RAM", "Temp thermal"]
+    assert (by_key["Temp thermal"].name, by_key["Temp thermal"].node_id) == ("Jetson Temp Thermal", "jetson_t_thermal")
+    assert by_key["CPU1"].interval == 2
+    assert by_key["RAM"].interval == 30
+
+
+def test_sensor_schedule_keeps_a_fixed_grid():
+    sensor = ScheduledSensor("CPU1", "Jetson CPU1", "jetson_cpu1_pct", HARDWARE_SENSORS[0], 5)
+    assert sensor.due(0)
+    assert not sensor.due(4.9)
+    assert sensor.due(5.1)
+    assert not sensor.due(9.9)
+    assert sensor.due(31)
+    assert sensor.next_due == 35
+
+
+def test_sensors_publish_on_start_and_then_when_due(client):
+    jetson = Jetson()
+    sensors = NanoMqttHardwareSensors("Jetson", client, {"identifiers": ["test"]}, jetson, heartbeat=None)
+    sensors.initialize()
+    client.published.clear()
+    sensors.start(jetson, frequency=5)
+    assert jetson.callbacks == [sensors.on_jtop_update]
+    assert len(client.published) == len(sensors.sensors)
+    jetson.update(CPU1=50)
+    assert len(client.published) == len(sensors.sensors)
+    sensors.stop()
+    assert jetson.callbacks == []
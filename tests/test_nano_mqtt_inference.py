@@ -0,0 +1,99 @@
+from JetsonNanoHaMqtt.NanoMqttInference import NanoMqttInference
+from JetsonNanoHaMqtt.InferenceScheduler import InferenceScheduler
+from JetsonNanoHaMqtt.CudaBufferPool import CudaBufferPool
+from paho.mqtt.client import MQTTMessage
+from stubs import detectNet, poseNet
+import struct
+import json
+import pytest
+
+DEVICE = {"name": "Jetson", "identifiers": ["jetson"]}
+
+
+def raw_request(width: int = 64, height: int = 48) -> MQTTMessage:
+    msg = MQTTMessage(topic=b"request")
+    msg.payload = NanoMqttInference.RAW_RGB8 + struct.pack(">HH", width, height) + bytes(width * height * 3)
+    return msg
+
+
+@pytest.fixture
+def inference(client):
+    return NanoMqttInference("Test", client, DEVICE, detectNet, "ssd-mobilenet-v2")
+
+
+@pytest.fixture
+def results_inference(client):
+    def make(network, name):
+        inference = NanoMqttInference("Test", client, DEVICE, network, name, results=True,
+                                      scheduler=InferenceScheduler())
+        inference.initialize()
+        made.append(inference)
+        return inference
+    made = []
+    yield make
+    for inference in made:
+        inference.close()
+
+
+def test_results_mode_publishes_detections_as_json(client, results_inference):
+    inference = results_inference(detectNet, "ssd-mobilenet-v2")
+    assert inference.inference_camera is None
+    inference.publish_inference(client, None, raw_request())
+    results = json.loads(client.payloads(inference.inference_label.attributes_topic)[-1])
+    assert results["network"] == "detectNet"
+    assert (results["width"], results["height"]) == (64, 48)
+    detection = results["detections"][0]
+    assert set(detection) == {"class", "class_id", "confidence", "box"}
+    assert len(detection["box"]) == 4
+    assert client.payloads(inference.inference_label.state_topic)[-1] == detection["class"]
+
+
+def test_results_mode_publishes_poses_as_json(client, results_inference):
+    inference = results_inference(poseNet, "resnet18-body")
+    inference.publish_inference(client, None, raw_request())
+    results = json.loads(client.payloads(inference.inference_label.attributes_topic)[-1])
+    pose = results["poses"][0]
+    assert pose["keypoints"][1] == {"name": "keypoint_1", "id": 1, "x": 10.0, "y": 20.0}
+    assert pose["links"][0] == [0, 1]
+    assert client.payloads(inference.inference_label.state_topic)[-1] == 1
+
+
+def test_decode_batch_round_trip(inference):
+    images = [b"first", b"", b"third image"]
+    payload = NanoMqttInference.encode_batch("req-1", images)
+    assert payload[:4] == NanoMqttInference.BATCH
+    assert inference.decode_batch(payload) == ("req-1", images)
+
+
+def test_decode_batch_rejects_a_bad_correlation_id(inference):
+    with pytest.raises(ValueError):
+        inference.decode_batch(NanoMqttInference.encode_batch("bad id/#", [b"x"]))
+
+
+def test_decode_batch_rejects_a_truncated_image(inference):
+    payload = NanoMqttInference.encode_batch("req", [b"image"])
+    with pytest.raises(ValueError):
+        inference.decode_batch(payload[:-1])
+
+
+def test_decode_batch_rejects_trailing_bytes(inference):
+    payload = NanoMqttInference.encode_batch("req", [b"image"])
+    with pytest.raises(ValueError):
+        inference.decode_batch(payload + b"x")
+
+
+def test_request_image_is_released_when_publishing_fails(client):
+    buffers = CudaBufferPool()
+    inference = NanoMqttInference("Test", client, DEVICE, detectNet, "ssd-mobilenet-v2",
+                                  scheduler=InferenceScheduler(), buffers=buffers)
+    inference.initialize()
+
+    def fail(out_np):
+        raise RuntimeError("encoder failed")
+    inference.encode_image = fail
+    try:
+        with pytest.raises(RuntimeError):
+            inference.publish_inference(client, None, raw_request())
+        assert buffers.metrics()["free"] == 1
+    finally:
+        inference.close()
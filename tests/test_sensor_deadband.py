@@ -0,0 +1,39 @@
+from JetsonNanoHaMqtt.SensorDeadband import SensorDeadband
+
+
+def test_absolute_deadband():
+    deadband = SensorDeadband(absolute=1.0, heartbeat=None)
+    assert deadband.should_publish(40.0, now=0)
+    assert not deadband.should_publish(40.5, now=1)
+    assert not deadband.should_publish(41.0, now=2)
+    assert deadband.should_publish(41.5, now=3)
+    assert deadband.published == 2
+    assert deadband.suppressed == 2
+
+
+def test_percent_deadband():
+    deadband = SensorDeadband(percent=10, heartbeat=None)
+    assert deadband.should_publish(100, now=0)
+    assert not deadband.should_publish(109, now=1)
+    assert deadband.should_publish(111, now=2)
+
+
+def test_any_change_without_a_deadband():
+    deadband = SensorDeadband(heartbeat=None)
+    assert deadband.should_publish(1, now=0)
+    assert not deadband.should_publish(1, now=1)
+    assert deadband.should_publish(2, now=2)
+
+
+def test_non_numeric_values_publish_on_change():
+    deadband = SensorDeadband(absolute=5, heartbeat=None)
+    assert deadband.should_publish(10, now=0)
+    assert deadband.should_publish("OFF", now=1)
+    assert not deadband.should_publish("OFF", now=2)
+
+
+def test_heartbeat_publishes_an_unchanged_value():
+    deadband = SensorDeadband(absolute=1.0, heartbeat=60)
+    deadband.should_publish(40.0, now=0)
+    assert not deadband.should_publish(40.0, now=59)
+    assert deadband.should_publish(40.0, now=60)